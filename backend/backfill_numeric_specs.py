@@ -0,0 +1,59 @@
+"""
+Backfill the typed numeric spec columns on existing scraped_cars rows
+Run once after migrations/add_numeric_specs_to_scraped_cars.sql; new rows
+get these columns from the scraper directly
+"""
+from dotenv import load_dotenv
+from utils.initialize_supabase import get_supabase_client
+from utils.spec_parsing import normalize_specs
+
+load_dotenv()
+
+supabase = get_supabase_client()
+
+PAGE_SIZE = 200
+SOURCE_COLUMNS = (
+    "id, name, year, horsepower, mpg, seating_capacity, cargo_space, towing_capacity, "
+    "fuel_tank_capacity, curb_weight, ground_clearance, additional_specs"
+)
+
+
+def backfill_numeric_specs(dry_run: bool = False):
+    """
+    Page through scraped_cars by id and upsert the parsed columns one page at a time
+    name/year are included so the upsert payload satisfies the NOT NULL columns
+    """
+    print("=" * 60)
+    print("🔢 Backfilling numeric spec columns on scraped_cars")
+    print("=" * 60)
+
+    updated = 0
+    last_id = None
+    while True:
+        query = supabase.table('scraped_cars').select(SOURCE_COLUMNS).order('id').limit(PAGE_SIZE)
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        rows = query.execute().data or []
+        if not rows:
+            break
+
+        payload = [
+            {"id": row["id"], "name": row["name"], "year": row["year"], **normalize_specs(row)}
+            for row in rows
+        ]
+        if dry_run:
+            for item in payload:
+                print(f"  {item}")
+        else:
+            supabase.table('scraped_cars').upsert(payload).execute()
+
+        updated += len(payload)
+        last_id = rows[-1]["id"]
+        print(f"  ✅ {updated} rows processed (last id: {last_id})")
+
+    print(f"\n✅ Backfill complete: {updated} rows")
+    return updated
+
+
+if __name__ == "__main__":
+    backfill_numeric_specs()
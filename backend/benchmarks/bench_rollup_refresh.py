@@ -0,0 +1,68 @@
+"""
+Cost of a summary refresh as a customer's history grows
+
+    cd backend && python -m benchmarks.bench_rollup_refresh
+
+No .env or network needed. Each history is synthetic (see
+bench_transaction_aggregation.py) at PER_DAY transactions a day, so a longer
+history spans more years at the same density, as a real customer's does.
+It is folded into a throwaway RollupStore, then a refresh (fold(), then
+aggregates() and subscriptions()) is timed with the whole history plus NEW
+transactions from the following day, as Nessie returns it. Per size:
+  date scan:  comparing every transaction's date with the watermark, the
+              one pass over the history a refresh still makes
+  refresh:    everything summary() runs on the fetched transactions
+  past scan:  the same refresh given only what the date scan lets through
+
+Everything past the date scan only touches the new transactions, the
+customer's last ROLLUP_WINDOW_MONTHS and the LOOKBACK_DAYS of charges of the
+merchants the new transactions were charged by. It grows until the history
+spans LOOKBACK_DAYS and is flat from there on; the date scan is linear but
+cheap
+"""
+from datetime import timedelta
+import os
+import tempfile
+import time
+
+from benchmarks.bench_transaction_aggregation import TODAY, best_of, refresh, synthetic_transactions
+from utils.transaction_rollups import WATERMARK_OVERLAP_DAYS, RollupStore, _after
+
+SIZES = (1_000, 10_000, 50_000, 200_000)
+PER_DAY = 25
+NEW = 100
+
+
+def main():
+    print(f"{'history':>10} {'years':>6} {'date scan':>12} {'refresh':>12} {'past scan':>12}")
+    next_day = (TODAY + timedelta(days=1)).isoformat()
+    cutoff = (TODAY - timedelta(days=WATERMARK_OVERLAP_DAYS)).isoformat()
+    for n in SIZES:
+        history = synthetic_transactions(n, days=n // PER_DAY)
+        new = [{**tx, "_id": f"new{i}", "transaction_date": next_day}
+               for i, tx in enumerate(synthetic_transactions(NEW, seed=n))]
+        current = history + new
+        with tempfile.TemporaryDirectory() as directory:
+            def date_scan(_):
+                start = time.perf_counter()
+                _after(current, cutoff)
+                return time.perf_counter() - start
+
+            def later_refresh(fetched):
+                def run(i):
+                    store = RollupStore(os.path.join(directory, f"refresh-{len(fetched)}-{i}.sqlite"))
+                    refresh(store, history)
+                    # Don't time the checkpoint of the setup's writes
+                    store._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                    start = time.perf_counter()
+                    refresh(store, fetched)
+                    return time.perf_counter() - start
+                return run
+
+            timings = [best_of(date_scan), best_of(later_refresh(current)),
+                       best_of(later_refresh(_after(current, cutoff)))]
+        print(f"{n:>10,} {n / PER_DAY / 365.25:>6.1f}" + "".join(f" {t * 1e3:>9.2f} ms" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
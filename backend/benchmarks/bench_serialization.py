@@ -0,0 +1,87 @@
+"""
+Serialization cost of our largest car payloads, before vs after the fast path
+
+    cd backend && python -m benchmarks.bench_serialization
+
+Needs the usual backend .env (importing the routes creates the Supabase
+client) but makes no network calls. Compares, per /agents/search-car call:
+  before: format_scraped_car + json.dumps into carData + stdlib JSON render
+  after:  cached entry + pre-encoded carData fragment + orjson render
+and the raw encode cost of one formatted vehicle with json vs orjson
+"""
+import json
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from routes.car_routes import format_scraped_car, get_cached_vehicle
+from utils.fast_json import FastJSONResponse, Fragment, dumps
+
+N_IMAGES = 40
+
+
+def largest_row() -> dict:
+    """A scraped_cars row at the top end of what cars.com gives us"""
+    images = {
+        str(i): f"https://platform.cstatic-images.com/xlarge/in/v2/stock_photos/{i:04d}-toyota-highlander.jpg"
+        for i in range(N_IMAGES)
+    }
+    specs = {
+        "combined_mpg": "24", "fuel_type": "Regular", "transmission": "8-speed automatic",
+        "body_style": "SUV", "drivetrain": "All-Wheel Drive",
+        "dimensions": "194.9 in L x 76.0 in W x 68.1 in H",
+        **{f"extra_spec_{i}": f"value {i}" for i in range(20)},
+    }
+    return {
+        "id": "2020_highlander", "name": "Highlander", "year": 2020, "make": "toyota",
+        "price": 34810.0, "images": json.dumps(images), "additional_specs": json.dumps(specs),
+        "horsepower": "295 hp", "mpg": "21 city / 29 hwy", "seating_capacity": "8",
+        "cargo_space": "84.3 cu.ft.", "towing_capacity": "5,000 lbs", "fuel_tank_capacity": "17.9 gal.",
+        "curb_weight": "4,450 lbs", "ground_clearance": "8 in",
+        "source_url": "https://www.cars.com/research/toyota-highlander-2020/",
+        "updated_at": "2025-10-18T12:00:00+00:00",
+    }
+
+
+def tool_payload(car_data) -> dict:
+    return {"success": True, "carData": car_data, "message": "Found 2020 Toyota Highlander"}
+
+
+def before(row: dict) -> bytes:
+    formatted = format_scraped_car(row)
+    content = jsonable_encoder(tool_payload(json.dumps(formatted)))
+    return JSONResponse(content).body
+
+
+def after(row: dict) -> bytes:
+    cached = get_cached_vehicle(row)
+    return FastJSONResponse(tool_payload(Fragment(cached.json_literal))).body
+
+
+def bench(label: str, fn, number: int) -> float:
+    per_call = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"  {label:<52} {per_call * 1e6:>10.1f} us")
+    return per_call
+
+
+def main():
+    row = largest_row()
+    formatted = format_scraped_car(row)
+    size = len(dumps(formatted))
+    assert json.loads(json.loads(after(row))["carData"]) == json.loads(json.dumps(formatted))
+
+    print(f"Formatted vehicle: {size:,} bytes, {N_IMAGES} images\n")
+    print("Encode one formatted vehicle")
+    slow = bench("json.dumps", lambda: json.dumps(formatted), 2000)
+    fast = bench("fast_json.dumps (orjson)", lambda: dumps(formatted), 2000)
+    print(f"  speed-up: {slow / fast:.1f}x\n")
+
+    print("/agents/search-car response (format + carData + render)")
+    slow = bench("before: format + json.dumps + JSONResponse", lambda: before(row), 1000)
+    fast = bench("after: cached fragment + FastJSONResponse", lambda: after(row), 1000)
+    print(f"  speed-up: {slow / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
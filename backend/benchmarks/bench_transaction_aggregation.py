@@ -0,0 +1,165 @@
+"""
+Nessie summary() per refresh: the old pure-Python loop vs what it runs now
+
+    cd backend && python -m benchmarks.bench_transaction_aggregation
+
+No .env or network needed. Generates synthetic transaction histories (a
+mix of deposits, monthly bills and one-off purchases, spread over two years)
+at several sizes and times, per refresh:
+  legacy loop:    the per-transaction loop summary() ran over the whole history
+  first refresh:  RollupStore.summarize() on an empty store, the call
+                  summary() makes (a customer's first refresh: the whole
+                  history is read into columns and folded)
+  later refresh:  the same history plus NEW_SHARE new transactions, into a
+                  store that already holds it (every later refresh)
+with how many times faster than the legacy loop each refresh is. Each
+RollupStore is a throwaway SQLite file in a temporary directory. It also
+checks that folding the history in two steps gives the same rollups and
+subscriptions as folding it all at once
+
+The legacy loop did less (no calendar months, no cadence detection, a fixed
+three-month spread), so it is a floor rather than a like-for-like baseline.
+A later refresh still reads every transaction's date once, and re-detects
+the merchants the new transactions were charged by over their charges of the
+last LOOKBACK_DAYS, which here is the whole two-year history.
+bench_rollup_refresh.py shows how a refresh scales with the length of the
+history
+"""
+from datetime import date, timedelta
+from statistics import pstdev
+from typing import Any, Dict, List, Tuple
+import os
+import random
+import tempfile
+import time
+
+from utils.transaction_rollups import RollupStore
+
+SIZES = (1_000, 10_000, 50_000)
+HISTORY_DAYS = 730
+# Share of the history that is new since the previous refresh
+NEW_SHARE = 0.01
+REPEAT = 5
+
+BILLS = ["netflix", "spotify", "rent", "car insurance", "gym membership", "phone bill", "internet"]
+PURCHASES = [f"merchant {i}" for i in range(400)] + ["groceries", "fuel", "restaurants", "coffee"]
+TODAY = date(2024, 6, 30)
+
+
+def synthetic_transactions(n: int, seed: int = 7, days: int = HISTORY_DAYS) -> List[Dict[str, Any]]:
+    """n transactions over days ending at TODAY, oldest first"""
+    rng = random.Random(seed)
+    start = TODAY - timedelta(days=days)
+    txs = []
+    for i in range(n):
+        day = (start + timedelta(days=i * days // n)).isoformat()
+        roll = rng.random()
+        if roll < 0.1:
+            tx = {"amount": round(rng.uniform(500, 3000), 2), "transaction_type": "deposit",
+                  "description": "Payroll"}
+        elif roll < 0.3:
+            tx = {"amount": -round(rng.uniform(10, 1800), 2), "transaction_type": "debit",
+                  "description": rng.choice(BILLS).title()}
+        else:
+            tx = {"amount": round(rng.uniform(2, 250), 2), "transaction_type": rng.choice(["debit", "purchase"]),
+                  "description": rng.choice(PURCHASES) if rng.random() < 0.97 else None}
+        txs.append({"_id": f"tx{i}", "transaction_date": day, **tx})
+    return txs
+
+
+def legacy_summary(txs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """The per-transaction loop summary() used before the engine"""
+    inflows: List[float] = []
+    outflows: List[float] = []
+    cats: Dict[str, float] = {}
+    counts: Dict[str, int] = {}
+    for t in txs:
+        amt = float(abs((t.get("amount") or 0)))
+        typ = (t.get("transaction_type") or "").lower()
+        desc = (t.get("description") or "other").lower()
+        if "deposit" in typ or "credit" in typ:
+            inflows.append(amt)
+        else:
+            outflows.append(amt)
+            cats[desc] = cats.get(desc, 0.0) + amt
+        counts[desc] = counts.get(desc, 0) + 1
+
+    recurring_total = 0.0
+    for t in txs:
+        desc = (t.get("description") or "other").lower()
+        if counts.get(desc, 0) >= 3:
+            recurring_total += float(abs((t.get("amount") or 0)))
+
+    months_assumed = 3.0
+    return {
+        "monthly_inflow": round(sum(inflows) / months_assumed if inflows else 0.0, 2),
+        "monthly_outflow": round(sum(outflows) / months_assumed if outflows else 0.0, 2),
+        "monthly_outflow_std": round(pstdev(outflows) if len(outflows) > 1 else 0.0, 2),
+        "recurring_bills": round(recurring_total / months_assumed, 2),
+        "categories": {k: round(v / months_assumed, 2)
+                       for k, v in sorted(cats.items(), key=lambda kv: kv[1], reverse=True)[:10]},
+    }
+
+
+def refresh(store: RollupStore, txs: List[Dict[str, Any]]) -> Tuple[Any, Any]:
+    _, aggregates, subscriptions = store.summarize("customer", [("account", txs)], today=TODAY)
+    return aggregates, subscriptions
+
+
+def rollup_rows(store: RollupStore) -> List[Tuple]:
+    with store._lock:
+        return store._db.execute(
+            "SELECT month, round(inflow, 6), round(outflow, 6), round(outflow_sq, 4), outflow_n, tx_count "
+            "FROM rollup_months ORDER BY month"
+        ).fetchall()
+
+
+def check_incremental(directory: str, history: List[Dict[str, Any]], current: List[Dict[str, Any]]) -> None:
+    once = RollupStore(os.path.join(directory, "once.sqlite"))
+    twice = RollupStore(os.path.join(directory, "twice.sqlite"))
+    summary = refresh(once, current)
+    refresh(twice, history)
+    assert refresh(twice, current) == summary
+    assert rollup_rows(once) == rollup_rows(twice)
+
+
+def best_of(run) -> float:
+    """Fastest of REPEAT runs; run(i) returns its own elapsed seconds"""
+    return min(run(i) for i in range(REPEAT))
+
+
+def main():
+    print(f"{'transactions':>12} {'legacy loop':>12} {'first refresh':>22} {'later refresh':>22}")
+    for n in SIZES:
+        current = synthetic_transactions(n)
+        history = current[:int(n * (1 - NEW_SHARE))]
+        with tempfile.TemporaryDirectory() as directory:
+            check_incremental(directory, history, current)
+
+            def legacy(_):
+                start = time.perf_counter()
+                legacy_summary(current)
+                return time.perf_counter() - start
+
+            def first_refresh(i):
+                store = RollupStore(os.path.join(directory, f"first-{n}-{i}.sqlite"))
+                start = time.perf_counter()
+                refresh(store, current)
+                return time.perf_counter() - start
+
+            def later_refresh(i):
+                store = RollupStore(os.path.join(directory, f"later-{n}-{i}.sqlite"))
+                refresh(store, history)
+                # Don't time the checkpoint of the setup's writes
+                store._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                start = time.perf_counter()
+                refresh(store, current)
+                return time.perf_counter() - start
+
+            baseline, first, later = best_of(legacy), best_of(first_refresh), best_of(later_refresh)
+        print(f"{n:>12,} {baseline * 1e3:>9.2f} ms"
+              + "".join(f" {t * 1e3:>9.2f} ms ({baseline / t:>5.2f}x)" for t in (first, later)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from utils.fast_json import FastJSONResponse
 import logging
 import os
 # from routes.chat_routes import chat_router
@@ -9,13 +10,27 @@ from routes.car_routes import router as car_router
 from routes.agent_tools import agent_router as agent_tools_router
 from routes.nessie_routes import nessie_router
 from utils.initialize_supabase import get_supabase_client
+from utils.car_catalog import get_car_catalog
+from utils.http_clients import get_http_clients
+from utils.cache import get_cache, get_local_cache
+from utils.single_flight import single_flight_stats
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pooled keep-alive clients for Nessie / ElevenLabs (see utils/http_clients.py)
+    await get_http_clients().start()
+    try:
+        yield
+    finally:
+        await get_http_clients().aclose()
+
 # Initialize FastAPI app
-app = FastAPI()
+# orjson-backed responses app-wide (see utils/fast_json.py)
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -29,8 +44,10 @@ app.add_middleware(
         "Accept", 
         "Origin", 
         "User-Agent",
-        "X-Requested-With"
+        "X-Requested-With",
+        "If-None-Match"
     ],  # Only necessary headers
+    expose_headers=["ETag"],  # Lets the frontend read vehicle ETags for conditional GETs
 )
 
 # Initialize Supabase client
@@ -41,6 +58,13 @@ except Exception as e:
     logger.error(f"❌ Failed to initialize Supabase client: {e}")
     raise
 
+# Warm the in-memory car catalog so the first voice turn doesn't pay for the load
+try:
+    get_car_catalog().refresh()
+    logger.info("✅ Car catalog snapshot loaded")
+except Exception as e:
+    logger.warning(f"⚠️  Car catalog warm-up failed, will load on first request: {e}")
+
 # Include routes
 app.include_router(eleven_router)
 app.include_router(car_router)
@@ -60,11 +84,24 @@ async def root():
         "version": "1.0.0",
     }
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Entries, bytes and hit/miss/eviction counters of the app cache, per
+    namespace, plus request-coalescing counters. With CACHE_BACKEND=sqlite
+    the in-process cache (formatted vehicles) is reported under "local"
+    """
+    shared, local = get_cache(), get_local_cache()
+    out = {**await shared.astats(), "single_flight": single_flight_stats()}
+    if local is not shared:
+        out["local"] = await local.astats()
+    return out
+
 # Error handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Custom error handling"""
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=exc.status_code,
         content={
             "error": exc.detail,
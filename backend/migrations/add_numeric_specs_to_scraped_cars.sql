@@ -0,0 +1,31 @@
+-- Typed numeric spec columns for scraped_cars
+-- The scraper stores specs as display text ("203 hp", "3,310 lbs"); these
+-- columns hold the same values parsed once at ingest time, in fixed units,
+-- so range filters and sorting can run on real numbers.
+-- Existing rows are filled by backfill_numeric_specs.py
+
+ALTER TABLE public.scraped_cars
+    ADD COLUMN IF NOT EXISTS horsepower_hp INTEGER,
+    ADD COLUMN IF NOT EXISTS mpg_city NUMERIC,
+    ADD COLUMN IF NOT EXISTS mpg_highway NUMERIC,
+    ADD COLUMN IF NOT EXISTS mpg_combined NUMERIC,
+    ADD COLUMN IF NOT EXISTS seating_capacity_num INTEGER,
+    ADD COLUMN IF NOT EXISTS cargo_space_cu_ft NUMERIC,
+    ADD COLUMN IF NOT EXISTS towing_capacity_lbs NUMERIC,
+    ADD COLUMN IF NOT EXISTS fuel_tank_gal NUMERIC,
+    ADD COLUMN IF NOT EXISTS curb_weight_lbs NUMERIC,
+    ADD COLUMN IF NOT EXISTS ground_clearance_in NUMERIC;
+
+-- Indexes for the common range filters / sorts
+CREATE INDEX IF NOT EXISTS idx_scraped_cars_price ON public.scraped_cars(price);
+CREATE INDEX IF NOT EXISTS idx_scraped_cars_mpg_combined ON public.scraped_cars(mpg_combined);
+CREATE INDEX IF NOT EXISTS idx_scraped_cars_horsepower_hp ON public.scraped_cars(horsepower_hp);
+CREATE INDEX IF NOT EXISTS idx_scraped_cars_seating_capacity_num ON public.scraped_cars(seating_capacity_num);
+
+COMMENT ON COLUMN public.scraped_cars.horsepower_hp IS 'Horsepower parsed from horsepower text (kW converted to hp)';
+COMMENT ON COLUMN public.scraped_cars.mpg_combined IS 'Combined MPG; derived from city/highway (EPA 55/45) when not given';
+COMMENT ON COLUMN public.scraped_cars.cargo_space_cu_ft IS 'Cargo space in cubic feet (liters converted)';
+COMMENT ON COLUMN public.scraped_cars.towing_capacity_lbs IS 'Towing capacity in pounds (kg converted)';
+COMMENT ON COLUMN public.scraped_cars.fuel_tank_gal IS 'Fuel tank capacity in US gallons (liters converted)';
+COMMENT ON COLUMN public.scraped_cars.curb_weight_lbs IS 'Curb weight in pounds (kg converted)';
+COMMENT ON COLUMN public.scraped_cars.ground_clearance_in IS 'Ground clearance in inches (mm/cm converted)';
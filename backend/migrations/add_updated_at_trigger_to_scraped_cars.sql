@@ -0,0 +1,18 @@
+-- Keep scraped_cars.updated_at current on every upsert/update
+-- The API caches formatted vehicles by (id, updated_at), so this column must
+-- change whenever a row's content changes
+
+-- Reuses update_updated_at_column() from add_updated_at_to_profiles.sql
+CREATE OR REPLACE FUNCTION update_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS update_scraped_cars_updated_at ON public.scraped_cars;
+CREATE TRIGGER update_scraped_cars_updated_at
+    BEFORE UPDATE ON public.scraped_cars
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
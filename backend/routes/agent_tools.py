@@ -5,6 +5,7 @@ These tools can be called by the agent to fetch data
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from utils.initialize_supabase import get_supabase_client
+from utils.car_catalog import get_car_catalog
 from typing import Optional
 import json
 
@@ -13,25 +14,54 @@ from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import logging
 import json
+import os
 
 
+from utils.cache import get_cache
+from utils.fast_json import FastJSONResponse, Fragment, dumps
 from ai_agents.loanAgent import run_auto_finance_agent, FinancingOptions
 from ai_agents.trimRecAgent import trim_mapper, TrimRankingOutput
 from agents import Runner
 
 logger = logging.getLogger(__name__)
 
+# Trim recommendations are an LLM run (seconds) and depend only on the request
+TRIM_REC_CACHE_TTL_SEC = int(os.getenv("TRIM_REC_CACHE_TTL_SEC", "86400"))
+get_cache().configure("agents:trim", TRIM_REC_CACHE_TTL_SEC)
+
 
 agent_router = APIRouter(prefix="/agents", tags=["agents"])
 
 class SearchCarRequest(BaseModel):
     make: str
-    model: str
+    model: Optional[str] = None  # Optional so the agent can search by filters alone ("AWD under 30k")
     year: Optional[str] = None
     fuelType: Optional[str] = None  # e.g., "Regular", "Gasoline or E85", "Regular Gas and Electricity"
     drive: Optional[str] = None  # e.g., "Front-Wheel Drive", "All-Wheel Drive", "4-Wheel Drive"
     minMpg: Optional[int] = None  # Minimum combined MPG
     maxPrice: Optional[int] = None  # Maximum MSRP
+    minHorsepower: Optional[int] = None
+    maxHorsepower: Optional[int] = None
+    minSeating: Optional[int] = None
+    maxSeating: Optional[int] = None
+    minCargo: Optional[float] = None  # Cargo space in cu ft
+    maxCargo: Optional[float] = None
+    sortBy: Optional[str] = "year"  # "year", "price", "mpg" or "horsepower"
+    page: Optional[int] = 1
+    pageSize: Optional[int] = 5  # First match is displayed, the rest are offered as alternatives
+
+class RecommendCarsAgent(BaseModel):
+    """Request model for the recommend-cars tool (see car_routes.RecommendCarsRequest)"""
+    budget: Optional[float] = None  # Max MSRP the user is comfortable with
+    passengers: Optional[int] = None
+    fuelType: Optional[str] = None  # e.g. "hybrid", "Regular Gas and Electricity"
+    bodyStyles: Optional[List[str]] = None  # e.g. ["SUV", "Minivan"]
+    features: Optional[List[str]] = None  # e.g. ["AWD", "third row"]
+    usage: Optional[List[str]] = None  # e.g. ["commute", "family", "towing"]
+    make: Optional[str] = None
+    model: Optional[str] = None
+    year: Optional[int] = None
+    k: int = 5  # number of alternatives; capped by RecommendCarsRequest
 
 class LoanAgent(BaseModel):
     """Request model for loan agent"""
@@ -59,32 +89,41 @@ async def search_car_tool(request: SearchCarRequest):
     pass the result to the displayCarInfo client tool to show the UI
     """
     try:
-        supabase = get_supabase_client()
-        
-        # Import the formatting function from car_routes
-        from .car_routes import format_scraped_car
-        
-        # Search scraped_cars table (has real images from cars.com)
-        query = supabase.table('scraped_cars').select('*')
-        query = query.ilike('make', request.make)
-        query = query.ilike('name', f'%{request.model}%')
+        # Import the cached formatting helpers from car_routes
+        from .car_routes import get_cached_vehicle
         
-        if request.year:
-            query = query.eq('year', int(request.year))
-        
-        # Note: Can add filters for scraped data if needed
-        # For now, just get the first match
-        result = query.order('year', desc=True).limit(1).execute()
+        # Filter the in-memory scraped_cars snapshot (has real images from cars.com)
+        # in one vectorized pass over its columnar view
+        result = get_car_catalog().snapshot().query(
+            make=request.make,
+            model=request.model,
+            year=int(request.year) if request.year else None,
+            fuel_type=request.fuelType,
+            drive=request.drive,
+            min_mpg=request.minMpg,
+            max_price=request.maxPrice,
+            min_horsepower=request.minHorsepower,
+            max_horsepower=request.maxHorsepower,
+            min_seating=request.minSeating,
+            max_seating=request.maxSeating,
+            min_cargo=request.minCargo,
+            max_cargo=request.maxCargo,
+            sort_by=request.sortBy or "year",
+            page=request.page or 1,
+            page_size=min(request.pageSize or 5, 50),
+        )
+        matches = result["rows"]
         
-        if not result.data or len(result.data) == 0:
+        if not matches:
             return {
                 "success": False,
-                "error": f"No vehicle found matching {request.make} {request.model}" + (f" {request.year}" if request.year else ""),
-                "carData": None
+                "error": f"No vehicle found matching {request.make} {request.model or ''}".rstrip() + (f" {request.year}" if request.year else ""),
+                "carData": None,
+                "facets": result["facets"],
             }
         
-        vehicle = result.data[0]
-        formatted_vehicle = format_scraped_car(vehicle)
+        cached_vehicle = get_cached_vehicle(matches[0])
+        formatted_vehicle = cached_vehicle.formatted
         
         # Build detailed message for the agent with key information
         year = formatted_vehicle.get('year', 'N/A')
@@ -112,19 +151,83 @@ async def search_car_tool(request: SearchCarRequest):
         if mpg:
             message_parts.append(f"MPG: {mpg}")
         
+        if result["total"] > 1:
+            message_parts.append(f"{result['total']} vehicles match in total")
+        
         message_parts.append("Displaying with real photos from cars.com.")
         
         # Return as JSON string for the agent to pass to client tool
+        # (spliced in pre-encoded from the vehicle cache, not re-serialized)
+        return FastJSONResponse({
+            "success": True,
+            "carData": Fragment(cached_vehicle.json_literal),
+            "message": " | ".join(message_parts),
+            "totalMatches": result["total"],
+            "alternatives": [
+                {
+                    "id": row.get("id"),
+                    "year": row.get("year"),
+                    "model": row.get("name"),
+                    "msrp": row.get("price"),
+                }
+                for row in matches[1:]
+            ],
+            "facets": result["facets"],
+        })
+    
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Error searching vehicle: {str(e)}",
+            "carData": None
+        }
+
+@agent_router.post("/recommend-cars")
+async def recommend_cars_tool(request: RecommendCarsAgent):
+    """
+    Server-side tool for voice agent to get several ranked alternatives in one turn
+    Scores the whole catalog against the user's preferences (budget,
+    passengers, fuel type, body style, features, usage) and returns the top k.
+    carData holds the best match, ready for the displayCarInfo client tool
+    """
+    try:
+        from .car_routes import RecommendCarsRequest, recommend_vehicles
+        
+        ranked = recommend_vehicles(RecommendCarsRequest(**request.model_dump()))
+        if not ranked:
+            return {
+                "success": False,
+                "error": "No vehicles match those preferences",
+                "carData": None
+            }
+        
+        picks = [
+            f"{v['year']} {v['make']} {v['model']} (score {v['totalScore']}"
+            + (f", ${v['msrp']:,.0f}" if v.get('msrp') else "") + ")"
+            for v in ranked
+        ]
         return {
             "success": True,
-            "carData": json.dumps(formatted_vehicle),
-            "message": " | ".join(message_parts)
+            "carData": dumps(ranked[0]).decode("utf-8"),
+            "recommendations": [
+                {
+                    "id": v["id"],
+                    "year": v["year"],
+                    "model": v["model"],
+                    "msrp": v["msrp"],
+                    "totalScore": v["totalScore"],
+                    "factors": v["factors"],
+                }
+                for v in ranked
+            ],
+            "message": "Top matches: " + "; ".join(picks)
         }
     
     except Exception as e:
+        logger.error(f"Error recommending cars: {str(e)}", exc_info=True)
         return {
             "success": False,
-            "error": f"Error searching vehicle: {str(e)}",
+            "error": f"Error recommending vehicles: {str(e)}",
             "carData": None
         }
 
@@ -180,6 +283,15 @@ async def get_trim_recommendations(request: TrimRecAgent):
         logger.info(f"Features: {request.features}")
         logger.info(f"Model candidates: {request.model_candidates}")
         
+        cache_key = (
+            tuple(sorted({f.strip().lower() for f in request.features})),
+            tuple(sorted({m.strip().lower() for m in request.model_candidates or []})),
+        )
+        cached = await get_cache().aget("agents:trim", cache_key)
+        if cached is not None:
+            logger.info("Trim recommendation served from cache")
+            return cached
+        
         # Prepare input for the agent
         agent_input = {
             "features": request.features
@@ -197,7 +309,9 @@ async def get_trim_recommendations(request: TrimRecAgent):
         # Extract the structured output
         final_output = result.final_output_as(TrimRankingOutput)
         
-        return final_output.model_dump()
+        out = final_output.model_dump()
+        await get_cache().aset("agents:trim", cache_key, out)
+        return out
             
     except Exception as e:
         logger.error(f"Error in trim recommendation agent: {str(e)}", exc_info=True)
@@ -254,6 +368,8 @@ async def check_affordability_tool(request: NessieCustomerRequest):
         monthly_income = financial_summary["monthly_inflow"]
         monthly_spending = financial_summary["monthly_outflow"]
         recurring_bills = financial_summary["recurring_bills"]
+        # Detected subscriptions; the summary already carries them, no extra upstream calls
+        subscriptions = financial_summary.get("subscriptions") or []
         available_for_car = monthly_income - monthly_spending
         potential_savings = savings_tips["estimated_monthly_savings"]
         
@@ -271,6 +387,10 @@ async def check_affordability_tool(request: NessieCustomerRequest):
         spoken_parts = []
         spoken_parts.append(f"Based on your bank account, you earn ${round(monthly_income):,} per month")
         spoken_parts.append(f"and spend about ${round(monthly_spending):,}")
+        if subscriptions:
+            spoken_parts.append(
+                f"{len(subscriptions)} recurring bills take about ${round(recurring_bills):,} of that each month"
+            )
         spoken_parts.append(f"A comfortable car payment for you would be between ${round(comfortable_min)} and ${round(comfortable_max)}")
         
         if potential_savings > 50:
@@ -284,6 +404,15 @@ async def check_affordability_tool(request: NessieCustomerRequest):
             "monthly_income": round(monthly_income, 2),
             "monthly_spending": round(monthly_spending, 2),
             "recurring_bills": round(recurring_bills, 2),
+            "subscriptions": [
+                {
+                    "merchant": sub["merchant"],
+                    "cadence": sub["cadence"],
+                    "monthly_amount": sub["monthly_amount"],
+                    "next_expected": sub["next_expected"],
+                }
+                for sub in subscriptions
+            ],
             "available_for_car": round(available_for_car, 2),
             "comfortable_payment_min": round(comfortable_min, 2),
             "comfortable_payment_max": round(comfortable_max, 2),
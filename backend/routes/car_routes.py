@@ -3,41 +3,87 @@ Car lookup routes for voice agent
 Provides simple make/model lookup without recommendation engine
 Uses scraped_cars table with real photos from cars.com
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from utils.initialize_supabase import get_supabase_client
-from typing import Optional
+from utils.car_catalog import get_car_catalog
+from utils.vehicle_cache import CachedVehicle, get_vehicle_cache
+from utils.http_cache import conditional_json_response, make_etag
+from utils.fast_json import Fragment, dumps, dumps_with_fragments
+from utils.car_scoring import score_vehicle
+from utils.spec_parsing import typed_specs
+from typing import Any, Dict, Iterator, List, Optional
 import json
 
 router = APIRouter(prefix="/api/cars", tags=["cars"])
 
+MAX_BATCH_IDS = 50
+MAX_PAGE_SIZE = 50
+EXPORT_TABLES = ("scraped_cars", "vehicles")
+MAX_EXPORT_PAGE_SIZE = 1000
+
+
+class BatchVehicleRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_IDS)
+
+
+class RecommendCarsRequest(BaseModel):
+    """User preferences to score the catalog against, plus optional hard filters"""
+    budget: Optional[float] = None  # Max MSRP the user is comfortable with
+    passengers: Optional[int] = None
+    fuelType: Optional[str] = None  # e.g. "hybrid", "Regular Gas and Electricity"
+    bodyStyles: Optional[List[str]] = None  # e.g. ["SUV", "Minivan"]
+    features: Optional[List[str]] = None  # e.g. ["AWD", "third row"]
+    usage: Optional[List[str]] = None  # e.g. ["commute", "family", "towing"]
+    make: Optional[str] = None
+    model: Optional[str] = None
+    year: Optional[int] = None
+    k: int = Field(5, ge=1, le=MAX_PAGE_SIZE)
+
+
+def recommend_vehicles(request: RecommendCarsRequest) -> List[dict]:
+    """
+    Top-k formatted vehicles for a preference vector
+    The whole snapshot is scored in one matrix operation
+    """
+    ranked = get_car_catalog().snapshot().recommend(
+        k=request.k,
+        preferences={
+            "budget": request.budget,
+            "passengers": request.passengers,
+            "fuel_type": request.fuelType,
+            "body_styles": request.bodyStyles,
+            "desired_features": request.features,
+            "usage": request.usage,
+        },
+        make=request.make,
+        model=request.model,
+        year=request.year,
+    )
+    return [with_scores(get_formatted_vehicle(row), scores) for row, scores in ranked]
+
+
 @router.get("/search")
-async def search_car_by_make_model(make: str, model: str, year: Optional[str] = None):
+async def search_car_by_make_model(request: Request, make: str, model: str, year: Optional[str] = None):
     """
     Search for a vehicle by make and model (optionally year)
     Returns vehicle data formatted for displayCarInfo client tool
     All vehicles have real images from cars.com
+    Sends a strong ETag and answers If-None-Match with 304
     """
     try:
-        supabase = get_supabase_client()
-        
-        # Search scraped_cars table
-        query = supabase.table('scraped_cars').select('*')
-        query = query.ilike('make', make)
-        query = query.ilike('name', f'%{model}%')
-        
-        if year:
-            query = query.eq('year', int(year))
+        # Answered from the in-memory catalog snapshot (no Supabase round trip)
+        matches = get_car_catalog().snapshot().search(make, model, int(year) if year else None)
         
-        result = query.order('year', desc=True).limit(1).execute()
-        
-        if not result.data or len(result.data) == 0:
+        if not matches:
             raise HTTPException(
                 status_code=404, 
                 detail=f"No vehicle found matching {make} {model}" + (f" {year}" if year else "")
             )
         
-        vehicle = result.data[0]
-        return format_scraped_car(vehicle)
+        cached = get_cached_vehicle(matches[0])
+        return conditional_json_response(request, cached.json, cached.etag)
     
     except HTTPException:
         raise
@@ -45,19 +91,212 @@ async def search_car_by_make_model(make: str, model: str, year: Optional[str] =
         raise HTTPException(status_code=500, detail=f"Error searching vehicle: {str(e)}")
 
 
+@router.get("/filter")
+async def filter_cars(
+    make: Optional[str] = None,
+    model: Optional[str] = None,
+    year: Optional[int] = None,
+    fuelType: Optional[str] = None,
+    drive: Optional[str] = None,
+    minMpg: Optional[float] = None,
+    minPrice: Optional[float] = None,
+    maxPrice: Optional[float] = None,
+    minHorsepower: Optional[float] = None,
+    maxHorsepower: Optional[float] = None,
+    minSeating: Optional[int] = None,
+    maxSeating: Optional[int] = None,
+    minCargo: Optional[float] = None,
+    maxCargo: Optional[float] = None,
+    sortBy: str = "year",
+    page: int = 1,
+    pageSize: int = 10,
+):
+    """
+    Faceted search over the catalog snapshot
+    Returns ranked, paginated vehicles plus facet counts (fuelType, drive,
+    bodyStyle, year) over everything that matched
+    """
+    try:
+        result = get_car_catalog().snapshot().query(
+            make=make, model=model, year=year, fuel_type=fuelType, drive=drive,
+            min_mpg=minMpg, min_price=minPrice, max_price=maxPrice,
+            min_horsepower=minHorsepower, max_horsepower=maxHorsepower,
+            min_seating=minSeating, max_seating=maxSeating,
+            min_cargo=minCargo, max_cargo=maxCargo,
+            sort_by=sortBy, page=page, page_size=min(pageSize, MAX_PAGE_SIZE),
+        )
+        return {
+            "total": result["total"],
+            "page": result["page"],
+            "pageSize": result["pageSize"],
+            "results": [get_formatted_vehicle(row) for row in result["rows"]],
+            "facets": result["facets"],
+        }
+    
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error filtering vehicles: {str(e)}")
+
+
+@router.get("/export")
+async def export_catalog(table: str = "scraped_cars", pageSize: int = 500):
+    """
+    Stream a whole catalog table as NDJSON (one vehicle per line)
+    Pages through the table with keyset pagination on (year, id), so memory
+    stays flat and consumers can start reading after the first page.
+    scraped_cars rows are written formatted like /api/cars/{id}; vehicles
+    rows are written as stored
+    """
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=400, detail=f"table must be one of {', '.join(EXPORT_TABLES)}")
+    page_size = max(1, min(pageSize, MAX_EXPORT_PAGE_SIZE))
+    
+    def ndjson_lines() -> Iterator[str]:
+        # Export rows are formatted uncached so a full dump doesn't evict the hot vehicles
+        for row in iter_table_keyset(table, page_size):
+            item = format_scraped_car(row) if table == "scraped_cars" else row
+            yield json.dumps(item, default=str) + "\n"
+    
+    return StreamingResponse(
+        ndjson_lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{table}.ndjson"'},
+    )
+
+
+def _postgrest_quote(value: Any) -> str:
+    """Quote a value for use inside a PostgREST or=(...) filter"""
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def iter_table_keyset(table: str, page_size: int) -> Iterator[Dict[str, Any]]:
+    """
+    Yield every row of `table` ordered by (year, id), one page in memory at a time
+    Each page starts strictly after the last (year, id) seen, which (unlike
+    offset paging) stays O(page) per query and doesn't skip/repeat rows if
+    the table changes mid-export. Rows with a NULL year come last, by id
+    """
+    supabase = get_supabase_client()
+    last_year, last_id = None, None
+    while True:
+        query = supabase.table(table).select('*').not_.is_('year', 'null')
+        if last_id is not None:
+            year, vid = _postgrest_quote(last_year), _postgrest_quote(last_id)
+            query = query.or_(f"year.gt.{year},and(year.eq.{year},id.gt.{vid})")
+        rows = query.order('year').order('id').limit(page_size).execute().data or []
+        yield from rows
+        if len(rows) < page_size:
+            break
+        last_year, last_id = rows[-1]["year"], rows[-1]["id"]
+    
+    last_id = None
+    while True:
+        query = supabase.table(table).select('*').is_('year', 'null')
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        rows = query.order('id').limit(page_size).execute().data or []
+        yield from rows
+        if len(rows) < page_size:
+            break
+        last_id = rows[-1]["id"]
+
+
+@router.post("/recommend")
+async def recommend_cars(request: RecommendCarsRequest):
+    """
+    Rank the catalog against the user's preferences
+    Returns the top `k` vehicles with real totalScore/factors
+    """
+    try:
+        return {"results": recommend_vehicles(request)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error recommending vehicles: {str(e)}")
+
+
+@router.post("/batch")
+async def get_vehicles_by_ids(request: Request, batch: BatchVehicleRequest):
+    """
+    Get several vehicles in one call (card manager / comparison views)
+    Ids are resolved from the catalog snapshot; anything not in it is fetched
+    with a single `in_()` query. Vehicles come back in request order and
+    ids that don't exist are listed in `missing`
+    Sends a strong ETag over the (id, vehicle ETag) pairs and answers
+    If-None-Match with 304, like the single-vehicle GET
+    """
+    try:
+        # Preserve request order, drop duplicates
+        ids = list(dict.fromkeys(batch.ids))
+        
+        snapshot = get_car_catalog().snapshot()
+        found = {vid: snapshot.get(vid) for vid in ids}
+        
+        not_in_snapshot = [vid for vid, row in found.items() if row is None]
+        if not_in_snapshot:
+            supabase = get_supabase_client()
+            result = supabase.table('scraped_cars').select('*').in_('id', not_in_snapshot).execute()
+            for row in result.data or []:
+                found[str(row.get("id"))] = row
+        
+        cached = {vid: get_cached_vehicle(found[vid]) for vid in ids if found.get(vid)}
+        missing = [vid for vid in ids if vid not in cached]
+        # Each vehicle's ETag already covers its encoded payload
+        etag = make_etag(dumps([[vid, cached[vid].etag if vid in cached else None] for vid in ids]))
+        return conditional_json_response(request, lambda: dumps_with_fragments({
+            "vehicles": [Fragment(entry.json) for entry in cached.values()],
+            "missing": missing,
+        }), etag)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching vehicles: {str(e)}")
+
+
+@router.post("/catalog/refresh")
+async def refresh_catalog():
+    """
+    Reload the in-memory scraped_cars snapshot right away
+    (e.g. after a scraping run) instead of waiting for the TTL
+    """
+    try:
+        catalog = get_car_catalog()
+        catalog.refresh()
+        return catalog.stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error refreshing catalog: {str(e)}")
+
+
+@router.get("/catalog/stats")
+async def catalog_stats():
+    """
+    Size and age of the in-memory scraped_cars snapshot,
+    plus hit/miss counters for the formatted vehicle cache
+    """
+    return {**get_car_catalog().stats(), "formatted_cache": get_vehicle_cache().stats()}
+
+
 @router.get("/{vehicle_id}")
-async def get_vehicle_by_id(vehicle_id: str):
+async def get_vehicle_by_id(request: Request, vehicle_id: str):
     """
     Get a specific vehicle by ID
+    Sends a strong ETag and answers If-None-Match with 304; vehicles in the
+    catalog snapshot are validated without touching Supabase
     """
     try:
+        vehicle = get_car_catalog().snapshot().get(vehicle_id)
+        if vehicle:
+            cached = get_cached_vehicle(vehicle)
+            return conditional_json_response(request, cached.json, cached.etag)
+        
+        # Not in the snapshot yet (e.g. scraped after the last refresh)
         supabase = get_supabase_client()
         result = supabase.table('scraped_cars').select('*').eq('id', vehicle_id).single().execute()
         
         if not result.data:
             raise HTTPException(status_code=404, detail="Vehicle not found")
         
-        return format_scraped_car(result.data)
+        cached = get_cached_vehicle(result.data)
+        return conditional_json_response(request, cached.json, cached.etag)
     
     except HTTPException:
         raise
@@ -93,6 +332,21 @@ def extract_passenger_capacity(vehicle: dict) -> int:
     return 5
 
 
+def get_cached_vehicle(vehicle: dict) -> CachedVehicle:
+    """
+    Cache entry (formatted payload, JSON encoding, ETag) for a scraped_cars row
+    """
+    return get_vehicle_cache().get_or_format(vehicle, format_scraped_car)
+
+
+def get_formatted_vehicle(vehicle: dict) -> dict:
+    """
+    Cached format_scraped_car keyed by (id, updated_at)
+    The returned dict is shared between requests - do not mutate it
+    """
+    return get_cached_vehicle(vehicle).formatted
+
+
 def format_scraped_car(vehicle: dict) -> dict:
     """
     Format a vehicle from scraped_cars table for the frontend
@@ -117,6 +371,8 @@ def format_scraped_car(vehicle: dict) -> dict:
     # Extract MPG from additional_specs or direct fields
     combined_mpg = additional_specs.get("combined_mpg") or vehicle.get("mpg")
     
+    scores = score_vehicle(vehicle)
+    
     formatted_vehicle = {
         "id": vehicle.get("id"),
         "vehicleId": vehicle.get("id"),
@@ -143,18 +399,10 @@ def format_scraped_car(vehicle: dict) -> dict:
         "bodyStyle": additional_specs.get("body_style"),
         "drivetrain": additional_specs.get("drivetrain"),
         "combinedMpgForFuelType1": combined_mpg,
-        # Default scores
-        "totalScore": 88,
-        "confidenceScore": 92,
-        "factors": {
-            "vehicleTypeMatch": 90,
-            "priceCompatibility": 85,
-            "featureAlignment": 88,
-            "passengerFit": 90,
-            "fuelTypeMatch": 95,
-            "usageCompatibility": 85,
-            "locationFactor": 90,
-        },
+        # Scores against default (no stated) preferences; see with_scores()
+        "totalScore": scores["totalScore"],
+        "confidenceScore": scores["confidenceScore"],
+        "factors": scores["factors"],
         "metadata": {
             "matchingFeatures": get_scraped_car_features(vehicle, additional_specs),
             "missingFeatures": [],
@@ -162,22 +410,40 @@ def format_scraped_car(vehicle: dict) -> dict:
                 f"{additional_specs.get('body_style', 'Vehicle')} with {additional_specs.get('drivetrain', 'standard drivetrain')}",
                 f"{combined_mpg or 'Standard'} MPG combined"
             ],
-            "priceAnalysis": {
-                "isWithinBudget": True,
-                "percentageFromBudget": 0,
-            },
+            "priceAnalysis": scores["priceAnalysis"],
             "passengerAnalysis": {
-                "actualCapacity": int(additional_specs.get("seating_capacity", 5)),
+                "actualCapacity": scores["actualCapacity"],
                 "configuration": "Standard",
-                "notes": f"Seats {additional_specs.get('seating_capacity', '5')} passengers comfortably"
+                "notes": f"Seats {scores['actualCapacity']} passengers comfortably"
             },
-            "usageAnalysis": ["Daily commuting", "Family trips"],
+            "usageAnalysis": scores["usageAnalysis"],
         },
     }
     
     return formatted_vehicle
     
 
+def with_scores(formatted_vehicle: dict, scores: dict) -> dict:
+    """
+    Copy of a (cached, shared) formatted vehicle with the score fields
+    replaced by ones computed against a user's preferences
+    """
+    metadata = dict(formatted_vehicle["metadata"])
+    metadata["priceAnalysis"] = scores["priceAnalysis"]
+    metadata["passengerAnalysis"] = {
+        **metadata["passengerAnalysis"],
+        "actualCapacity": scores["actualCapacity"],
+    }
+    metadata["usageAnalysis"] = scores["usageAnalysis"]
+    return {
+        **formatted_vehicle,
+        "totalScore": scores["totalScore"],
+        "confidenceScore": scores["confidenceScore"],
+        "factors": scores["factors"],
+        "metadata": metadata,
+    }
+
+
 def get_scraped_car_features(vehicle: dict, additional_specs: dict) -> list[str]:
     """
     Extract key features from scraped car data
@@ -194,17 +460,13 @@ def get_scraped_car_features(vehicle: dict, additional_specs: dict) -> list[str]
     if drivetrain:
         features.append(drivetrain)
     
-    # Add MPG features if good
-    combined_mpg = additional_specs.get("combined_mpg")
-    if combined_mpg:
-        try:
-            mpg_val = int(combined_mpg)
-            if mpg_val > 30:
-                features.append("Excellent Fuel Economy")
-            elif mpg_val > 25:
-                features.append("Good Fuel Economy")
-        except ValueError:
-            pass
+    # Add MPG features if good (typed mpg_combined column, parsed at ingest)
+    mpg_val = typed_specs(vehicle)["mpg_combined"]
+    if mpg_val:
+        if mpg_val > 30:
+            features.append("Excellent Fuel Economy")
+        elif mpg_val > 25:
+            features.append("Good Fuel Economy")
     
     # Add seating capacity
     seating = additional_specs.get("seating_capacity")
@@ -3,10 +3,10 @@ from pydantic import BaseModel
 import logging
 from utils.supabase_auth import get_current_user, CurrentUser
 from utils.initialize_supabase import get_supabase_client
+from utils.http_clients import get_http_client
 from typing import Annotated, Optional, List, Dict, Any
 import uuid
 import json
-import httpx
 import os
 
 logger = logging.getLogger(__name__)
@@ -42,34 +42,34 @@ async def get_signed_url():
             )
         
         # Make request to ElevenLabs API
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://api.elevenlabs.io/v1/convai/conversation/get-signed-url?agent_id={agent_id}",
-                headers={
-                    "xi-api-key": api_key,
-                }
+        client = get_http_client("elevenlabs")
+        response = await client.get(
+            f"https://api.elevenlabs.io/v1/convai/conversation/get-signed-url?agent_id={agent_id}",
+            headers={
+                "xi-api-key": api_key,
+            }
+        )
+        
+        if response.status_code != 200:
+            logger.error(f"ElevenLabs API request failed: {response.status_code} - {response.text}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to get signed URL from ElevenLabs"
             )
-            
-            if response.status_code != 200:
-                logger.error(f"ElevenLabs API request failed: {response.status_code} - {response.text}")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to get signed URL from ElevenLabs"
-                )
-            
-            data = response.json()
-            signed_url = data.get("signed_url")
-            
-            if not signed_url:
-                logger.error("No signed_url in ElevenLabs API response")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Invalid response from ElevenLabs API"
-                )
-            
-            logger.info("Successfully generated signed URL")
-            return SignedUrlResponse(signedUrl=signed_url)
-            
+        
+        data = response.json()
+        signed_url = data.get("signed_url")
+        
+        if not signed_url:
+            logger.error("No signed_url in ElevenLabs API response")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Invalid response from ElevenLabs API"
+            )
+        
+        logger.info("Successfully generated signed URL")
+        return SignedUrlResponse(signedUrl=signed_url)
+        
     except HTTPException:
         # Re-raise HTTP exceptions as-is
         raise
@@ -2,29 +2,44 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Dict, Any, List, Tuple, Optional
-import os, httpx, logging, time
-from statistics import pstdev
+import os, httpx, logging, asyncio
 from utils.initialize_supabase import supabase
+from utils.http_clients import get_http_client
+from utils.cache import get_cache
+from utils.single_flight import SingleFlight
+from utils.transaction_rollups import get_rollup_store
 
 log = logging.getLogger("nessie")
 nessie_router = APIRouter(prefix="/nessie")
 
-# ---------------- In-memory cache (15 min TTL) ----------------
-_CACHE: Dict[str, Dict[str, Any]] = {}
+# ---------------- Cache (shared bounded LRU, 15 min TTL) ----------------
 TTL_SEC = int(os.getenv("NESSIE_CACHE_TTL_SEC", "900"))
+# Summaries are served stale-while-revalidate: fresh for TTL_SEC, then
+# returned at once while a background refresh runs, up to the hard TTL
+SUMMARY_HARD_TTL_SEC = int(os.getenv("NESSIE_SUMMARY_HARD_TTL_SEC", "3600"))
+_cache = get_cache()
+for _namespace in ("nessie:customers", "nessie:tips"):
+    _cache.configure(_namespace, TTL_SEC)
+_cache.configure("nessie:summary", max(SUMMARY_HARD_TTL_SEC, TTL_SEC), soft_ttl=TTL_SEC)
 
-def _cache_get(key: str) -> Optional[Any]:
-    v = _CACHE.get(key)
-    if not v: return None
-    if time.time() - v["ts"] > TTL_SEC:
-        _CACHE.pop(key, None)
-        return None
-    return v["data"]
+# Concurrent misses for the same customer share one upstream fetch
+_flight = SingleFlight("nessie")
 
-def _cache_set(key: str, data: Any) -> None:
-    _CACHE[key] = {"ts": time.time(), "data": data}
+# Per-account transaction fetches run concurrently, bounded and time-limited
+ACCOUNT_CONCURRENCY = int(os.getenv("NESSIE_ACCOUNT_CONCURRENCY", "4"))
+ACCOUNT_TIMEOUT_SEC = float(os.getenv("NESSIE_ACCOUNT_TIMEOUT_SEC", "8"))
 
 # ---------------- Models ----------------
+class SubscriptionOut(BaseModel):
+    merchant: str
+    cadence: str  # weekly, biweekly, monthly, quarterly or yearly
+    interval_days: float
+    amount: float
+    monthly_amount: float
+    occurrences: int
+    last_date: str
+    next_expected: str
+
 class NessieSummaryOut(BaseModel):
     customer_id: str
     monthly_inflow: float
@@ -33,6 +48,8 @@ class NessieSummaryOut(BaseModel):
     recurring_bills: float
     categories: Dict[str, float]
     sample_tx_count: int
+    subscriptions: List[SubscriptionOut] = []  # detected recurring bills, largest first
+    failed_accounts: List[str] = []  # accounts left out because their fetch failed or timed out
 
 # ---------------- Helpers ----------------
 def _api() -> Tuple[str, Optional[str]]:
@@ -40,6 +57,18 @@ def _api() -> Tuple[str, Optional[str]]:
     key = os.getenv("NESSIE_API_KEY")
     return base, key
 
+async def _account_transactions(client: httpx.AsyncClient, base: str, key: str, acc_id: str,
+                                sem: asyncio.Semaphore) -> List[Dict[str, Any]]:
+    # Docs: GET /accounts/{accountId}/transactions?key={apiKey}
+    async with sem:
+        t = await asyncio.wait_for(
+            client.get(f"{base}/accounts/{acc_id}/transactions", params={"key": key}),
+            timeout=ACCOUNT_TIMEOUT_SEC,
+        )
+    t.raise_for_status()
+    part = t.json()
+    return part if isinstance(part, list) else []
+
 # ---------------- Mock/Demo Data (fallback when API fails) ----------------
 def _demo_customers():
     """Mock customer data for testing/fallback"""
@@ -90,23 +119,25 @@ async def customers(limit: int = 5):
         log.warning("Nessie API key not configured, using demo data")
         return _demo_customers()[:limit]
 
-    ck = f"customers:{limit}"
-    c = _cache_get(ck)
-    if c: return c
-    
+    # The upstream list is the same for every limit; cache and fetch it once
+    c = await _cache.aget("nessie:customers", "all")
+    if c is None:
+        c = await _flight.do("customers", lambda: _fetch_customers(base, key))
+    return c[:limit]
+
+async def _fetch_customers(base: str, key: str) -> List[Dict[str, Any]]:
     try:
-        async with httpx.AsyncClient(timeout=25.0) as client:
-            r = await client.get(f"{base}/customers", params={"key": key})
-            r.raise_for_status()
-            data = r.json()
-            if not isinstance(data, list):
-                raise ValueError("Unexpected customers payload")
-            out = data[:limit]
-            _cache_set(ck, out)
-            return out
+        client = get_http_client("nessie")
+        r = await client.get(f"{base}/customers", params={"key": key})
+        r.raise_for_status()
+        data = r.json()
+        if not isinstance(data, list):
+            raise ValueError("Unexpected customers payload")
+        await _cache.aset("nessie:customers", "all", data)
+        return data
     except Exception as e:
         log.warning(f"Nessie customers error, falling back to demo data: {e}")
-        return _demo_customers()[:limit]
+        return _demo_customers()
 
 @nessie_router.get("/summary/{customer_id}", response_model=NessieSummaryOut)
 async def summary(customer_id: str):
@@ -124,93 +155,96 @@ async def summary(customer_id: str):
         log.warning(f"Nessie API key not configured, returning demo data for customer {customer_id}")
         return _demo_summary(customer_id)
 
-    ck = f"summary:{customer_id}"
-    c = _cache_get(ck)
-    if c: return c
-
+    fetch = lambda: _fetch_summary(customer_id, base, key)
+    hit = await _cache.aget_entry("nessie:summary", customer_id)
+    if hit is not None:
+        if hit.stale:
+            # Serve now, refresh in the background (coalesced with any other refresh)
+            _flight.start(("summary", customer_id), fetch)
+        return hit.value
+    return await _flight.do(("summary", customer_id), fetch)
+
+async def _fetch_summary(customer_id: str, base: str, key: str) -> Dict[str, Any]:
+    """Accounts + transactions fan-out and aggregation behind summary(); caches the result"""
     try:
         log.info(f"Calling Nessie API: {base}/customers/{customer_id}/accounts")
-        async with httpx.AsyncClient(timeout=25.0) as client:
-            # 1) Get accounts for this customer - Nessie API endpoint
-            # Docs: GET /customers/{customerId}/accounts?key={apiKey}
-            try:
-                r = await client.get(f"{base}/customers/{customer_id}/accounts", params={"key": key})
-                r.raise_for_status()
-                accounts = r.json()
-                log.info(f"Retrieved {len(accounts) if isinstance(accounts, list) else 0} accounts for customer {customer_id}")
-            except httpx.ConnectError as e:
-                log.warning(f"Connection failed to Nessie API at {base}, falling back to demo data: {e}")
-                return _demo_summary(customer_id)
-            except httpx.HTTPStatusError as e:
-                log.warning(f"Nessie API returned error for customer {customer_id}, falling back to demo data: {e.response.status_code}")
-                return _demo_summary(customer_id)
-            
-            if not isinstance(accounts, list):
-                log.warning(f"Unexpected accounts payload format, falling back to demo data")
-                return _demo_summary(customer_id)
-
-            # 2) Get transactions across all accounts - Nessie API endpoint
-            # Docs: GET /accounts/{accountId}/transactions?key={apiKey}
-            txs: List[Dict[str, Any]] = []
-            for acc in accounts:
-                acc_id = acc.get("_id")
-                if not acc_id:
-                    continue
-                t = await client.get(f"{base}/accounts/{acc_id}/transactions", params={"key": key})
-                t.raise_for_status()
-                part = t.json()
-                if isinstance(part, list):
-                    txs.extend(part)
-            
-            log.info(f"Retrieved {len(txs)} total transactions across {len(accounts)} accounts")
-
-        # Aggregate (simple heuristics)
-        inflows: List[float] = []
-        outflows: List[float] = []
-        cats: Dict[str, float] = {}
-        counts: Dict[str, int] = {}
-
-        for t in txs:
-            amt = float(abs((t.get("amount") or 0)))
-            typ = (t.get("transaction_type") or "").lower()
-            desc = (t.get("description") or "other").lower()
-
-            if "deposit" in typ or "credit" in typ:
-                inflows.append(amt)
+        client = get_http_client("nessie")
+        # 1) Get accounts for this customer - Nessie API endpoint
+        # Docs: GET /customers/{customerId}/accounts?key={apiKey}
+        try:
+            r = await client.get(f"{base}/customers/{customer_id}/accounts", params={"key": key})
+            r.raise_for_status()
+            accounts = r.json()
+            log.info(f"Retrieved {len(accounts) if isinstance(accounts, list) else 0} accounts for customer {customer_id}")
+        except httpx.ConnectError as e:
+            log.warning(f"Connection failed to Nessie API at {base}, falling back to demo data: {e}")
+            return _demo_summary(customer_id)
+        except httpx.HTTPStatusError as e:
+            log.warning(f"Nessie API returned error for customer {customer_id}, falling back to demo data: {e.response.status_code}")
+            return _demo_summary(customer_id)
+        
+        if not isinstance(accounts, list):
+            log.warning(f"Unexpected accounts payload format, falling back to demo data")
+            return _demo_summary(customer_id)
+
+        # 2) Get transactions across all accounts, concurrently
+        # A slow or failing account is left out rather than failing the summary
+        acc_ids = [acc.get("_id") for acc in accounts if acc.get("_id")]
+        sem = asyncio.Semaphore(ACCOUNT_CONCURRENCY)
+        results = await asyncio.gather(
+            *(_account_transactions(client, base, key, acc_id, sem) for acc_id in acc_ids),
+            return_exceptions=True,
+        )
+        fetched: List[Tuple[str, List[Dict[str, Any]]]] = []
+        failed_accounts: List[str] = []
+        for acc_id, part in zip(acc_ids, results):
+            if isinstance(part, BaseException):
+                # Error strings carry the request URL (and API key); log the kind only
+                if isinstance(part, asyncio.TimeoutError):
+                    reason = "timed out"
+                elif isinstance(part, httpx.HTTPStatusError):
+                    reason = f"HTTP {part.response.status_code}"
+                else:
+                    reason = type(part).__name__
+                log.warning(f"Transactions for account {acc_id} unavailable ({reason}), continuing without it")
+                failed_accounts.append(acc_id)
             else:
-                outflows.append(amt)
-                cats[desc] = cats.get(desc, 0.0) + amt
-
-            counts[desc] = counts.get(desc, 0) + 1
-
-        # naive recurring guess: any description seen >= 3 times
-        recurring_total = 0.0
-        for t in txs:
-            desc = (t.get("description") or "other").lower()
-            if counts.get(desc, 0) >= 3:
-                recurring_total += float(abs((t.get("amount") or 0)))
+                fetched.append((acc_id, part))
+        if acc_ids and len(failed_accounts) == len(acc_ids):
+            raise RuntimeError(f"transactions unavailable for all {len(acc_ids)} accounts")
+        
+        log.info(f"Retrieved {sum(len(part) for _, part in fetched)} total transactions across {len(fetched)}/{len(acc_ids)} accounts")
 
-        months_assumed = 3.0
-        monthly_in = sum(inflows) / months_assumed if inflows else 0.0
-        monthly_out = sum(outflows) / months_assumed if outflows else 0.0
-        std_out = pstdev(outflows) if len(outflows) > 1 else 0.0
+        # Fold only what is new since the last refresh into the persisted
+        # per-month rollups, then aggregate from those; see utils/transaction_rollups.py
+        agg, subscriptions = await asyncio.to_thread(_fold_and_aggregate, customer_id, fetched)
 
         out = {
             "customer_id": customer_id,
-            "monthly_inflow": round(monthly_in, 2),
-            "monthly_outflow": round(monthly_out, 2),
-            "monthly_outflow_std": round(std_out, 2),
-            "recurring_bills": round(recurring_total / months_assumed, 2),
-            "categories": {k: round(v / months_assumed, 2)
-                           for k, v in sorted(cats.items(), key=lambda kv: kv[1], reverse=True)[:10]},
-            "sample_tx_count": len(txs),
+            "monthly_inflow": agg.monthly_inflow,
+            "monthly_outflow": agg.monthly_outflow,
+            "monthly_outflow_std": agg.monthly_outflow_std,
+            "recurring_bills": round(sum(sub.monthly_amount for sub in subscriptions), 2),
+            "categories": agg.categories,
+            "sample_tx_count": agg.count,
+            "subscriptions": [sub._asdict() for sub in subscriptions],
+            "failed_accounts": failed_accounts,
         }
-        _cache_set(ck, out)
+        # Partial summaries aren't cached; the next request retries the missing accounts
+        if not failed_accounts:
+            await _cache.aset("nessie:summary", customer_id, out)
         return out
     except Exception as e:
         log.warning(f"Unexpected error for customer {customer_id}, falling back to demo data: {e}")
         return _demo_summary(customer_id)
 
+def _fold_and_aggregate(customer_id: str, fetched: List[Tuple[str, List[Dict[str, Any]]]]):
+    folded, agg, subscriptions = get_rollup_store().summarize(customer_id, fetched)
+    log.info(f"Folded {folded} new transactions into the rollups for customer {customer_id}")
+    # Recurring bills are detected over the charges the store keeps per
+    # customer (the last LOOKBACK_DAYS), not the fetched history; see utils/recurring_bills.py
+    return agg, subscriptions
+
 # ---------------- Savings Tips from Spend ----------------
 from typing import List
 
@@ -218,7 +252,8 @@ from typing import List
 async def tips(customer_id: str, top_n: int = 6):
     """
     Turn category spend into actionable monthly savings tips for a Capital One customer.
-    Uses simple % trims per category and adds a 'recurring bills' nudge.
+    Uses simple % trims per category and adds a 'recurring bills' nudge
+    naming the customer's largest detected subscriptions.
     
     Args:
         customer_id: The Capital One customer ID (from Nessie API)
@@ -236,15 +271,16 @@ async def tips(customer_id: str, top_n: int = 6):
     Note: This endpoint expects a Capital One customer ID, NOT a user ID.
     Use /user-tips/{user_id} to automatically look up the Capital One ID from the user's profile.
     """
-    ck = f"tips:{customer_id}:{top_n}"
-    cached = _cache_get(ck)
-    if cached:
+    ck = (customer_id, top_n)
+    cached = await _cache.aget("nessie:tips", ck)
+    if cached is not None:
         return cached
 
     # Pull normalized monthly categories from the same module's summary() endpoint
     s = await summary(customer_id)  # returns NessieSummaryOut (pydantic converts to dict-like)
     cats: Dict[str, float] = dict(s["categories"])  # e.g., {"rent": 1500.0, "groceries": 400.0, ...}
     recurring = float(s.get("recurring_bills", 0.0))
+    subscriptions = s.get("subscriptions") or []
 
     # Heuristic: % trims per (canonical) category name
     # Keys here are lowercase; we’ll match by normalized key contains
@@ -300,12 +336,18 @@ async def tips(customer_id: str, top_n: int = 6):
         rec_cap = 15.0  # don't overpromise
         rec_save = round(min(rec_cap, recurring * rec_pct), 2)
         if rec_save >= 5:
+            suggestion = f"Call providers (phone/internet/utilities) and ask for ~5% off: ~${rec_save}/mo."
+            if subscriptions:
+                largest = ", ".join(
+                    f"{sub['merchant'].title()} (${sub['monthly_amount']:.2f}/mo)" for sub in subscriptions[:3]
+                )
+                suggestion = f"Review your {len(subscriptions)} recurring bills, starting with {largest}, and ask for ~5% off or cancel unused ones: ~${rec_save}/mo."
             tips.append({
                 "category": "Recurring Bills",
                 "current_monthly": round(recurring, 2),
                 "suggested_reduction_pct": round(rec_pct * 100, 1),
                 "estimated_savings": rec_save,
-                "suggestion": f"Call providers (phone/internet/utilities) and ask for ~5% off: ~${rec_save}/mo."
+                "suggestion": suggestion
             })
             total_savings += rec_save
 
@@ -317,7 +359,8 @@ async def tips(customer_id: str, top_n: int = 6):
         "estimated_monthly_savings": round(total_savings, 2),
         "tips": tips,
     }
-    _cache_set(ck, out)
+    if not s.get("failed_accounts"):
+        await _cache.aset("nessie:tips", ck, out)
     return out
 
 # ---------------- User-based endpoints (fetch Capital One ID from profile) ----------------
@@ -2,124 +2,79 @@
 Modified version of scrape.py that writes directly to Supabase instead of Firebase
 This is for future scraping - use migrate_firebase_to_supabase.py for existing data
 """
-import requests
+import argparse
+from datetime import datetime, timedelta, timezone
 import json
 import os
 from dotenv import load_dotenv
 import time
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from bs4 import BeautifulSoup
 from utils.initialize_supabase import get_supabase_client
-from datetime import datetime
+from scraping.bulk_writer import BulkUpserter
+from scraping.checkpoint import DEFAULT_CHECKPOINT_PATH, Checkpoint
+from scraping.discovery import diff_manifests, discover_models, load_manifest, save_manifest
+from scraping.driver_pool import DriverPool
+from scraping.http_fetch import HybridFetcher
+from scraping.page_store import DEFAULT_STORE_DIR, PageStore
+from scraping.parser import car_id, car_url, parse_car_page
+from scraping.pipeline import ScrapeJob, ScrapePipeline
+from scraping.rate_limit import HostRateLimiter
+from scraping.reparse import reparse_pages
 
 load_dotenv()
 
 # Initialize Supabase
 supabase = get_supabase_client()
 
-def scrape_car_data(year, model_name):
-    """Scrape car data from cars.com for a specific year and model"""
-    
-    model_slug = model_name.lower().replace(' ', '-')
-    url = f"https://www.cars.com/research/toyota-{model_slug}-{year}/"
+# Concurrency / politeness defaults (override per run)
+DRIVER_POOL_SIZE = int(os.getenv("SCRAPER_POOL_SIZE", "4"))
+REQUESTS_PER_SEC = float(os.getenv("SCRAPER_REQUESTS_PER_SEC", "0.5"))  # per host
+# Rows per bulk upsert, and the longest a scraped row waits in the buffer
+UPSERT_BATCH_SIZE = int(os.getenv("SCRAPER_UPSERT_BATCH_SIZE", "50"))
+UPSERT_FLUSH_SEC = float(os.getenv("SCRAPER_UPSERT_FLUSH_SEC", "5"))
+# Incremental runs skip cars scraped more recently than this
+FRESHNESS_HOURS = float(os.getenv("SCRAPER_FRESHNESS_HOURS", "168"))
+
+def scrape_car_data(year, model_name, fetcher=None, store=None):
+    """
+    Scrape car data from cars.com for a specific year and model
+    Tries a static HTTP fetch first and only renders in Chrome when the page
+    is missing the expected sections. Uses `fetcher` (a HybridFetcher) when
+    given, otherwise a one-off one. Fetched HTML is kept in `store` (a
+    PageStore) when given, for offline re-parsing
+    """
+    url = car_url(year, model_name)
     
     print(f"🔍 Scraping: {url}")
     
-    # Initialize WebDriver
-    driver = webdriver.Chrome()
-    driver.implicitly_wait(10)
-    
     try:
-        # Load the page
-        driver.get(url)
-        
-        # Get the full rendered page source
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, "html.parser")
-        
-        # Initialize car data dictionary
-        car_data = {
-            'id': f"{year}_{model_slug.replace('-', '_')}",
-            'name': model_name,
-            'year': year,
-            'make': 'toyota',
-            'source_url': url,
-            'last_scraped_at': datetime.utcnow().isoformat(),
-        }
-        
-        # Extract key specs
-        key_specs_section = soup.find("spark-page-section", id="key-specs-ev")
-        if key_specs_section:
-            key_specs = key_specs_section.find_all("div", class_="key-spec")
-            
-            # Map data-qa attributes to our database fields
-            spec_mapping = {
-                'horsepower': 'horsepower',
-                'mpg': 'mpg',
-                'seating-capacity': 'seating_capacity',
-                'cargo-space': 'cargo_space',
-                'towing-capacity': 'towing_capacity',
-                'fuel-tank-capacity': 'fuel_tank_capacity',
-                'curb-weight': 'curb_weight',
-                'ground-clearance': 'ground_clearance',
-            }
-            
-            additional_specs = {}
-            
-            for spec in key_specs:
-                label = spec.get("data-qa")
-                value = spec.find("strong", class_="key-spec-value")
-                
-                if label and value:
-                    value_text = value.text.strip()
-                    
-                    # Map to known fields or add to additional_specs
-                    if label in spec_mapping:
-                        car_data[spec_mapping[label]] = value_text
-                    else:
-                        additional_specs[label] = value_text
-            
-            # Store additional specs as JSON if any
-            if additional_specs:
-                car_data['additional_specs'] = json.dumps(additional_specs)
-        
-        # Extract price
-        price_section = soup.find("div", class_="msrp-container")
-        if price_section:
-            price_elem = price_section.find("div", class_="spark-heading-4")
-            if price_elem:
-                # Remove $ sign and commas, convert to number
-                try:
-                    price_text = price_elem.text.strip().replace('$', '').replace(',', '').strip()
-                    car_data['price'] = float(price_text)
-                    print(f"  💰 Price: ${car_data['price']:,.0f}")
-                except ValueError:
-                    print(f"  ⚠️  Could not parse price: {price_elem.text}")
+        if fetcher is not None:
+            result = fetcher.fetch(url)
+        else:
+            with DriverPool(size=1) as one_off_pool:
+                result = HybridFetcher(one_off_pool, pool_size=1).fetch(url)
+        report_fetch(result)
+        if store is not None:
+            store.put(url, result.html, year, model_name, result.path,
+                      etag=result.etag, last_modified=result.last_modified)
         
-        # Extract images
-        image_dict = {}
-        gallery_div = soup.find("div", class_="research-hero-gallery-modal-content")
-        
-        if gallery_div:
-            images = gallery_div.find_all("img")
-            for index, img in enumerate(images):
-                src = img.get("src")
-                if src:
-                    image_dict[str(index)] = src
-            
-            if image_dict:
-                car_data['images'] = json.dumps(image_dict)
-                print(f"  🖼️  Found {len(image_dict)} images")
-        
-        driver.quit()
+        car_data = parse_car_page(result.html, year, model_name, url)
+        if car_data.get('price'):
+            print(f"  💰 Price: ${car_data['price']:,.0f}")
+        if car_data.get('images'):
+            print(f"  🖼️  Found {len(json.loads(car_data['images']))} images")
         return car_data
     
     except Exception as e:
-        driver.quit()
         print(f"  ❌ Error scraping {year} {model_name}: {str(e)}")
         return None
 
+def report_fetch(result):
+    """Per-page note of which fetch path was used (and why we escalated)"""
+    if result.path == "http":
+        print(f"  ⚡ static HTTP ({result.elapsed:.2f}s): {result.url}")
+    else:
+        print(f"  🌐 browser ({result.elapsed:.2f}s, {result.reason}): {result.url}")
+
 def save_to_supabase(car_data):
     """Save or update car data in Supabase"""
     try:
@@ -131,69 +86,219 @@ def save_to_supabase(car_data):
         print(f"  ❌ Error saving to Supabase: {str(e)}")
         return False
 
-def scrape_toyota_models():
+def upsert_batch(rows):
+    """Bulk upsert scraped rows in one request; raises on failure"""
+    supabase.table('scraped_cars').upsert(rows).execute()
+
+def discover(years, refresh=False):
+    """
+    Model lists for `years` (cached on disk, fetched concurrently), with the
+    manifest diff against the previous discovery printed and saved
+    """
+    discovery = discover_models(years, refresh=refresh)
+    for year, error in sorted(discovery.errors.items()):
+        print(f"  ❌ Error fetching models for {year}: {error}")
+    for year, error in sorted(discovery.stale_errors.items()):
+        print(f"  ⚠️  Using expired model list for {year}, fetch failed: {error}")
+    
+    previous = load_manifest()
+    manifest = discovery.manifest()
+    diff = diff_manifests(previous, manifest)
+    # Keep years this run didn't cover
+    manifest["years"] = {**((previous or {}).get("years") or {}), **manifest["years"]}
+    save_manifest(manifest)
+    
+    total = sum(len(m) for m in discovery.models_by_year.values())
+    print(f"🔎 Discovered {total} Toyota models across {len(discovery.models_by_year)} years "
+          f"({len(discovery.cached_years)} from cache)")
+    for year, model in diff["added"]:
+        print(f"  ➕ New model: {year} {model}")
+    for year, model in diff["removed"]:
+        print(f"  ➖ Removed model: {year} {model}")
+    return discovery, diff
+
+def _parse_timestamp(value):
+    """Timezone-aware UTC datetime from a Supabase or page-store timestamp"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def fetch_last_scraped():
+    """{car id: last_scraped_at} for every scraped_cars row"""
+    out = {}
+    start, page_size = 0, 1000
+    while True:
+        rows = (
+            supabase.table('scraped_cars')
+            .select('id,last_scraped_at')
+            .order('id')
+            .range(start, start + page_size - 1)
+            .execute()
+        ).data or []
+        for row in rows:
+            out[row['id']] = _parse_timestamp(row.get('last_scraped_at'))
+        if len(rows) < page_size:
+            return out
+        start += page_size
+
+def scrape_toyota_models(years=range(2015, 2021), pool_size=DRIVER_POOL_SIZE, requests_per_sec=REQUESTS_PER_SEC,
+                         store_dir=DEFAULT_STORE_DIR, incremental=False, freshness_hours=FRESHNESS_HOURS,
+                         checkpoint_path=DEFAULT_CHECKPOINT_PATH):
     """
     Scrape Toyota models from carapi.app and then scrape details from cars.com
     This is the main function to use for new scraping jobs
+    
+    Pages flow through a bounded fetch -> parse -> persist pipeline backed by
+    `pool_size` reusable headless browsers. A per-host token bucket
+    (`requests_per_sec`) keeps the crawl polite instead of fixed sleeps.
+    Raw HTML is kept in the page store at `store_dir` (None to disable)
+    
+    With `incremental`, cars whose Supabase row was written within
+    `freshness_hours` are skipped, pages are fetched conditionally (ETag /
+    Last-Modified from the page store) and a page whose content hash matches
+    the content last saved to Supabase is not re-parsed or re-upserted. Finished cars are checkpointed to `checkpoint_path` (None
+    to disable), so an interrupted run picks up where it stopped
     """
     print("="*60)
     print("🚗 Starting Toyota Car Scraping to Supabase")
+    print(f"   {pool_size} browsers, {requests_per_sec} req/s per host")
+    if incremental:
+        print(f"   incremental: skipping cars scraped in the last {freshness_hours:g}h")
     print("="*60)
     
-    # Years to scrape
-    years = range(2015, 2021)
+    limiter = HostRateLimiter(rate=requests_per_sec, burst=1)
+    store = PageStore(store_dir) if store_dir else None
+    checkpoint = Checkpoint(checkpoint_path) if checkpoint_path else None
+    if checkpoint is not None and checkpoint.resumed:
+        print(f"↩️  Resuming run from {checkpoint.started_at} ({len(checkpoint.done)} cars already done)")
     
-    success_count = 0
-    error_count = 0
+    fresh_after = datetime.now(timezone.utc) - timedelta(hours=freshness_hours)
+    last_scraped = fetch_last_scraped() if incremental else {}
+    skipped = {"checkpoint": 0, "fresh": 0}
     
-    for year in years:
-        print(f"\n📅 Scraping year: {year}")
-        
-        # Get models from carapi.app
-        url = f'https://carapi.app/api/models?sort=name&verbose=yes&year={year}&make=toyota'
+    def is_fresh(job):
+        # Only a saved row counts: a page fetched by a run that crashed (or
+        # whose upsert failed) before the write must be scraped again
+        ts = last_scraped.get(car_id(job.year, job.model_name))
+        return ts is not None and ts >= fresh_after
+    
+    discovery, _ = discover(years)
+    discovery_errors = len(discovery.errors)
+    
+    def jobs():
+        for year, model_name in discovery.jobs():
+            job = ScrapeJob(year, model_name, car_url(year, model_name))
+            if checkpoint is not None and checkpoint.is_done(car_id(year, model_name)):
+                skipped["checkpoint"] += 1
+                continue
+            if incremental and is_fresh(job):
+                skipped["fresh"] += 1
+                continue
+            yield job
+    
+    def mark_done(key):
+        if checkpoint is not None:
+            checkpoint.mark_done(key)
+    
+    # {car id: (url, sha256)} of fetched pages whose rows aren't saved yet
+    unsaved = {}
+    
+    with DriverPool(size=pool_size) as pool:
+        # Browsers only start if a page actually needs rendering
+        # The fetcher takes a limiter token for every request it sends to
+        # the site, retries and browser renders included
+        fetcher = HybridFetcher(pool, pool_size=pool_size, limiter=limiter)
         
-        try:
-            r = requests.get(url)
-            data = r.json()
-            
-            # Filter out hidden models
-            models = [
-                item for item in data.get('data', []) 
-                if not item['name'].startswith('*') and item['name'].lower() != 'hidden'
-            ]
-            
-            print(f"  Found {len(models)} Toyota models for {year}")
+        def fetch(job):
+            previous = store.latest(job.url) if store is not None and incremental else None
+            result = fetcher.fetch(
+                job.url,
+                etag=previous.etag if previous else None,
+                last_modified=previous.last_modified if previous else None,
+            )
+            report_fetch(result)
+            if store is None:
+                return result
             
-            # Scrape each model
-            for model in models:
-                model_name = model['name']
-                
-                # Scrape details from cars.com
-                car_data = scrape_car_data(year, model_name)
-                
-                if car_data:
-                    # Save to Supabase
-                    if save_to_supabase(car_data):
-                        success_count += 1
-                    else:
-                        error_count += 1
-                else:
-                    error_count += 1
-                
-                # Be respectful to the server
-                time.sleep(2)
+            if result.not_modified:
+                store.put_unchanged(previous, result.path, result.etag, result.last_modified)
+                sha256 = previous.sha256
+            else:
+                sha256 = store.put(job.url, result.html, job.year, job.model_name, result.path,
+                                   etag=result.etag, last_modified=result.last_modified)
+            # Unchanged only relative to content whose row was actually saved
+            if incremental and store.persisted_sha(job.url) == sha256:
+                print(f"  ⏭️  Unchanged since last saved: {job.year} {job.model_name}")
+                pipeline.stats.incr("unchanged")
+                mark_done(car_id(job.year, job.model_name))
+                return None
+            unsaved[car_id(job.year, job.model_name)] = (job.url, sha256)
+            if result.not_modified:
+                # 304 for content that never reached Supabase: parse the stored copy
+                result = result._replace(html=store.get(sha256))
+            return result
         
-        except Exception as e:
-            print(f"  ❌ Error fetching models for {year}: {str(e)}")
-            error_count += 1
+        def parse(job, page):
+            return parse_car_page(page.html, job.year, job.model_name, job.url)
+        
+        def on_saved(rows):
+            pipeline.stats.incr("saved", len(rows))
+            for row in rows:
+                mark_done(row['id'])
+                fetched = unsaved.pop(row['id'], None)
+                if fetched is not None:
+                    store.mark_persisted(*fetched)
+            print(f"  ✅ Saved {len(rows)} cars to Supabase")
+        
+        def on_failed(row, error):
+            pipeline.stats.incr("errors")
+            print(f"  ❌ Error saving {row['year']} {row['name']} to Supabase: {error}")
+        
+        writer = BulkUpserter(
+            upsert_batch,
+            batch_size=UPSERT_BATCH_SIZE,
+            flush_interval=UPSERT_FLUSH_SEC,
+            on_saved=on_saved,
+            on_failed=on_failed,
+        )
+        
+        pipeline = ScrapePipeline(
+            fetch, parse, writer.add,
+            fetch_workers=pool_size,
+            parse_workers=2,
+            queue_size=pool_size * 2,
+        )
+        try:
+            stats = pipeline.run(jobs())
+        finally:
+            writer.close()
+            fetcher.close()
+            if store is not None:
+                store.close()
+            if checkpoint is not None:
+                checkpoint.save()
+    
+    # Only a clean run clears the checkpoint; failed cars get retried on resume
+    if checkpoint is not None and not stats['errors'] and not discovery_errors:
+        checkpoint.complete()
     
     # Summary
     print("\n" + "="*60)
     print("✅ Scraping Complete!")
     print("="*60)
-    print(f"  Successfully scraped: {success_count}")
-    print(f"  Errors: {error_count}")
+    print(f"  Successfully scraped: {stats['saved']}")
+    print(f"  Errors: {stats['errors'] + discovery_errors}")
+    print(f"  Skipped: {skipped['fresh']} fresh, {stats['unchanged']} unchanged, "
+          f"{skipped['checkpoint']} done before resume")
+    print(f"  {stats.summary()}")
+    print(f"  Fetch paths: {fetcher.summary()}")
+    print(f"  Writes: {writer.summary()}")
     print("="*60)
+    return stats
 
 def scrape_single_car(year, model_name):
     """
@@ -202,34 +307,70 @@ def scrape_single_car(year, model_name):
     """
     print(f"🚗 Scraping single car: {year} Toyota {model_name}")
     
-    car_data = scrape_car_data(year, model_name)
-    
-    if car_data:
-        if save_to_supabase(car_data):
+    with PageStore() as store:
+        car_data = scrape_car_data(year, model_name, store=store)
+        
+        if car_data and save_to_supabase(car_data):
+            page = store.latest(car_data['source_url'])
+            if page is not None:
+                store.mark_persisted(page.url, page.sha256)
             print("✅ Successfully scraped and saved!")
             return True
     
     print("❌ Failed to scrape or save")
     return False
 
-if __name__ == "__main__":
-    # Example usage:
-    
-    # Option 1: Scrape all Toyota models (2015-2020)
-    # scrape_toyota_models()
-    
-    # Option 2: Scrape a single car for testing
-    scrape_single_car(2020, "Camry")
-    
-    # Option 3: Scrape specific models
-    # models_to_scrape = [
-    #     (2020, "Camry"),
-    #     (2020, "Corolla"),
-    #     (2020, "RAV4"),
-    #     (2019, "Highlander"),
-    # ]
-    # 
-    # for year, model in models_to_scrape:
-    #     scrape_single_car(year, model)
-    #     time.sleep(3)  # Be respectful to the server
+def reparse_to_supabase(store_dir=DEFAULT_STORE_DIR, processes=None):
+    """
+    Rebuild scraped_cars from stored pages (no crawling) and upsert them
+    Run after changing scraping/parser.py
+    """
+    print(f"♻️  Re-parsing stored pages from {store_dir}")
+    saved = errors = 0
+    for car_data, error in reparse_pages(store_dir, processes):
+        if error:
+            print(f"  ❌ {error}")
+            errors += 1
+        elif save_to_supabase(car_data):
+            saved += 1
+        else:
+            errors += 1
+    print(f"✅ Re-parse complete: {saved} saved, {errors} errors")
+    return saved, errors
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape Toyota models from cars.com into Supabase")
+    sub = parser.add_subparsers(dest="mode")
+    crawl = sub.add_parser("crawl", help="scrape every model (2015-2020)")
+    crawl.add_argument("--no-store", action="store_true", help="don't keep raw HTML")
+    crawl.add_argument("--incremental", action="store_true",
+                       help="skip fresh cars and pages that haven't changed")
+    crawl.add_argument("--fresh-hours", type=float, default=FRESHNESS_HOURS)
+    crawl.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH,
+                       help="progress file for resuming interrupted runs")
+    single = sub.add_parser("single", help="scrape one car")
+    single.add_argument("year", type=int)
+    single.add_argument("model")
+    disc = sub.add_parser("discover", help="refresh model lists and show added/removed models")
+    disc.add_argument("--refresh", action="store_true", help="ignore the model-list cache")
+    reparse = sub.add_parser("reparse", help="rebuild rows from stored pages, no crawling")
+    reparse.add_argument("--store", default=DEFAULT_STORE_DIR)
+    reparse.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+    
+    if args.mode == "crawl":
+        scrape_toyota_models(
+            store_dir=None if args.no_store else DEFAULT_STORE_DIR,
+            incremental=args.incremental,
+            freshness_hours=args.fresh_hours,
+            checkpoint_path=args.checkpoint,
+        )
+    elif args.mode == "single":
+        scrape_single_car(args.year, args.model)
+    elif args.mode == "discover":
+        discover(range(2015, 2021), refresh=args.refresh)
+    elif args.mode == "reparse":
+        reparse_to_supabase(args.store, args.processes)
+    else:
+        # Default: scrape a single car for testing
+        scrape_single_car(2020, "Camry")
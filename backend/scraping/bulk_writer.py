@@ -0,0 +1,169 @@
+"""
+Buffered bulk upserts for scraped rows
+Rows are collected and written with one upsert per batch, flushed when
+`batch_size` rows are waiting or the oldest has waited `flush_interval`
+seconds. A batch rejected for something in its rows (a constraint or bad
+value) is bisected so only the rows that actually fail are reported on
+their own. Any other failure (connection, timeout, 5xx, auth) is retried as
+a whole and then fails the whole batch, rather than bisecting into ~2n
+requests against a backend that is down
+"""
+import threading
+import time
+
+# SQLSTATE classes about the rows themselves: data exceptions, integrity
+# constraint violations; plus PostgREST's "column not in schema"
+ROW_ERROR_SQLSTATE_CLASSES = ("22", "23")
+ROW_ERROR_CODES = ("PGRST204",)
+# 4xx statuses that aren't about the rows (auth, missing table, throttling)
+NON_ROW_STATUSES = (401, 403, 404, 408, 429)
+
+
+def is_row_level_error(error):
+    """
+    Whether an upsert error is caused by the rows sent (PostgREST APIError
+    codes: a SQLSTATE, a PGRST code, or the HTTP status of a non-JSON reply)
+    """
+    code = getattr(error, "code", None)
+    if isinstance(code, int) or (isinstance(code, str) and len(code) == 3 and code.isdigit()):
+        status = int(code)
+        return 400 <= status < 500 and status not in NON_ROW_STATUSES
+    if not isinstance(code, str):
+        return False
+    return code in ROW_ERROR_CODES or (
+        len(code) == 5 and not code.startswith("PGRST") and code[:2] in ROW_ERROR_SQLSTATE_CLASSES
+    )
+
+
+class BulkUpserter:
+    """
+    upsert(rows) writes a list of rows and raises on failure
+    on_saved(rows) / on_failed(row, error) are called from the writing thread
+    is_row_error(error) decides whether a failed batch is bisected; other
+    errors are retried `retries` times with exponential backoff
+    """
+
+    def __init__(self, upsert, batch_size=50, flush_interval=5.0, on_saved=None, on_failed=None, key="id",
+                 is_row_error=is_row_level_error, retries=2, retry_backoff=1.0):
+        self.upsert = upsert
+        self.is_row_error = is_row_error
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_saved = on_saved
+        self.on_failed = on_failed
+        self.key = key
+        self.counts = {"rows": 0, "saved": 0, "failed": 0, "calls": 0, "retries": 0}
+
+        self._buffer = []
+        self._oldest = None
+        self._closed = False
+        self._cond = threading.Condition()
+        # Size- and time-triggered flushes come from different threads; keep writes ordered
+        self._write_lock = threading.Lock()
+        self._timer = threading.Thread(target=self._flush_on_timer, name="bulk-upsert-timer", daemon=True)
+        self._timer.start()
+
+    def add(self, row):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BulkUpserter is closed")
+            self._buffer.append(row)
+            self.counts["rows"] += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+                self._cond.notify()
+            batch = self._take() if len(self._buffer) >= self.batch_size else None
+        if batch:
+            self._write(batch)
+
+    def flush(self):
+        with self._cond:
+            batch = self._take()
+        if batch:
+            self._write(batch)
+
+    def close(self):
+        """Stop the timer and write whatever is still buffered"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._timer.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _take(self):
+        batch, self._buffer, self._oldest = self._buffer, [], None
+        return batch
+
+    def _flush_on_timer(self):
+        with self._cond:
+            while not self._closed:
+                if self._oldest is None:
+                    self._cond.wait()
+                    continue
+                remaining = self._oldest + self.flush_interval - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                batch = self._take()
+                self._cond.release()
+                try:
+                    self._write(batch)
+                finally:
+                    self._cond.acquire()
+
+    def _write(self, batch):
+        # Postgres rejects an upsert that touches the same row twice; last write wins
+        latest = {}
+        for row in batch:
+            latest[row.get(self.key, id(row))] = row
+        # PostgREST bulk inserts take their column list from the rows, so
+        # rows with different key sets go out as separate requests
+        groups = {}
+        for row in latest.values():
+            groups.setdefault(frozenset(row), []).append(row)
+        with self._write_lock:
+            for rows in groups.values():
+                self._upsert_or_split(rows)
+
+    def _upsert_with_retry(self, rows):
+        """None once the rows are written, else the error that stopped it"""
+        for attempt in range(self.retries + 1):
+            self.counts["calls"] += 1
+            try:
+                self.upsert(rows)
+                return None
+            except Exception as e:
+                if self.is_row_error(e) or attempt == self.retries:
+                    return e
+            self.counts["retries"] += 1
+            time.sleep(self.retry_backoff * (2 ** attempt))
+
+    def _upsert_or_split(self, rows):
+        error = self._upsert_with_retry(rows)
+        if error is None:
+            self.counts["saved"] += len(rows)
+            if self.on_saved:
+                self.on_saved(rows)
+            return
+        if len(rows) > 1 and self.is_row_error(error):
+            mid = len(rows) // 2
+            self._upsert_or_split(rows[:mid])
+            self._upsert_or_split(rows[mid:])
+            return
+        self.counts["failed"] += len(rows)
+        if self.on_failed:
+            for row in rows:
+                self.on_failed(row, error)
+
+    def summary(self):
+        c = self.counts
+        return (f"{c['saved']} rows saved, {c['failed']} failed in {c['calls']} upsert calls"
+                + (f" ({c['retries']} retries)" if c['retries'] else ""))
@@ -0,0 +1,88 @@
+"""
+Crash-safe progress file for long scrape runs
+Records which car ids a run has finished so an interrupted job can resume
+where it stopped. The file is rewritten atomically (temp file + rename), so
+a crash mid-write leaves the previous checkpoint intact
+"""
+from datetime import datetime, timedelta
+import json
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_CHECKPOINT_PATH = os.getenv("SCRAPER_CHECKPOINT", "scrape_checkpoint.json")
+# A checkpoint older than this belongs to an abandoned run; start over
+CHECKPOINT_MAX_AGE_HOURS = 24
+SAVE_INTERVAL_SEC = 2.0
+
+
+class Checkpoint:
+    """Thread-safe set of finished ids, persisted every few seconds"""
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_PATH, max_age_hours=CHECKPOINT_MAX_AGE_HOURS):
+        self.path = path
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self.started_at = datetime.utcnow().isoformat()
+        self.done = set()
+        self.resumed = False
+
+        state = self._read()
+        if state and _age(state.get("started_at")) < timedelta(hours=max_age_hours):
+            self.started_at = state["started_at"]
+            self.done = set(state.get("done", []))
+            self.resumed = True
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self):
+        state = {"started_at": self.started_at, "done": sorted(self.done)}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._last_save = time.monotonic()
+
+    def is_done(self, key):
+        with self._lock:
+            return key in self.done
+
+    def mark_done(self, key):
+        with self._lock:
+            self.done.add(key)
+            if time.monotonic() - self._last_save >= SAVE_INTERVAL_SEC:
+                self._write()
+
+    def save(self):
+        with self._lock:
+            self._write()
+
+    def complete(self):
+        """The run finished; the next one starts from scratch"""
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.done = set()
+
+
+def _age(timestamp):
+    try:
+        return datetime.utcnow() - datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return timedelta.max
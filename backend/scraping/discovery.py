@@ -0,0 +1,182 @@
+"""
+Model-list discovery (carapi.app) for the scraper
+Fetches every year's Toyota model list concurrently over one pooled session,
+caches each list on disk for a TTL, and writes the result as a manifest
+(year -> sorted model names) that can be diffed against the previous run to
+spot added or removed models without crawling cars.com
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import json
+import os
+import tempfile
+import time
+
+from scraping.http_fetch import HTTP_TIMEOUT_SEC, new_session
+from scraping.page_store import DEFAULT_STORE_DIR
+
+CARAPI_MODELS_URL = "https://carapi.app/api/models"
+MODEL_LIST_TTL_SEC = float(os.getenv("SCRAPER_MODEL_LIST_TTL_SEC", str(24 * 3600)))
+DEFAULT_CACHE_DIR = os.path.join(DEFAULT_STORE_DIR, "model_lists")
+DEFAULT_MANIFEST_PATH = os.path.join(DEFAULT_STORE_DIR, "model_manifest.json")
+
+
+def _write_json(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def fetch_model_list(year, session=None, make="toyota"):
+    """Models for one year from carapi.app (hidden models filtered out)"""
+    session = session or new_session(pool_size=1, retries=2)
+    r = session.get(
+        CARAPI_MODELS_URL,
+        params={"sort": "name", "verbose": "yes", "year": year, "make": make},
+        headers={"Accept": "application/json"},
+        timeout=HTTP_TIMEOUT_SEC,
+    )
+    r.raise_for_status()
+    data = r.json()
+
+    # Filter out hidden models
+    return [
+        item['name'] for item in data.get('data', [])
+        if not item['name'].startswith('*') and item['name'].lower() != 'hidden'
+    ]
+
+
+class ModelListCache:
+    """One JSON file per year: {"fetched_at": epoch seconds, "models": [...]}"""
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, ttl_sec=MODEL_LIST_TTL_SEC):
+        self.root = root
+        self.ttl_sec = ttl_sec
+
+    def _path(self, year):
+        return os.path.join(self.root, f"{year}.json")
+
+    def get(self, year):
+        """Cached models for a year, or None if missing or expired"""
+        entry = _read_json(self._path(year))
+        if not entry or time.time() - entry.get("fetched_at", 0) > self.ttl_sec:
+            return None
+        return entry.get("models")
+
+    def get_stale(self, year):
+        """Cached models for a year regardless of age, or None"""
+        entry = _read_json(self._path(year))
+        return entry.get("models") if entry else None
+
+    def put(self, year, models):
+        _write_json(self._path(year), {"fetched_at": time.time(), "models": models})
+
+
+class Discovery:
+    """Result of one discovery run"""
+
+    def __init__(self, models_by_year, errors, cached_years, stale_errors=None):
+        self.models_by_year = models_by_year
+        self.errors = errors  # year -> error message
+        self.cached_years = cached_years
+        # year -> error message, for years served from an expired cache entry
+        # because the fetch failed (their lists may be out of date)
+        self.stale_errors = stale_errors or {}
+
+    def manifest(self):
+        return {
+            "generated_at": datetime.utcnow().isoformat(),
+            "years": {str(year): sorted(models) for year, models in sorted(self.models_by_year.items())},
+        }
+
+    def jobs(self):
+        """(year, model_name) pairs in year order"""
+        for year in sorted(self.models_by_year):
+            for model_name in self.models_by_year[year]:
+                yield year, model_name
+
+
+def discover_models(years, session=None, cache=None, max_workers=4, refresh=False):
+    """
+    Model lists for every year, from the cache where fresh, otherwise fetched
+    concurrently. A year that fails to fetch falls back to its expired cache
+    entry if there is one (the error is kept in .stale_errors), and is
+    reported in .errors otherwise
+    """
+    cache = cache or ModelListCache()
+    session = session or new_session(pool_size=max_workers, retries=2)
+    models_by_year, errors, cached_years, stale_errors = {}, {}, [], {}
+
+    to_fetch = []
+    for year in years:
+        models = None if refresh else cache.get(year)
+        if models is None:
+            to_fetch.append(year)
+        else:
+            models_by_year[year] = models
+            cached_years.append(year)
+
+    def fetch(year):
+        try:
+            return year, fetch_model_list(year, session), None
+        except Exception as e:
+            return year, None, e
+
+    if to_fetch:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(to_fetch))) as pool:
+            for year, models, error in pool.map(fetch, to_fetch):
+                if error is None:
+                    cache.put(year, models)
+                    models_by_year[year] = models
+                    continue
+                stale = cache.get_stale(year)
+                if stale is not None:
+                    models_by_year[year] = stale
+                    cached_years.append(year)
+                    stale_errors[year] = str(error)
+                else:
+                    errors[year] = str(error)
+
+    return Discovery(models_by_year, errors, cached_years, stale_errors)
+
+
+def load_manifest(path=DEFAULT_MANIFEST_PATH):
+    return _read_json(path)
+
+
+def save_manifest(manifest, path=DEFAULT_MANIFEST_PATH):
+    _write_json(path, manifest)
+
+
+def diff_manifests(old, new):
+    """
+    {"added": [(year, model)], "removed": [(year, model)]} between two manifests
+    Only years present in `new` are compared, so a run over fewer years (or
+    one where a year failed) doesn't report that year's models as removed
+    """
+    def pairs(manifest, years=None):
+        return {
+            (int(year), model)
+            for year, models in ((manifest or {}).get("years") or {}).items()
+            if years is None or year in years
+            for model in models
+        }
+
+    after = pairs(new)
+    before = pairs(old, set((new or {}).get("years") or {}))
+    return {"added": sorted(after - before), "removed": sorted(before - after)}
@@ -0,0 +1,106 @@
+"""
+Pool of reusable headless Chrome drivers
+Starting Chrome costs seconds; the pool starts at most `size` browsers
+(lazily) and hands them out to fetch workers one page at a time
+"""
+from contextlib import contextmanager
+import queue
+import threading
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+PAGE_LOAD_TIMEOUT_SEC = 30
+
+
+def new_driver(headless=True):
+    """Start one Chrome instance configured for scraping"""
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--window-size=1366,900")
+    # Images are referenced by URL in the HTML; no need to download them
+    options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    driver = webdriver.Chrome(options=options)
+    driver.implicitly_wait(10)
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT_SEC)
+    return driver
+
+
+class DriverPool:
+    """Thread-safe pool of up to `size` WebDriver instances"""
+    
+    def __init__(self, size=4, headless=True):
+        self.size = size
+        self.headless = headless
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+    
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return new_driver(self.headless)
+                except Exception:
+                    self._created -= 1
+                    raise
+        # Pool is at capacity; wait for a driver to come back
+        return self._idle.get()
+    
+    def _discard(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+    
+    @contextmanager
+    def driver(self):
+        """
+        Borrow a driver for one page
+        A driver that raised a WebDriverException (crashed tab, dead session)
+        is quit and replaced on the next checkout instead of being reused
+        """
+        if self._closed:
+            raise RuntimeError("DriverPool is closed")
+        driver = self._acquire()
+        try:
+            yield driver
+        except WebDriverException:
+            self._discard(driver)
+            raise
+        else:
+            self._idle.put(driver)
+    
+    def fetch(self, url):
+        """Load `url` in a pooled driver and return the rendered page source"""
+        with self.driver() as driver:
+            driver.get(url)
+            return driver.page_source
+    
+    def close(self):
+        """Quit every idle driver (call once all workers are done)"""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
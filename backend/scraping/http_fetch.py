@@ -0,0 +1,174 @@
+"""
+Static-HTTP fetching with a headless-browser fallback
+cars.com research pages are server-rendered, so a plain pooled HTTP GET
+usually has everything parse_car_page needs. Only when the expected
+sections are missing from the HTML do we pay for a Chrome render
+
+Every request to the site - each static attempt, each retry and the browser
+render - takes a token from the per-host limiter first, so retries under
+throttling don't multiply the request rate
+"""
+from typing import NamedTuple, Optional
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HTTP_TIMEOUT_SEC = 20
+
+# Statuses a static GET is retried on, with exponential backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_BACKOFF_SEC = 0.5
+MAX_RETRY_AFTER_SEC = 60
+
+# Markers parse_car_page relies on (key specs, price, image gallery)
+EXPECTED_MARKERS = (
+    'id="key-specs-ev"',
+    "msrp-container",
+    "research-hero-gallery-modal-content",
+)
+
+BROWSER_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+
+class FetchResult(NamedTuple):
+    url: str
+    html: str
+    path: str  # "http" or "browser"
+    elapsed: float
+    reason: Optional[str] = None  # why we escalated to the browser, if we did
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    not_modified: bool = False  # server answered 304 to our validators; html is empty
+
+
+def new_session(pool_size=8, retries=0):
+    """
+    requests.Session with a connection pool sized for the fetch workers
+    Adapter-level retries are off by default: they'd bypass the rate limiter,
+    so HybridFetcher retries itself. Pass `retries` for other APIs
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=retries,
+        backoff_factor=RETRY_BACKOFF_SEC,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=("GET", "HEAD"),
+        respect_retry_after_header=True,
+    ) if retries else 0
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(BROWSER_HEADERS)
+    return session
+
+
+def missing_markers(html):
+    """Expected sections not present in the HTML"""
+    return [m for m in EXPECTED_MARKERS if m not in html]
+
+
+def _retry_delay(response, attempt):
+    """Retry-After (seconds form) when the server sent one, else exponential backoff"""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.strip().isdigit():
+        return min(float(retry_after), MAX_RETRY_AFTER_SEC)
+    return RETRY_BACKOFF_SEC * (2 ** attempt)
+
+
+class HybridFetcher:
+    """
+    Try a static GET first; escalate to a pooled browser render when the
+    response fails or lacks the expected sections
+    With a `limiter` (HostRateLimiter), every attempt waits for its token
+    """
+    
+    def __init__(self, driver_pool, session=None, pool_size=8, limiter=None, retries=2):
+        self.driver_pool = driver_pool
+        self.session = session or new_session(pool_size)
+        self.limiter = limiter
+        self.retries = retries
+        self._lock = threading.Lock()
+        self.counts = {"http": 0, "browser": 0}
+        self.retried = 0
+        self.seconds = {"http": 0.0, "browser": 0.0}
+    
+    def _record(self, result):
+        with self._lock:
+            self.counts[result.path] += 1
+            self.seconds[result.path] += result.elapsed
+        return result
+    
+    def _wait(self, url):
+        if self.limiter is not None:
+            self.limiter.wait(url)
+    
+    def fetch_static(self, url, etag=None, last_modified=None):
+        """
+        GET a page, conditionally when validators from an earlier fetch are given
+        Connection errors and RETRY_STATUSES are retried up to `retries` times
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        for attempt in range(self.retries + 1):
+            self._wait(url)
+            response = None
+            try:
+                response = self.session.get(url, headers=headers, timeout=HTTP_TIMEOUT_SEC)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+            if response is not None and (response.status_code not in RETRY_STATUSES or attempt == self.retries):
+                response.raise_for_status()
+                return response
+            with self._lock:
+                self.retried += 1
+            time.sleep(_retry_delay(response, attempt))
+    
+    def fetch(self, url, etag=None, last_modified=None):
+        started = time.monotonic()
+        try:
+            response = self.fetch_static(url, etag, last_modified)
+            validators = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            if response.status_code == 304:
+                return self._record(FetchResult(
+                    url, "", "http", time.monotonic() - started, None,
+                    validators[0] or etag, validators[1] or last_modified, not_modified=True,
+                ))
+            html = response.text
+            missing = missing_markers(html)
+            if not missing:
+                return self._record(FetchResult(url, html, "http", time.monotonic() - started, None, *validators))
+            reason = f"missing {', '.join(missing)}"
+        except requests.RequestException as e:
+            reason = f"http error: {e}"
+        
+        self._wait(url)
+        browser_started = time.monotonic()
+        html = self.driver_pool.fetch(url)
+        return self._record(FetchResult(url, html, "browser", time.monotonic() - browser_started, reason))
+    
+    def summary(self):
+        parts = []
+        for path in ("http", "browser"):
+            n = self.counts[path]
+            avg = self.seconds[path] / n if n else 0
+            parts.append(f"{path}: {n} pages (avg {avg:.2f}s)")
+        if self.retried:
+            parts.append(f"{self.retried} retries")
+        return ", ".join(parts)
+    
+    def close(self):
+        self.session.close()
@@ -0,0 +1,191 @@
+"""
+Content-addressed on-disk store of fetched research pages
+Every fetch is recorded in a small SQLite index keyed by (url, fetched_at);
+the HTML itself is gzip-compressed under blobs/<sha[:2]>/<sha>.html.gz, so a
+page that hasn't changed between crawls is stored once. The store is what
+offline re-parsing (scraping/reparse.py) reads from
+
+A separate `persisted` table records, per URL, the content hash whose parsed
+row last made it into Supabase. A fetch is only "unchanged" against that,
+never against an earlier fetch that may have crashed before its upsert
+"""
+from datetime import datetime
+from typing import Iterator, NamedTuple, Optional
+import gzip
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+
+DEFAULT_STORE_DIR = os.getenv("SCRAPER_PAGE_STORE", "scrape_cache")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    year INTEGER,
+    model_name TEXT,
+    fetch_path TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    PRIMARY KEY (url, fetched_at)
+);
+CREATE INDEX IF NOT EXISTS pages_sha256 ON pages (sha256);
+CREATE TABLE IF NOT EXISTS persisted (
+    url TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    persisted_at TEXT NOT NULL
+);
+"""
+
+_COLUMNS = "p.url, p.fetched_at, p.sha256, p.year, p.model_name, p.fetch_path, p.etag, p.last_modified"
+
+
+class StoredPage(NamedTuple):
+    url: str
+    fetched_at: str
+    sha256: str
+    year: Optional[int]
+    model_name: Optional[str]
+    fetch_path: Optional[str]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+def content_hash(html):
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+def blob_path(root, sha256):
+    return os.path.join(root, "blobs", sha256[:2], f"{sha256}.html.gz")
+
+
+def read_blob(root, sha256):
+    """HTML for a content hash; a plain function so worker processes can call it"""
+    with gzip.open(blob_path(root, sha256), "rt", encoding="utf-8") as f:
+        return f.read()
+
+
+class PageStore:
+    """Thread-safe; one instance can be shared by all fetch workers"""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        # Stores created before validators were recorded
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(pages)")}
+        for column in ("etag", "last_modified"):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE pages ADD COLUMN {column} TEXT")
+
+    def _write_blob(self, sha256, html):
+        path = blob_path(self.root, sha256)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so a crash never leaves a truncated blob behind
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+                f.write(html.encode("utf-8"))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def put(self, url, html, year=None, model_name=None, fetch_path=None, fetched_at=None,
+            etag=None, last_modified=None):
+        """Record one fetch; returns the page's content hash"""
+        sha256 = content_hash(html)
+        self._write_blob(sha256, html)
+        self._insert(StoredPage(
+            url, fetched_at or datetime.utcnow().isoformat(), sha256, year, model_name,
+            fetch_path, etag, last_modified,
+        ))
+        return sha256
+
+    def put_unchanged(self, previous, fetch_path=None, etag=None, last_modified=None):
+        """Record a fetch that returned the same content as `previous` (e.g. a 304)"""
+        self._insert(previous._replace(
+            fetched_at=datetime.utcnow().isoformat(),
+            fetch_path=fetch_path,
+            etag=etag or previous.etag,
+            last_modified=last_modified or previous.last_modified,
+        ))
+
+    def _insert(self, page):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, fetched_at, sha256, year, model_name, fetch_path,"
+                " etag, last_modified) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                page,
+            )
+
+    def mark_persisted(self, url, sha256):
+        """Record that the row parsed from this content was saved to Supabase"""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO persisted (url, sha256, persisted_at) VALUES (?, ?, ?)",
+                (url, sha256, datetime.utcnow().isoformat()),
+            )
+
+    def persisted_sha(self, url) -> Optional[str]:
+        """Content hash of the last saved row for a URL, or None"""
+        with self._lock:
+            row = self._db.execute("SELECT sha256 FROM persisted WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def get(self, sha256):
+        return read_blob(self.root, sha256)
+
+    def latest(self, url) -> Optional[StoredPage]:
+        """Most recent fetch of a URL, or None"""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {_COLUMNS} FROM pages p WHERE url = ? ORDER BY fetched_at DESC LIMIT 1", (url,)
+            ).fetchone()
+        return StoredPage(*row) if row else None
+
+    def history(self, url):
+        """Every fetch of a URL, oldest first"""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM pages p WHERE url = ? ORDER BY fetched_at", (url,)
+            ).fetchall()
+        return [StoredPage(*r) for r in rows]
+
+    def iter_latest(self) -> Iterator[StoredPage]:
+        """The newest fetch of every URL in the store"""
+        with self._lock:
+            rows = self._db.execute(
+                f"""
+                SELECT {_COLUMNS} FROM pages p
+                JOIN (SELECT url, MAX(fetched_at) AS fetched_at FROM pages GROUP BY url) newest
+                  ON p.url = newest.url AND p.fetched_at = newest.fetched_at
+                ORDER BY p.url
+                """
+            ).fetchall()
+        for row in rows:
+            yield StoredPage(*row)
+
+    def stats(self):
+        with self._lock:
+            fetches, urls, blobs = self._db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT url), COUNT(DISTINCT sha256) FROM pages"
+            ).fetchone()
+        return {"fetches": fetches, "urls": urls, "blobs": blobs}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,114 @@
+"""
+Extract scraped_cars rows from cars.com research pages
+Pure functions of the page HTML (no driver, no network, no Supabase), so
+the same code serves live scraping and offline re-parsing
+"""
+from datetime import datetime
+import json
+import sys
+
+from bs4 import BeautifulSoup
+
+from utils.spec_parsing import normalize_specs
+
+try:
+    import lxml  # noqa: F401  (much faster tree builder for BeautifulSoup)
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# Map key-spec data-qa attributes to our database fields
+SPEC_MAPPING = {
+    'horsepower': 'horsepower',
+    'mpg': 'mpg',
+    'seating-capacity': 'seating_capacity',
+    'cargo-space': 'cargo_space',
+    'towing-capacity': 'towing_capacity',
+    'fuel-tank-capacity': 'fuel_tank_capacity',
+    'curb-weight': 'curb_weight',
+    'ground-clearance': 'ground_clearance',
+}
+
+
+def model_slug(model_name):
+    return model_name.lower().replace(' ', '-')
+
+
+def car_url(year, model_name):
+    return f"https://www.cars.com/research/toyota-{model_slug(model_name)}-{year}/"
+
+
+def car_id(year, model_name):
+    return f"{year}_{model_slug(model_name).replace('-', '_')}"
+
+
+def parse_car_page(html, year, model_name, url=None, scraped_at=None):
+    """Build a scraped_cars row from a rendered cars.com research page"""
+    url = url or car_url(year, model_name)
+    soup = BeautifulSoup(html, HTML_PARSER)
+    
+    # Initialize car data dictionary
+    car_data = {
+        'id': car_id(year, model_name),
+        'name': model_name,
+        'year': year,
+        'make': 'toyota',
+        'source_url': url,
+        'last_scraped_at': scraped_at or datetime.utcnow().isoformat(),
+    }
+    
+    # Extract key specs
+    key_specs_section = soup.find("spark-page-section", id="key-specs-ev")
+    if key_specs_section:
+        key_specs = key_specs_section.find_all("div", class_="key-spec")
+        
+        additional_specs = {}
+        
+        for spec in key_specs:
+            label = spec.get("data-qa")
+            value = spec.find("strong", class_="key-spec-value")
+            
+            if label and value:
+                value_text = value.text.strip()
+                
+                # Map to known fields or add to additional_specs
+                if label in SPEC_MAPPING:
+                    car_data[SPEC_MAPPING[label]] = value_text
+                else:
+                    additional_specs[label] = value_text
+        
+        # Store additional specs as JSON if any
+        if additional_specs:
+            car_data['additional_specs'] = json.dumps(additional_specs)
+    
+    # Extract price
+    price_section = soup.find("div", class_="msrp-container")
+    if price_section:
+        price_elem = price_section.find("div", class_="spark-heading-4")
+        if price_elem:
+            # Remove $ sign and commas, convert to number
+            try:
+                price_text = price_elem.text.strip().replace('$', '').replace(',', '').strip()
+                car_data['price'] = float(price_text)
+            except ValueError:
+                # stderr: reparse.py streams NDJSON on stdout
+                print(f"  ⚠️  Could not parse price: {price_elem.text}", file=sys.stderr)
+    
+    # Typed numeric columns (horsepower_hp, mpg_combined, ...) parsed once here
+    car_data.update(normalize_specs(car_data))
+    
+    # Extract images
+    image_dict = {}
+    gallery_div = soup.find("div", class_="research-hero-gallery-modal-content")
+    
+    if gallery_div:
+        images = gallery_div.find_all("img")
+        for index, img in enumerate(images):
+            src = img.get("src")
+            if src:
+                image_dict[str(index)] = src
+        
+        if image_dict:
+            car_data['images'] = json.dumps(image_dict)
+    
+    return car_data
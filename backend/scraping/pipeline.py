@@ -0,0 +1,149 @@
+"""
+Bounded, concurrent scrape pipeline: fetch -> parse -> normalize -> persist
+Each stage runs in its own thread group and hands work to the next through a
+bounded queue, so slow persistence applies back-pressure to fetching instead
+of buffering the whole crawl in memory
+"""
+from typing import NamedTuple
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class ScrapeJob(NamedTuple):
+    year: int
+    model_name: str
+    url: str
+
+
+class PipelineStats:
+    """Thread-safe counters for one pipeline run"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"jobs": 0, "fetched": 0, "parsed": 0, "saved": 0, "skipped": 0, "errors": 0}
+        self.started = time.monotonic()
+    
+    def incr(self, key, n=1):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + n
+    
+    def __getitem__(self, key):
+        return self.counts.get(key, 0)
+    
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+    
+    def summary(self):
+        rate = self["saved"] / self.elapsed * 60 if self.elapsed else 0
+        parts = [f"{k}: {v}" for k, v in self.counts.items()]
+        return ", ".join(parts) + f" | {self.elapsed:.1f}s ({rate:.1f} cars/min)"
+
+
+class ScrapePipeline:
+    """
+    Stage callables (each may return None to drop the item):
+      fetch(job) -> page           runs in `fetch_workers` threads
+      parse(job, page) -> car_data runs in `parse_workers` threads (parse + normalize)
+      persist(car_data) -> bool    runs in one thread; None means the row was
+                                   handed to a buffered writer that counts it
+    """
+    
+    def __init__(self, fetch, parse, persist, fetch_workers=4, parse_workers=2, queue_size=16):
+        self.fetch = fetch
+        self.parse = parse
+        self.persist = persist
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.stats = PipelineStats()
+    
+    def _run_stage(self, name, inbox, outbox, handle, n_workers):
+        """Start n_workers threads draining inbox; the last one to finish closes outbox"""
+        remaining = [n_workers]
+        lock = threading.Lock()
+        
+        def worker():
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    inbox.put(_DONE)  # let sibling workers see it too
+                    break
+                try:
+                    result = handle(item)
+                except Exception as e:
+                    self.stats.incr("errors")
+                    print(f"  ❌ {name} failed for {_describe(item)}: {e}")
+                    continue
+                if result is not None and outbox is not None:
+                    outbox.put(result)
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last and outbox is not None:
+                outbox.put(_DONE)
+        
+        threads = [threading.Thread(target=worker, name=f"{name}-{i}", daemon=True) for i in range(n_workers)]
+        for t in threads:
+            t.start()
+        return threads
+    
+    def _fetch(self, job):
+        page = self.fetch(job)
+        if page is None:
+            self.stats.incr("skipped")
+            return None
+        self.stats.incr("fetched")
+        return job, page
+    
+    def _parse(self, item):
+        job, page = item
+        car_data = self.parse(job, page)
+        if car_data is None:
+            self.stats.incr("skipped")
+            return None
+        self.stats.incr("parsed")
+        return car_data
+    
+    def _persist(self, car_data):
+        saved = self.persist(car_data)
+        if saved is None:
+            return None
+        if saved:
+            self.stats.incr("saved")
+        else:
+            self.stats.incr("errors")
+        return None
+    
+    def run(self, jobs):
+        """Push every job through the pipeline and block until all are persisted"""
+        jobs_q = queue.Queue(self.queue_size)
+        pages_q = queue.Queue(self.queue_size)
+        rows_q = queue.Queue(self.queue_size)
+        
+        threads = []
+        threads += self._run_stage("fetch", jobs_q, pages_q, self._fetch, self.fetch_workers)
+        threads += self._run_stage("parse", pages_q, rows_q, self._parse, self.parse_workers)
+        threads += self._run_stage("persist", rows_q, None, self._persist, 1)
+        
+        for job in jobs:
+            self.stats.incr("jobs")
+            jobs_q.put(job)  # blocks when fetchers are saturated
+        jobs_q.put(_DONE)
+        
+        for t in threads:
+            t.join()
+        return self.stats
+
+
+def _describe(item):
+    if isinstance(item, ScrapeJob):
+        return f"{item.year} {item.model_name}"
+    if isinstance(item, tuple) and item and isinstance(item[0], ScrapeJob):
+        return _describe(item[0])
+    if isinstance(item, dict):
+        return f"{item.get('year')} {item.get('name')}"
+    return repr(item)[:60]
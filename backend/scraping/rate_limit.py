@@ -0,0 +1,39 @@
+"""
+Per-host token-bucket rate limiter shared by all scraper threads
+Replaces the fixed time.sleep(2) between pages: workers only wait when the
+host's budget is actually used up
+"""
+from urllib.parse import urlparse
+import threading
+import time
+
+
+class HostRateLimiter:
+    """Allow `rate` requests/second per host, with bursts of up to `burst`"""
+    
+    def __init__(self, rate=0.5, burst=1):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._buckets = {}  # host -> [tokens, last_refill]
+        self._lock = threading.Lock()
+    
+    def _reserve(self, host):
+        """Take a token if one is available, else return seconds to wait"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self._buckets[host] = (tokens - 1, now)
+                return 0.0
+            self._buckets[host] = (tokens, now)
+            return (1 - tokens) / self.rate
+    
+    def wait(self, url):
+        """Block until a request to url's host is allowed"""
+        host = urlparse(url).netloc
+        while True:
+            delay = self._reserve(host)
+            if delay <= 0:
+                return
+            time.sleep(delay)
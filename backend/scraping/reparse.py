@@ -0,0 +1,69 @@
+"""
+Rebuild scraped_cars rows from the page store, without touching the network
+Parsing is CPU-bound BeautifulSoup work, so pages are spread over a process
+pool. Use this after changing scraping/parser.py instead of re-crawling:
+
+    python -m scraping.reparse --out rows.ndjson
+    python scrape_to_supabase.py reparse        # same, but upserts to Supabase
+"""
+from multiprocessing import Pool
+import argparse
+import json
+import os
+import sys
+
+from scraping.page_store import DEFAULT_STORE_DIR, PageStore, read_blob
+from scraping.parser import parse_car_page
+
+
+def _parse_stored(args):
+    root, page = args
+    try:
+        html = read_blob(root, page.sha256)
+        return parse_car_page(html, page.year, page.model_name, page.url, scraped_at=page.fetched_at), None
+    except Exception as e:
+        return None, f"{page.url}: {e}"
+
+
+def reparse_pages(store_dir=DEFAULT_STORE_DIR, processes=None, chunksize=8):
+    """
+    Yield (car_data, error) for the newest stored fetch of every URL
+    Exactly one of the two is None. Rows keep their original fetch time as
+    last_scraped_at
+    """
+    with PageStore(store_dir) as store:
+        pages = [p for p in store.iter_latest() if p.year is not None and p.model_name]
+
+    with Pool(processes or os.cpu_count()) as pool:
+        yield from pool.imap_unordered(_parse_stored, ((store_dir, p) for p in pages), chunksize)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-parse stored cars.com pages offline")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="page store directory")
+    parser.add_argument("--out", default="-", help="NDJSON output file (default: stdout)")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    out = open(args.out, "w") if args.out != "-" else None
+    parsed = errors = 0
+    try:
+        for car_data, error in reparse_pages(args.store, args.processes):
+            if error:
+                errors += 1
+                print(f"  ❌ {error}", file=sys.stderr)
+                continue
+            parsed += 1
+            line = json.dumps(car_data, default=str)
+            if out:
+                out.write(line + "\n")
+            else:
+                print(line)
+    finally:
+        if out:
+            out.close()
+    print(f"Re-parsed {parsed} pages ({errors} errors)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+Bounded app cache with LRU eviction and per-namespace TTLs
+get_cache() is the cache the Nessie routes and agent tools share. Its
+backend is chosen by CACHE_BACKEND: "memory" (default, this process only)
+or "sqlite" (utils/sqlite_cache.py, one WAL-mode file shared by every
+uvicorn worker on the node). get_local_cache() is always in-process, for
+entries that are only worth having as live objects (formatted vehicles)
+
+Both are bounded by entry count and by (estimated) bytes; when either is
+exceeded, expired entries go first and then the least recently used ones.
+Counters per namespace are served at GET /cache/stats
+
+A namespace can also have a soft TTL (stale-while-revalidate): past it an
+entry is still returned by get_entry(), flagged stale, until the hard TTL
+
+Async handlers use aget()/aget_entry()/aset(): a backend doing I/O (sqlite)
+runs them in a worker thread, the memory backend answers inline
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+import asyncio
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from utils.fast_json import dumps
+
+APP_CACHE_MAX_ENTRIES = int(os.getenv("APP_CACHE_MAX_ENTRIES", "4096"))
+APP_CACHE_MAX_BYTES = int(os.getenv("APP_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+# On-disk stores (the sqlite backend, Nessie rollups) go here: backend/.cache
+# by default, whatever directory the server was started from
+CACHE_DIR = os.path.abspath(os.getenv(
+    "CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache")
+))
+SQLITE_BUSY_TIMEOUT_SEC = 5.0
+
+# Sweep expired entries every this many writes, so namespaces nobody reads
+# anymore still give their memory back
+SWEEP_EVERY = 256
+
+_MISSING = object()
+
+CacheKey = Tuple[str, Hashable]
+
+
+def connect_sqlite(path: str, timeout: float = SQLITE_BUSY_TIMEOUT_SEC) -> sqlite3.Connection:
+    """
+    Autocommit, WAL-mode connection to a store under CACHE_DIR, usable from
+    any thread (callers serialize access with their own lock)
+    These hold customer data, so the directory is created owner-only (0700)
+    and the database file 0600; SQLite gives its -wal/-shm files the same mode
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+    os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+    db = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory cost of a cached value, in bytes"""
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    try:
+        return len(dumps(value))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires_at", "stale_at")
+
+    def __init__(self, value: Any, size: int, expires_at: Optional[float], stale_at: Optional[float]):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.stale_at = stale_at
+
+
+class CacheHit(NamedTuple):
+    value: Any
+    stale: bool  # past the namespace's soft TTL; serve it, but refresh
+
+
+class _NamespaceStats:
+    __slots__ = ("entries", "bytes", "hits", "stale_hits", "misses", "evictions", "expirations")
+
+    def __init__(self):
+        self.entries = self.bytes = 0
+        self.hits = self.stale_hits = self.misses = self.evictions = self.expirations = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class CacheBackend(ABC):
+    """
+    Interface shared by the cache backends; keys are (namespace, key) pairs
+    Namespace TTLs and the hit/miss counters live in the process, so every
+    worker configures its namespaces the same way at import time
+    """
+
+    name = "base"
+
+    def __init__(self, max_entries: int = APP_CACHE_MAX_ENTRIES, max_bytes: int = APP_CACHE_MAX_BYTES,
+                 default_ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._ttls: Dict[str, Optional[float]] = {}
+        self._soft_ttls: Dict[str, Optional[float]] = {}
+        self._stats: Dict[str, _NamespaceStats] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, namespace: str, ttl: Optional[float], soft_ttl: Optional[float] = None) -> None:
+        """
+        Set a namespace's TTL in seconds (None: entries never expire)
+        With soft_ttl, entries older than it are reported stale by get_entry()
+        until `ttl` (the hard TTL) expires them
+        """
+        with self._lock:
+            self._ttls[namespace] = ttl
+            self._soft_ttls[namespace] = soft_ttl
+            self._stats.setdefault(namespace, _NamespaceStats())
+
+    def ttl_for(self, namespace: str) -> Optional[float]:
+        return self._ttls.get(namespace, self.default_ttl)
+
+    def soft_ttl_for(self, namespace: str) -> Optional[float]:
+        return self._soft_ttls.get(namespace)
+
+    def _ns(self, namespace: str) -> _NamespaceStats:
+        stats = self._stats.get(namespace)
+        if stats is None:
+            stats = self._stats[namespace] = _NamespaceStats()
+        return stats
+
+    def get(self, namespace: str, key: Hashable, default: Any = None) -> Any:
+        hit = self.get_entry(namespace, key)
+        return default if hit is None else hit.value
+
+    @abstractmethod
+    def get_entry(self, namespace: str, key: Hashable) -> Optional[CacheHit]:
+        """The value and whether it is stale, or None on a miss / past the hard TTL"""
+
+    @abstractmethod
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: Any = _MISSING,
+            size: Optional[int] = None) -> None:
+        """Store a value; `ttl` overrides the namespace TTL for this entry"""
+
+    @abstractmethod
+    def delete(self, namespace: str, key: Hashable) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self, namespace: Optional[str] = None) -> None:
+        ...
+
+    @abstractmethod
+    def namespace_stats(self, namespace: str) -> Dict[str, int]:
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+    # Async variants for request handlers; backends that block on I/O run the
+    # call in a worker thread so the event loop keeps serving
+
+    async def aget_entry(self, namespace: str, key: Hashable) -> Optional[CacheHit]:
+        return await asyncio.to_thread(self.get_entry, namespace, key)
+
+    async def aget(self, namespace: str, key: Hashable, default: Any = None) -> Any:
+        hit = await self.aget_entry(namespace, key)
+        return default if hit is None else hit.value
+
+    async def aset(self, namespace: str, key: Hashable, value: Any, ttl: Any = _MISSING,
+                   size: Optional[int] = None) -> None:
+        await asyncio.to_thread(self.set, namespace, key, value, ttl, size)
+
+    async def astats(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.stats)
+
+
+class BoundedCache(CacheBackend):
+    """
+    In-process, thread-safe LRU + TTL cache
+    Cached values are shared between requests and must be treated as read-only
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = APP_CACHE_MAX_ENTRIES, max_bytes: int = APP_CACHE_MAX_BYTES,
+                 default_ttl: Optional[float] = None):
+        super().__init__(max_entries, max_bytes, default_ttl)
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._writes = 0
+        self._on_remove: Dict[str, Callable[[Hashable], None]] = {}
+
+    def on_remove(self, namespace: str, callback: Callable[[Hashable], None]) -> None:
+        """
+        Call callback(key) whenever an entry of namespace leaves the cache
+        (evicted, expired, deleted or cleared; not when overwritten). It runs
+        under the cache lock, so it must not call back into the cache
+        """
+        with self._lock:
+            self._on_remove[namespace] = callback
+
+    def _remove(self, full_key: CacheKey, entry: _Entry, notify: bool = True) -> None:
+        del self._entries[full_key]
+        self._bytes -= entry.size
+        stats = self._ns(full_key[0])
+        stats.entries -= 1
+        stats.bytes -= entry.size
+        callback = self._on_remove.get(full_key[0]) if notify else None
+        if callback is not None:
+            callback(full_key[1])
+
+    # Everything is in memory behind a short lock; no point in a thread hop
+
+    async def aget_entry(self, namespace: str, key: Hashable) -> Optional[CacheHit]:
+        return self.get_entry(namespace, key)
+
+    async def aset(self, namespace: str, key: Hashable, value: Any, ttl: Any = _MISSING,
+                   size: Optional[int] = None) -> None:
+        self.set(namespace, key, value, ttl, size)
+
+    async def astats(self) -> Dict[str, Any]:
+        return self.stats()
+
+    def get_entry(self, namespace: str, key: Hashable) -> Optional[CacheHit]:
+        full_key = (namespace, key)
+        now = time.monotonic()
+        with self._lock:
+            stats = self._ns(namespace)
+            entry = self._entries.get(full_key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= now:
+                self._remove(full_key, entry)
+                stats.expirations += 1
+                entry = None
+            if entry is None:
+                stats.misses += 1
+                return None
+            self._entries.move_to_end(full_key)
+            stale = entry.stale_at is not None and entry.stale_at <= now
+            if stale:
+                stats.stale_hits += 1
+            else:
+                stats.hits += 1
+            return CacheHit(entry.value, stale)
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: Any = _MISSING,
+            size: Optional[int] = None) -> None:
+        ttl = self.ttl_for(namespace) if ttl is _MISSING else ttl
+        size = estimate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return  # would evict everything else and still not fit
+        now = time.monotonic()
+        expires_at = now + ttl if ttl is not None else None
+        soft_ttl = self.soft_ttl_for(namespace)
+        stale_at = now + soft_ttl if soft_ttl is not None else None
+        full_key = (namespace, key)
+
+        with self._lock:
+            previous = self._entries.get(full_key)
+            if previous is not None:
+                self._remove(full_key, previous, notify=False)
+            self._entries[full_key] = _Entry(value, size, expires_at, stale_at)
+            self._bytes += size
+            stats = self._ns(namespace)
+            stats.entries += 1
+            stats.bytes += size
+
+            self._writes += 1
+            over = len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            if over or self._writes % SWEEP_EVERY == 0:
+                self._sweep_expired()
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                evicted_key, evicted = next(iter(self._entries.items()))
+                self._remove(evicted_key, evicted)
+                self._ns(evicted_key[0]).evictions += 1
+
+    def delete(self, namespace: str, key: Hashable) -> None:
+        full_key = (namespace, key)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is not None:
+                self._remove(full_key, entry)
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            for full_key, entry in list(self._entries.items()):
+                if namespace is None or full_key[0] == namespace:
+                    self._remove(full_key, entry)
+
+    def _sweep_expired(self) -> None:
+        now = time.monotonic()
+        for full_key, entry in list(self._entries.items()):
+            if entry.expires_at is not None and entry.expires_at <= now:
+                self._remove(full_key, entry)
+                self._ns(full_key[0]).expirations += 1
+
+    def namespace_stats(self, namespace: str) -> Dict[str, int]:
+        with self._lock:
+            return self._ns(namespace).as_dict()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "namespaces": {
+                    name: {**s.as_dict(), "ttl_sec": self.ttl_for(name), "soft_ttl_sec": self.soft_ttl_for(name)}
+                    for name, s in sorted(self._stats.items())
+                },
+            }
+
+
+def _create_cache() -> CacheBackend:
+    if CACHE_BACKEND == "sqlite":
+        from utils.sqlite_cache import SQLiteCache
+        return SQLiteCache()
+    if CACHE_BACKEND != "memory":
+        raise ValueError(f"Unknown CACHE_BACKEND '{CACHE_BACKEND}' (expected 'memory' or 'sqlite')")
+    return BoundedCache()
+
+
+_cache = _create_cache()
+_local_cache = _cache if isinstance(_cache, BoundedCache) else BoundedCache()
+
+
+def get_cache() -> CacheBackend:
+    """Get the configured app cache (shared across workers with CACHE_BACKEND=sqlite)"""
+    return _cache
+
+
+def get_local_cache() -> BoundedCache:
+    """Get the in-process cache (the same object as get_cache() with the memory backend)"""
+    return _local_cache
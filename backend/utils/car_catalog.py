@@ -0,0 +1,213 @@
+"""
+Process-local snapshot of the scraped_cars catalog
+Loads the whole table once, builds make/model/year indexes and answers
+lookups from memory. The snapshot is refreshed in the background once it is
+older than CAR_CATALOG_TTL_SEC, or on demand via refresh()
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+
+from utils.initialize_supabase import get_supabase_client
+from utils.model_matcher import ModelMatcher, model_key
+from utils.car_filters import CatalogColumns
+from utils.car_scoring import CatalogFeatures, score_catalog
+
+logger = logging.getLogger(__name__)
+
+CATALOG_TABLE = "scraped_cars"
+CATALOG_TTL_SEC = int(os.getenv("CAR_CATALOG_TTL_SEC", "300"))
+CATALOG_PAGE_SIZE = 1000  # PostgREST caps a single select at 1000 rows by default
+# Shorter model queries ("a") are inside most names; they only match a model exactly
+MIN_SUBSTRING_KEY_LEN = 2
+
+
+class CatalogSnapshot:
+    """Immutable, indexed view of the catalog at one point in time"""
+
+    def __init__(self, rows: List[Dict[str, Any]], loaded_at: float):
+        # Newest model years first so every index bucket is already in
+        # the same order the old `.order('year', desc=True)` query used
+        self.rows = sorted(rows, key=lambda r: r.get("year") or 0, reverse=True)
+        self.loaded_at = loaded_at
+
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.by_make: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_year: Dict[int, List[Dict[str, Any]]] = {}
+        self.by_model: Dict[str, List[Dict[str, Any]]] = {}
+
+        for row in self.rows:
+            self.by_id[str(row.get("id"))] = row
+            self.by_make.setdefault((row.get("make") or "").lower(), []).append(row)
+            if row.get("year") is not None:
+                self.by_year.setdefault(int(row["year"]), []).append(row)
+            self.by_model.setdefault((row.get("name") or "").lower(), []).append(row)
+
+        self.model_matcher = ModelMatcher(bucket[0].get("name") for bucket in self.by_model.values())
+        self.columns = CatalogColumns(self.rows)
+        self.features = CatalogFeatures(self.columns)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def get(self, vehicle_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(str(vehicle_id))
+
+    def resolve_model(self, model: str, fuzzy: bool = True) -> Optional[str]:
+        """
+        Lowercase name fragment to match against: the model itself if any
+        name contains it, otherwise (with fuzzy set) the name picked by the
+        transcription-tolerant ModelMatcher ("rav four" -> "rav4")
+        With fuzzy set, a model too short to mean anything ("", "a") that
+        isn't a model name itself resolves to None: no vehicle matches it
+        """
+        model_text = (model or "").lower()
+        if not fuzzy:
+            return model_text
+        if len(model_key(model_text)) < MIN_SUBSTRING_KEY_LEN:
+            resolved = self.model_matcher.match(model_text)
+            return resolved.name.lower() if resolved else None
+        if any(model_text in name for name in self.by_model):
+            return model_text
+        resolved = self.model_matcher.match(model)
+        return resolved.name.lower() if resolved else model_text
+
+    def search(self, make: str, model: str, year: Optional[int] = None, fuzzy: bool = True) -> List[Dict[str, Any]]:
+        """
+        Same semantics as the old Supabase query:
+        make ILIKE make AND name ILIKE %model% [AND year = year], newest first
+        Misheard model names are resolved through resolve_model()
+        """
+        model_text = self.resolve_model(model, fuzzy)
+        if model_text is None:
+            return []
+        make_key = (make or "").lower()
+        # Start from the smaller of the make and year buckets; both are
+        # already newest first, so the matches need no sort
+        candidates = self.by_make.get(make_key, [])
+        if year is not None:
+            by_year = self.by_year.get(year, [])
+            if len(by_year) < len(candidates):
+                candidates = by_year
+        return [
+            row for row in candidates
+            if (row.get("make") or "").lower() == make_key
+            and (year is None or row.get("year") == year)
+            and model_text in (row.get("name") or "").lower()
+        ]
+
+    def query(self, model: Optional[str] = None, **filters) -> Dict[str, Any]:
+        """
+        Faceted, ranked and paginated search over the columnar view
+        See CatalogColumns.mask() for the available filters
+        """
+        return self.columns.query(models=self._models_filter(model), **filters)
+
+    def _models_filter(self, model: Optional[str]) -> Optional[List[str]]:
+        """The `models` filter for a requested model: None if none was, [] if it matches nothing"""
+        if model is None:
+            return None
+        resolved = self.resolve_model(model)
+        return [resolved] if resolved is not None else []
+
+    def recommend(self, k: int = 5, preferences: Optional[Dict[str, Any]] = None,
+                  **filters) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Score the whole snapshot against `preferences` (see score_catalog) and
+        return the k best (row, score fields) pairs among the rows passing
+        `filters` (see CatalogColumns.mask)
+        """
+        filters["models"] = self._models_filter(filters.pop("model", None))
+        scores = score_catalog(self.features, **(preferences or {}))
+        best = scores.top_k(k, self.columns.mask(**filters))
+        return [(self.rows[i], scores.for_vehicle(i)) for i in best]
+
+
+class CarCatalog:
+    """Holds the current snapshot and swaps in a new one on refresh"""
+
+    def __init__(self, table: str = CATALOG_TABLE, ttl_sec: int = CATALOG_TTL_SEC):
+        self.table = table
+        self.ttl_sec = ttl_sec
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._load_lock = threading.Lock()
+        self._refreshing = False
+
+    def _fetch_rows(self) -> List[Dict[str, Any]]:
+        supabase = get_supabase_client()
+        rows: List[Dict[str, Any]] = []
+        start = 0
+        while True:
+            result = (
+                supabase.table(self.table)
+                .select("*")
+                .order("id")
+                .range(start, start + CATALOG_PAGE_SIZE - 1)
+                .execute()
+            )
+            page = result.data or []
+            rows.extend(page)
+            if len(page) < CATALOG_PAGE_SIZE:
+                return rows
+            start += CATALOG_PAGE_SIZE
+
+    def _load(self) -> CatalogSnapshot:
+        started = time.time()
+        snapshot = CatalogSnapshot(self._fetch_rows(), loaded_at=time.time())
+        self._snapshot = snapshot
+        logger.info(
+            f"Loaded {len(snapshot)} rows from {self.table} in {(time.time() - started) * 1000:.0f} ms"
+        )
+        return snapshot
+
+    def refresh(self) -> CatalogSnapshot:
+        """Reload the table from Supabase and swap in the new snapshot"""
+        with self._load_lock:
+            return self._load()
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning(f"Background catalog refresh failed, keeping previous snapshot: {e}")
+        finally:
+            self._refreshing = False
+
+    def snapshot(self) -> CatalogSnapshot:
+        """
+        Return the current snapshot
+        The first call loads synchronously; after that a stale snapshot is
+        still served while a background thread fetches the new one
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._load_lock:
+                # Another request may have finished the initial load while we waited
+                if self._snapshot is not None:
+                    return self._snapshot
+                return self._load()
+
+        if time.time() - snapshot.loaded_at > self.ttl_sec and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+        return snapshot
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "table": self.table,
+            "loaded": snapshot is not None,
+            "row_count": len(snapshot) if snapshot else 0,
+            "age_sec": round(time.time() - snapshot.loaded_at, 1) if snapshot else None,
+            "ttl_sec": self.ttl_sec,
+        }
+
+
+_catalog = CarCatalog()
+
+
+def get_car_catalog() -> CarCatalog:
+    """Get the process-wide catalog instance"""
+    return _catalog
@@ -0,0 +1,200 @@
+"""
+Columnar (NumPy) view of the catalog for faceted filtering
+Built once per catalog snapshot; a filter request is then a handful of
+vectorized comparisons, one lexsort for ranking and np.unique for facets
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from utils.spec_parsing import load_specs, parse_number, typed_specs
+
+SORT_KEYS = ("year", "price", "mpg", "horsepower")
+
+
+def _float_column(values) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+
+def normalize_fuel_type(value: Optional[str]) -> str:
+    """Collapse scraped / EPA fuel labels into a few facet values"""
+    text = (value or "").lower()
+    if not text:
+        return "gasoline"
+    if "electric" in text and ("gas" in text or "hybrid" in text):
+        return "hybrid"
+    if "hybrid" in text:
+        return "hybrid"
+    if "electric" in text:
+        return "electric"
+    if "hydrogen" in text or "fuel cell" in text:
+        return "hydrogen"
+    if "diesel" in text:
+        return "diesel"
+    if "e85" in text or "flex" in text:
+        return "flex-fuel"
+    return "gasoline"
+
+
+def normalize_drive(value: Optional[str]) -> str:
+    """Collapse drivetrain labels ("All-Wheel Drive", "AWD", "4x4") into codes"""
+    text = (value or "").lower().replace("-", " ")
+    if not text:
+        return "unknown"
+    if "awd" in text or "all wheel" in text:
+        return "awd"
+    if "4wd" in text or "4x4" in text or "4 wheel" in text or "four wheel" in text:
+        return "4wd"
+    if "fwd" in text or "front wheel" in text:
+        return "fwd"
+    if "rwd" in text or "rear wheel" in text:
+        return "rwd"
+    return "unknown"
+
+
+class CatalogColumns:
+    """Parallel NumPy arrays, one slot per catalog row"""
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+        specs = [load_specs(r.get("additional_specs")) for r in rows]
+        # Typed spec columns (parsed at ingest); see utils/spec_parsing.py
+        numeric = [typed_specs(r) for r in rows]
+
+        def typed(column: str) -> np.ndarray:
+            return _float_column(n.get(column) for n in numeric)
+
+        self.make = np.array([(r.get("make") or "").lower() for r in rows], dtype=str)
+        self.name = np.array([(r.get("name") or "").lower() for r in rows], dtype=str)
+        self.year = _float_column(parse_number(r.get("year")) for r in rows)
+        self.price = _float_column(parse_number(r.get("price")) for r in rows)
+        self.mpg = typed("mpg_combined")
+        self.horsepower = typed("horsepower_hp")
+        self.seating = typed("seating_capacity_num")
+        self.cargo = typed("cargo_space_cu_ft")
+        self.towing = typed("towing_capacity_lbs")
+        self.ground_clearance = typed("ground_clearance_in")
+        self.fuel_type = np.array([normalize_fuel_type(s.get("fuel_type")) for s in specs], dtype=str)
+        self.drive = np.array([normalize_drive(s.get("drivetrain")) for s in specs], dtype=str)
+        self.body_style = np.array([(s.get("body_style") or "unknown").lower() for s in specs], dtype=str)
+        # Everything we know about a car as one lowercase string, for keyword matching
+        # (normalized drive/fuel codes included, so "awd" also hits "All-Wheel Drive")
+        self.feature_text = np.array(
+            [" ".join(str(v) for v in (r.get("name"), d, f, *s.keys(), *s.values()) if v).lower()
+             for r, s, d, f in zip(rows, specs, self.drive, self.fuel_type)],
+            dtype=str,
+        )
+        self.year_label = np.array(
+            ["unknown" if np.isnan(y) else str(int(y)) for y in self.year], dtype=str
+        )
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def mask(
+        self,
+        make: Optional[str] = None,
+        models: Optional[List[str]] = None,
+        year: Optional[int] = None,
+        fuel_type: Optional[str] = None,
+        drive: Optional[str] = None,
+        min_mpg: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_price: Optional[float] = None,
+        min_horsepower: Optional[float] = None,
+        max_horsepower: Optional[float] = None,
+        min_seating: Optional[float] = None,
+        max_seating: Optional[float] = None,
+        min_cargo: Optional[float] = None,
+        max_cargo: Optional[float] = None,
+    ) -> np.ndarray:
+        """
+        Boolean mask of rows passing every given filter
+        `models` are lowercase substrings of the name (any may match; an
+        empty list matches nothing).
+        Range filters drop rows whose value is unknown (NaN compares False)
+        """
+        m = np.ones(len(self), dtype=bool)
+        if make:
+            m &= self.make == make.lower()
+        if models is not None:
+            name_hit = np.zeros(len(self), dtype=bool)
+            for model in models:
+                name_hit |= np.char.find(self.name, model.lower()) >= 0
+            m &= name_hit
+        if year is not None:
+            m &= self.year == year
+        if fuel_type:
+            m &= self.fuel_type == normalize_fuel_type(fuel_type)
+        if drive:
+            m &= self.drive == normalize_drive(drive)
+
+        ranges = (
+            (self.mpg, min_mpg, None),
+            (self.price, min_price, max_price),
+            (self.horsepower, min_horsepower, max_horsepower),
+            (self.seating, min_seating, max_seating),
+            (self.cargo, min_cargo, max_cargo),
+        )
+        for column, low, high in ranges:
+            if low is not None:
+                m &= column >= low
+            if high is not None:
+                m &= column <= high
+        return m
+
+    def rank(self, mask: np.ndarray, sort_by: str = "year") -> np.ndarray:
+        """
+        Indices of masked rows, best first
+        year: newest, then cheapest; price: cheapest; mpg/horsepower: highest
+        Unknown values always sort last
+        """
+        idx = np.flatnonzero(mask)
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"sort_by must be one of {', '.join(SORT_KEYS)}")
+
+        def desc(col: np.ndarray) -> np.ndarray:
+            return np.where(np.isnan(col), np.inf, -col)
+
+        def asc(col: np.ndarray) -> np.ndarray:
+            return np.where(np.isnan(col), np.inf, col)
+
+        year, price = self.year[idx], self.price[idx]
+        if sort_by == "price":
+            keys = (desc(year), asc(price))
+        elif sort_by == "mpg":
+            keys = (asc(price), desc(self.mpg[idx]))
+        elif sort_by == "horsepower":
+            keys = (asc(price), desc(self.horsepower[idx]))
+        else:
+            keys = (asc(price), desc(year))
+        # np.lexsort sorts by the last key first
+        return idx[np.lexsort(keys)]
+
+    def facets(self, mask: np.ndarray) -> Dict[str, Dict[str, int]]:
+        """Value counts of the categorical columns over the matching rows"""
+        out: Dict[str, Dict[str, int]] = {}
+        for label, column in (
+            ("fuelType", self.fuel_type),
+            ("drive", self.drive),
+            ("bodyStyle", self.body_style),
+            ("year", self.year_label),
+        ):
+            values, counts = np.unique(column[mask], return_counts=True)
+            out[label] = {str(v): int(c) for v, c in zip(values, counts)}
+        return out
+
+    def query(self, sort_by: str = "year", page: int = 1, page_size: int = 10, **filters) -> Dict[str, Any]:
+        """Filter, rank and paginate in one pass; rows are the raw catalog rows"""
+        mask = self.mask(**filters)
+        order = self.rank(mask, sort_by)
+        page = max(1, int(page))
+        page_size = max(1, int(page_size))
+        start = (page - 1) * page_size
+        return {
+            "total": int(order.size),
+            "page": page,
+            "pageSize": page_size,
+            "rows": [self.rows[i] for i in order[start:start + page_size]],
+            "facets": self.facets(mask),
+        }
@@ -0,0 +1,250 @@
+"""
+Batch scoring of catalog vehicles against a user's preferences
+Every factor the frontend shows (priceCompatibility, passengerFit, ...) is a
+column of one (n_vehicles x n_factors) matrix computed with NumPy; the total
+score is that matrix times FACTOR_WEIGHTS, so ranking the whole catalog is a
+single top-k over it
+"""
+from typing import Any, Dict, List, Optional
+import re
+
+import numpy as np
+
+from utils.car_filters import CatalogColumns, normalize_fuel_type
+
+FACTORS = (
+    "vehicleTypeMatch",
+    "priceCompatibility",
+    "featureAlignment",
+    "passengerFit",
+    "fuelTypeMatch",
+    "usageCompatibility",
+    "locationFactor",
+)
+FACTOR_WEIGHTS = np.array([0.15, 0.25, 0.15, 0.15, 0.10, 0.15, 0.05])
+
+# Score a factor gets when the user expressed no preference for it
+NEUTRAL_SCORE = 80.0
+# We have no dealer/location data yet, so every vehicle scores the same here
+LOCATION_SCORE = 85.0
+
+# Absolute reference ranges used to put specs on a 0..1 scale, so a single
+# vehicle scores the same whether or not the rest of the catalog is loaded
+SPEC_RANGES = {
+    "mpg": (15.0, 45.0),
+    "seating": (2.0, 8.0),
+    "cargo": (10.0, 80.0),
+    "towing": (0.0, 7000.0),
+    "ground_clearance": (5.0, 10.0),
+    "horsepower": (100.0, 400.0),
+}
+
+# Usage keyword -> weight of each normalized spec (same order as SPEC_RANGES)
+USAGE_PROFILES = {
+    "commute": (1.0, 0.0, 0.0, 0.0, 0.0, 0.0),
+    "family": (0.2, 0.5, 0.3, 0.0, 0.0, 0.0),
+    "road trip": (0.5, 0.2, 0.3, 0.0, 0.0, 0.0),
+    "towing": (0.0, 0.0, 0.1, 0.8, 0.1, 0.0),
+    "off-road": (0.0, 0.0, 0.0, 0.2, 0.8, 0.0),
+    "performance": (0.0, 0.0, 0.0, 0.0, 0.0, 1.0),
+}
+USAGE_LABELS = {
+    "commute": "Daily commuting",
+    "family": "Family trips",
+    "road trip": "Road trips",
+    "towing": "Towing and hauling",
+    "off-road": "Off-road adventures",
+    "performance": "Spirited driving",
+}
+# Words and phrases that select each profile; matched as whole words only,
+# so "" or "a" selects nothing (and falls back to DEFAULT_USAGE)
+USAGE_ALIASES = {
+    "commute": ("commute", "commuting", "commuter", "daily", "city", "work"),
+    "family": ("family", "families", "kids", "children", "school"),
+    "road trip": ("road trip", "road trips", "roadtrip", "trips", "long distance", "highway"),
+    "towing": ("towing", "tow", "haul", "hauling", "trailer", "boat"),
+    "off-road": ("off-road", "offroad", "off road", "trail", "trails", "overlanding"),
+    "performance": ("performance", "sport", "sporty", "spirited", "fast", "track"),
+}
+_USAGE_PATTERNS = {
+    key: re.compile(r"\b(?:" + "|".join(re.escape(alias) for alias in aliases) + r")\b")
+    for key, aliases in USAGE_ALIASES.items()
+}
+DEFAULT_USAGE = ("commute", "family")
+# A vehicle is listed as suiting a usage profile at or above this spec fit (0..1)
+USAGE_SUITS_MIN = 0.5
+USAGE_ANALYSIS_MAX = 3
+
+DEFAULT_SEATING = 5.0
+
+
+def _usage_keys(usage: Optional[List[str]]) -> List[str]:
+    keys = []
+    for item in usage or []:
+        text = (item or "").lower()
+        keys.extend(k for k, pattern in _USAGE_PATTERNS.items() if pattern.search(text))
+    return list(dict.fromkeys(keys)) or list(DEFAULT_USAGE)
+
+
+# Profile weights normalized to sum to 1, one column per profile
+_PROFILE_KEYS = list(USAGE_PROFILES)
+_PROFILE_MATRIX = np.array([USAGE_PROFILES[k] for k in _PROFILE_KEYS]).T
+_PROFILE_MATRIX = _PROFILE_MATRIX / _PROFILE_MATRIX.sum(axis=0)
+
+
+class CatalogFeatures:
+    """Preference-independent feature columns, precomputed once per snapshot"""
+
+    def __init__(self, columns: CatalogColumns):
+        self.columns = columns
+        specs = np.column_stack([getattr(columns, name) for name in SPEC_RANGES])
+
+        lows = np.array([lo for lo, _ in SPEC_RANGES.values()])
+        highs = np.array([hi for _, hi in SPEC_RANGES.values()])
+        normalized = np.clip((specs - lows) / (highs - lows), 0.0, 1.0)
+        # Unknown specs sit in the middle rather than dragging a car to zero
+        self.normalized = np.where(np.isnan(normalized), 0.5, normalized)
+
+        core = np.column_stack([
+            ~np.isnan(columns.price),
+            ~np.isnan(columns.mpg),
+            ~np.isnan(columns.seating),
+            ~np.isnan(columns.horsepower),
+            columns.body_style != "unknown",
+            columns.drive != "unknown",
+        ])
+        self.completeness = core.mean(axis=1)
+        self.seating = np.where(np.isnan(columns.seating), DEFAULT_SEATING, columns.seating)
+
+
+class CatalogScores:
+    """Factor matrix, totals and confidence for every vehicle in a snapshot"""
+
+    def __init__(self, factors: np.ndarray, confidence: np.ndarray, price: np.ndarray,
+                 seating: np.ndarray, normalized: np.ndarray, budget: Optional[float], usage: List[str]):
+        self.factors = factors
+        self.total = factors @ FACTOR_WEIGHTS
+        self.confidence = confidence
+        self.price = price
+        self.seating = seating
+        self.normalized = normalized
+        self.budget = budget
+        self.usage = usage
+
+    def top_k(self, k: int, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Indices of the k best-scoring vehicles (within mask), best first"""
+        total = self.total if mask is None else np.where(mask, self.total, -np.inf)
+        candidates = np.flatnonzero(np.isfinite(total))
+        k = min(k, candidates.size)
+        if k <= 0:
+            return np.empty(0, dtype=int)
+        part = candidates[np.argpartition(-total[candidates], k - 1)[:k]]
+        return part[np.argsort(-total[part], kind="stable")]
+
+    def for_vehicle(self, i: int) -> Dict[str, Any]:
+        """Score fields in the shape format_scraped_car returns them"""
+        price = self.price[i]
+        if self.budget and not np.isnan(price):
+            within_budget = bool(price <= self.budget)
+            pct_from_budget = round(float((price - self.budget) / self.budget * 100), 1)
+        else:
+            within_budget, pct_from_budget = True, 0
+        return {
+            "totalScore": int(round(self.total[i])),
+            "confidenceScore": int(round(self.confidence[i])),
+            "factors": {name: int(round(v)) for name, v in zip(FACTORS, self.factors[i])},
+            "priceAnalysis": {
+                "isWithinBudget": within_budget,
+                "percentageFromBudget": pct_from_budget,
+            },
+            "actualCapacity": int(self.seating[i]),
+            "usageAnalysis": self.usage_analysis(i),
+        }
+
+    def usage_analysis(self, i: int) -> List[str]:
+        """
+        Labels of the usage profiles this vehicle's specs suit, the ones the
+        user asked about first, then the best fitting; at least the best one
+        """
+        fit = dict(zip(_PROFILE_KEYS, self.normalized[i] @ _PROFILE_MATRIX))
+        ranked = sorted(_PROFILE_KEYS, key=lambda k: (k not in self.usage, -fit[k]))
+        suits = [k for k in ranked if fit[k] >= USAGE_SUITS_MIN][:USAGE_ANALYSIS_MAX]
+        return [USAGE_LABELS[k] for k in suits or [max(_PROFILE_KEYS, key=fit.get)]]
+
+
+def score_catalog(
+    features: CatalogFeatures,
+    budget: Optional[float] = None,
+    passengers: Optional[int] = None,
+    fuel_type: Optional[str] = None,
+    body_styles: Optional[List[str]] = None,
+    desired_features: Optional[List[str]] = None,
+    usage: Optional[List[str]] = None,
+) -> CatalogScores:
+    """Score every vehicle against one preference vector"""
+    cols = features.columns
+    n = len(cols)
+    neutral = np.full(n, NEUTRAL_SCORE)
+
+    # vehicleTypeMatch: body style in the wanted set
+    if body_styles:
+        hit = np.zeros(n, dtype=bool)
+        for style in body_styles:
+            hit |= np.char.find(cols.body_style, style.lower()) >= 0
+        vehicle_type = np.where(hit, 100.0, np.where(cols.body_style == "unknown", 60.0, 35.0))
+    else:
+        vehicle_type = neutral
+
+    # priceCompatibility: full marks at or under budget, -25 per 10% over
+    if budget:
+        ratio = cols.price / float(budget)
+        price_fit = np.where(ratio <= 1.0, 100.0, np.clip(100.0 - (ratio - 1.0) * 250.0, 0.0, 100.0))
+        price_fit = np.where(np.isnan(cols.price), 50.0, price_fit)
+    else:
+        price_fit = neutral
+
+    # featureAlignment: share of desired features mentioned in the car's specs
+    if desired_features:
+        hits = np.column_stack([
+            np.char.find(cols.feature_text, f.lower().strip()) >= 0 for f in desired_features
+        ])
+        feature_fit = 100.0 * hits.mean(axis=1)
+    else:
+        feature_fit = neutral
+
+    # passengerFit: -40 per missing seat, -4 per spare seat (floor 80)
+    if passengers:
+        spare = features.seating - float(passengers)
+        passenger_fit = np.where(
+            spare >= 0,
+            np.clip(100.0 - 4.0 * spare, 80.0, 100.0),
+            np.clip(100.0 + 40.0 * spare, 0.0, 100.0),
+        )
+    else:
+        passenger_fit = np.full(n, 85.0)
+
+    # fuelTypeMatch: exact fuel family, otherwise rate fuel economy
+    mpg_score = np.clip(40.0 + 60.0 * features.normalized[:, 0], 40.0, 100.0)
+    if fuel_type:
+        fuel_fit = np.where(cols.fuel_type == normalize_fuel_type(fuel_type), 100.0, 0.4 * mpg_score)
+    else:
+        fuel_fit = np.where(np.isnan(cols.mpg), 70.0, mpg_score)
+
+    # usageCompatibility: weighted specs for the stated usage
+    usage_keys = _usage_keys(usage)
+    weights = np.array([USAGE_PROFILES[k] for k in usage_keys]).sum(axis=0)
+    usage_fit = 40.0 + 60.0 * (features.normalized @ (weights / weights.sum()))
+
+    factors = np.column_stack([
+        vehicle_type, price_fit, feature_fit, passenger_fit, fuel_fit, usage_fit,
+        np.full(n, LOCATION_SCORE),
+    ])
+
+    confidence = 50.0 + 50.0 * features.completeness
+    return CatalogScores(factors, confidence, cols.price, features.seating, features.normalized, budget, usage_keys)
+
+
+def score_vehicle(vehicle: Dict[str, Any], **preferences) -> Dict[str, Any]:
+    """Score a single scraped_cars row (used by format_scraped_car)"""
+    features = CatalogFeatures(CatalogColumns([vehicle]))
+    return score_catalog(features, **preferences).for_vehicle(0)
@@ -0,0 +1,75 @@
+"""
+Fast JSON encoding for API responses and agent tool payloads
+Uses orjson when it is installed (it is in requirements.txt) and falls back
+to the standard library otherwise. Fragment lets a handler embed JSON that
+was encoded earlier (e.g. a cached vehicle) without decoding/re-encoding it
+"""
+from typing import Any, Dict
+import json
+import secrets
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speed-up
+    orjson = None
+
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson else 0
+
+
+class Fragment:
+    """Already-encoded JSON, written into the output verbatim"""
+
+    __slots__ = ("encoded",)
+
+    def __init__(self, encoded: bytes):
+        self.encoded = encoded if isinstance(encoded, bytes) else encoded.encode("utf-8")
+
+
+def _fallback(obj: Any) -> Any:
+    # Decimals from NUMERIC columns, dates, etc.
+    return str(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode to compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_fallback, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=_fallback, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def dumps_with_fragments(obj: Any) -> bytes:
+    """
+    Like dumps(), but Fragment values anywhere in obj are spliced in as-is
+    Each fragment is encoded as a unique placeholder string first, then the
+    quoted placeholder is replaced by the fragment's bytes
+    """
+    token = secrets.token_hex(8)
+    fragments: Dict[bytes, bytes] = {}
+
+    def default(value: Any) -> Any:
+        if isinstance(value, Fragment):
+            placeholder = f"__fragment_{token}_{len(fragments)}__"
+            fragments[f'"{placeholder}"'.encode()] = value.encoded
+            return placeholder
+        return _fallback(value)
+
+    if orjson is not None:
+        out = orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS)
+    else:
+        out = json.dumps(obj, default=default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    for placeholder, encoded in fragments.items():
+        out = out.replace(placeholder, encoded, 1)
+    return out
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    App-wide default response class (see main.py)
+    Return it directly from a handler to use Fragment values; FastAPI's
+    jsonable_encoder doesn't know about them
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps_with_fragments(content)
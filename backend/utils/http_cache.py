@@ -0,0 +1,48 @@
+"""
+Conditional GET helpers (strong ETags + If-None-Match -> 304)
+"""
+from typing import Callable, Optional, Union
+import hashlib
+
+from fastapi import Request, Response
+
+
+def make_etag(body: Union[str, bytes]) -> str:
+    """Strong ETag from the exact response bytes"""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match check (RFC 9110 13.1.2): weak comparison, "*" matches anything
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def conditional_json_response(request: Request, body: Union[str, bytes, Callable[[], bytes]],
+                              etag: str) -> Response:
+    """
+    304 with no body if the client already has this version, otherwise the
+    pre-encoded JSON body (or, if body is a callable, what it returns; it
+    isn't called for a 304). `no-cache` makes browsers revalidate every time
+    instead of serving a possibly stale copy
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if callable(body):
+        body = body()
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,120 @@
+"""
+App-lifetime httpx clients, one connection pool per upstream API
+Creating an AsyncClient per request costs a TCP + TLS handshake every time.
+main.py starts these in the FastAPI lifespan and closes them on shutdown;
+route handlers borrow them with get_http_client("nessie") and must not
+close them. Limits and timeouts are configurable per upstream via env, e.g.
+NESSIE_HTTP_MAX_CONNECTIONS or ELEVENLABS_HTTP_READ_TIMEOUT_SEC
+"""
+from typing import Dict, NamedTuple
+import logging
+import os
+
+import httpx
+
+log = logging.getLogger(__name__)
+
+
+class UpstreamConfig(NamedTuple):
+    max_connections: int
+    max_keepalive: int
+    keepalive_expiry_sec: float
+    connect_timeout_sec: float
+    read_timeout_sec: float
+
+
+# Defaults; each field can be overridden with <NAME>_HTTP_<FIELD> env vars
+UPSTREAMS: Dict[str, UpstreamConfig] = {
+    "nessie": UpstreamConfig(
+        max_connections=20, max_keepalive=10, keepalive_expiry_sec=30.0,
+        connect_timeout_sec=5.0, read_timeout_sec=25.0,
+    ),
+    "elevenlabs": UpstreamConfig(
+        max_connections=10, max_keepalive=5, keepalive_expiry_sec=30.0,
+        connect_timeout_sec=5.0, read_timeout_sec=10.0,
+    ),
+}
+
+_ENV_FIELDS = {
+    "max_connections": ("MAX_CONNECTIONS", int),
+    "max_keepalive": ("MAX_KEEPALIVE", int),
+    "keepalive_expiry_sec": ("KEEPALIVE_EXPIRY_SEC", float),
+    "connect_timeout_sec": ("CONNECT_TIMEOUT_SEC", float),
+    "read_timeout_sec": ("READ_TIMEOUT_SEC", float),
+}
+
+
+def _http2_enabled() -> bool:
+    """HTTP/2 when UPSTREAM_HTTP2=1 and the h2 package is installed"""
+    if os.getenv("UPSTREAM_HTTP2", "0") != "1":
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        log.warning("UPSTREAM_HTTP2=1 but the h2 package isn't installed; using HTTP/1.1")
+        return False
+    return True
+
+
+def upstream_config(name: str) -> UpstreamConfig:
+    """UPSTREAMS[name] with any env overrides applied"""
+    config = UPSTREAMS[name]
+    overrides = {}
+    for field, (suffix, cast) in _ENV_FIELDS.items():
+        value = os.getenv(f"{name.upper()}_HTTP_{suffix}")
+        if value:
+            overrides[field] = cast(value)
+    return config._replace(**overrides)
+
+
+def _new_client(name: str) -> httpx.AsyncClient:
+    config = upstream_config(name)
+    return httpx.AsyncClient(
+        http2=_http2_enabled(),
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive,
+            keepalive_expiry=config.keepalive_expiry_sec,
+        ),
+        timeout=httpx.Timeout(config.read_timeout_sec, connect=config.connect_timeout_sec),
+    )
+
+
+class HttpClients:
+    """Registry of one AsyncClient per upstream"""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    async def start(self) -> None:
+        for name in UPSTREAMS:
+            self.get(name)
+        log.info(f"HTTP clients ready: {', '.join(self._clients)}")
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """
+        The shared client for an upstream
+        Created on first use if the lifespan hasn't started it (scripts, tests)
+        """
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            if name not in UPSTREAMS:
+                raise KeyError(f"Unknown upstream '{name}'")
+            client = self._clients[name] = _new_client(name)
+        return client
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+_http_clients = HttpClients()
+
+
+def get_http_clients() -> HttpClients:
+    return _http_clients
+
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    return _http_clients.get(name)
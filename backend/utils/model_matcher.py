@@ -0,0 +1,145 @@
+"""
+Typo- and transcription-tolerant matching of spoken model names
+Voice transcripts come in as "rav four", "four runner" or "high lander".
+Names are normalized to a compact key (spelled-out numbers to digits,
+spelled-out letters joined, punctuation and spaces dropped, known
+mishearings aliased) and then looked up exactly, by substring, and finally
+through a trigram index. Queries too short to say anything ("", "a") only
+ever match exactly
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+import re
+
+NUMBER_WORDS = {
+    "zero": "0", "one": "1", "two": "2", "three": "3", "four": "4", "for": "4",
+    "five": "5", "six": "6", "seven": "7", "eight": "8", "nine": "9", "ten": "10",
+    "eighty": "80", "eighty six": "86",
+}
+
+# Letters as transcripts spell them: "see h r" is C-HR
+LETTER_WORDS = {
+    "ay": "a", "bee": "b", "see": "c", "cee": "c", "dee": "d", "ee": "e", "eff": "f",
+    "gee": "g", "aitch": "h", "eye": "i", "jay": "j", "kay": "k", "el": "l", "em": "m",
+    "en": "n", "oh": "o", "pee": "p", "cue": "q", "are": "r", "ar": "r", "es": "s",
+    "tee": "t", "you": "u", "vee": "v", "ex": "x", "why": "y", "zee": "z", "zed": "z",
+}
+
+# Compact keys (see model_key) that transcription regularly produces for
+# our models and that are too far off for trigrams to recover on their own
+ALIASES = {
+    "raf4": "rav4",
+    "ravi4": "rav4",
+    "rab4": "rav4",
+    "forerunner": "4runner",
+    "kamry": "camry",
+    "kamri": "camry",
+    "corona": "corolla",
+    "preus": "prius",
+    "seeaitchar": "chr",
+    "ceehr": "chr",
+    "gt86": "86",
+}
+
+MIN_TRIGRAM_SCORE = 0.45
+# Shortest key matched by substring or trigrams: two trigrams of its own.
+# Anything shorter is contained in, or shares a trigram with, most names
+MIN_FUZZY_KEY_LEN = 4
+
+_NON_ALNUM = re.compile(r"[^a-z0-9 ]+")
+
+
+class ModelMatch(NamedTuple):
+    name: str
+    score: float
+
+
+def normalize_model_text(text: str) -> str:
+    """Lowercase, strip punctuation and turn spelled-out numbers into digits"""
+    text = _NON_ALNUM.sub(" ", (text or "").lower().replace("-", " "))
+    tokens = text.split()
+    # A model spelled out letter by letter ("see h r", "c h r")
+    if len(tokens) > 1 and all(len(t) == 1 or t in LETTER_WORDS for t in tokens):
+        return "".join(LETTER_WORDS.get(t, t) for t in tokens)
+    out: List[str] = []
+    i = 0
+    while i < len(tokens):
+        pair = " ".join(tokens[i:i + 2])
+        if pair in NUMBER_WORDS:
+            out.append(NUMBER_WORDS[pair])
+            i += 2
+            continue
+        out.append(NUMBER_WORDS.get(tokens[i], tokens[i]))
+        i += 1
+    return " ".join(out)
+
+
+def model_key(text: str) -> str:
+    """Compact comparison key: "Rav Four" -> "rav4", "C-HR" -> "chr" """
+    key = normalize_model_text(text).replace(" ", "")
+    return ALIASES.get(key, key)
+
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ModelMatcher:
+    """Index over a fixed set of model names; build once per catalog snapshot"""
+
+    def __init__(self, names: Iterable[str]):
+        self._names_by_key: Dict[str, str] = {}
+        for name in names:
+            if name:
+                # First spelling wins if two names collapse to one key
+                self._names_by_key.setdefault(model_key(name), name)
+
+        self._keys = list(self._names_by_key)
+        self._grams = [_trigrams(k) for k in self._keys]
+        self._postings: Dict[str, List[int]] = {}
+        for idx, grams in enumerate(self._grams):
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(idx)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def match(self, query: str, min_score: float = MIN_TRIGRAM_SCORE) -> Optional[ModelMatch]:
+        """Best catalog name for a spoken/typed model, or None"""
+        key = model_key(query)
+        if not key:
+            return None
+
+        exact = self._names_by_key.get(key)
+        if exact:
+            return ModelMatch(exact, 1.0)
+        if len(key) < MIN_FUZZY_KEY_LEN:
+            return None
+
+        # "rav4 hybrid" -> "rav4"; "prius" -> shortest name containing it
+        contained = [
+            k for k in self._keys
+            if min(len(k), len(key)) >= 3 and (k in key or key in k)
+        ]
+        if contained:
+            best = min(contained, key=lambda k: (abs(len(k) - len(key)), k))
+            return ModelMatch(self._names_by_key[best], 0.9)
+
+        query_grams = _trigrams(key)
+        overlap: Dict[int, int] = {}
+        for gram in query_grams:
+            for idx in self._postings.get(gram, ()):
+                overlap[idx] = overlap.get(idx, 0) + 1
+        if not overlap:
+            return None
+
+        # Dice coefficient over trigram sets
+        best_idx, best_score = -1, 0.0
+        for idx, shared in overlap.items():
+            score = 2.0 * shared / (len(query_grams) + len(self._grams[idx]))
+            if score > best_score:
+                best_idx, best_score = idx, score
+
+        if best_score < min_score:
+            return None
+        return ModelMatch(self._names_by_key[self._keys[best_idx]], round(best_score, 3))
@@ -0,0 +1,166 @@
+"""
+Recurring bill (subscription) detection over Nessie transactions
+Detection works on outflow charges (merchant, day, amount). The rollup store
+(utils/transaction_rollups.py) keeps each customer's charges of the last
+LOOKBACK_DAYS per merchant as it folds new transactions in
+(outflow_charges()), and re-runs recurring_candidates() only for the
+merchants a fold touched, so a refresh doesn't re-detect over the history
+
+Charges are grouped by normalized merchant with one sort (np.lexsort by
+merchant, then day), so detection is O(n log n) in the charges and
+everything after the sort is vectorized per group: the median interval picks
+a cadence, the share of intervals close to it measures regularity, and the
+coefficient of variation of the amounts measures stability. Merchants that
+pass all three are candidates; active_subscriptions() keeps those charged
+recently enough to still be active, with their cadence and next expected
+charge date
+
+This replaces "a description seen three or more times" as the recurring-bill
+rule in summary()
+"""
+from datetime import date, timedelta
+from typing import Iterable, List, NamedTuple, Tuple
+import re
+
+import numpy as np
+
+from utils.transaction_aggregates import TransactionColumns, factorize
+
+# (name, days, tolerance in days)
+CADENCES = (
+    ("weekly", 7.0, 1.5),
+    ("biweekly", 14.0, 2.5),
+    ("monthly", 30.44, 4.0),
+    ("quarterly", 91.31, 10.0),
+    ("yearly", 365.25, 20.0),
+)
+DAYS_PER_MONTH = 30.44
+MIN_OCCURRENCES = 3
+# Share of a merchant's intervals that must be within the cadence tolerance
+REGULARITY_MIN = 0.75
+# Largest std/mean of the charged amounts (utility bills vary; purchases vary more)
+AMOUNT_CV_MAX = 0.25
+# Still active if last charged within this many cadences of the reference day
+ACTIVE_CADENCES = 1.5
+# Only this much history is looked at (enough for three yearly charges)
+LOOKBACK_DAYS = 1200
+
+_CADENCE_DAYS = np.array([c[1] for c in CADENCES])
+_TOLERANCE = np.array([c[2] for c in CADENCES])
+_DAYS_OF_CADENCE = {name: days for name, days, _ in CADENCES}
+_EPOCH = date(1970, 1, 1)
+
+# Card/ACH boilerplate, store numbers and reference codes aren't the merchant
+_NOT_LETTERS = re.compile(r"[^a-z]+")
+_NOISE_WORDS = frozenset({
+    "pos", "ach", "debit", "card", "purchase", "payment", "autopay", "recurring", "bill",
+    "www", "com", "inc", "llc", "sq", "tst",
+})
+
+
+def normalize_merchant(description: str) -> str:
+    """'POS NETFLIX.COM #1234' and 'Netflix' both give 'netflix'"""
+    words = [w for w in _NOT_LETTERS.sub(" ", description.lower()).split() if w not in _NOISE_WORDS]
+    return " ".join(words) or "other"
+
+
+class Subscription(NamedTuple):
+    merchant: str
+    cadence: str
+    interval_days: float  # median days between charges
+    amount: float  # mean charge
+    monthly_amount: float  # amount at this cadence, per month
+    occurrences: int
+    last_date: str
+    next_expected: str
+
+
+def outflow_charges(columns: TransactionColumns) -> Tuple[np.ndarray, List[str], np.ndarray, np.ndarray]:
+    """
+    The dated outflows in columns as charges: merchant codes into merchants,
+    day (days since 1970-01-01, int32) and amount
+    """
+    merchant_of_desc, merchants = factorize(columns.descriptions, normalize_merchant)
+    rows = ~columns.is_inflow & ~np.isnat(columns.day_values)[columns.day_code]
+    return (
+        merchant_of_desc[columns.desc_code[rows]],
+        merchants,
+        columns.day_values.astype(np.int64).astype(np.int32)[columns.day_code[rows]],
+        columns.amount[rows],
+    )
+
+
+def recurring_candidates(merchant: np.ndarray, merchants: List[str], day: np.ndarray,
+                         amount: np.ndarray) -> List[Subscription]:
+    """
+    Merchants whose charges recur at a cadence with a stable amount, active
+    or not; one charge per slot as outflow_charges() returns them
+    """
+    order = np.lexsort((day, merchant))
+    merchant, ordinal, amount = merchant[order], day[order].astype(np.int64), amount[order]
+    n = merchant.size
+    if n < MIN_OCCURRENCES:
+        return []
+
+    # Groups are runs of one merchant; gaps are between neighbours in a run
+    new_group = np.r_[True, merchant[1:] != merchant[:-1]]
+    group = np.cumsum(new_group) - 1
+    starts = np.flatnonzero(new_group)
+    counts = np.diff(np.r_[starts, n])
+    n_groups = starts.size
+    same = ~new_group[1:]
+    gaps = (ordinal[1:] - ordinal[:-1])[same].astype(float)
+    gap_group = group[1:][same]
+    gap_counts = counts - 1
+
+    # Median gap per group, from the gaps sorted within their group
+    sorted_gaps = gaps[np.lexsort((gaps, gap_group))]
+    gap_starts = np.r_[0, np.cumsum(gap_counts)[:-1]]
+    eligible = counts >= MIN_OCCURRENCES
+    lo = np.where(eligible, gap_starts + (gap_counts - 1) // 2, 0)
+    hi = np.where(eligible, gap_starts + gap_counts // 2, 0)
+    median_gap = np.where(eligible, (sorted_gaps[lo] + sorted_gaps[hi]) / 2, 0.0) if gaps.size else np.zeros(n_groups)
+
+    matches = np.abs(median_gap[:, None] - _CADENCE_DAYS[None, :]) <= _TOLERANCE[None, :]
+    has_cadence = eligible & matches.any(axis=1)
+    cadence = matches.argmax(axis=1)
+
+    # Regularity: share of each group's gaps within its cadence's tolerance
+    gap_cadence = cadence[gap_group]
+    regular_gap = np.abs(gaps - _CADENCE_DAYS[gap_cadence]) <= _TOLERANCE[gap_cadence]
+    regular_share = np.bincount(gap_group, weights=regular_gap, minlength=n_groups) / np.maximum(gap_counts, 1)
+
+    # Amount stability: coefficient of variation per group
+    mean = np.bincount(group, weights=amount, minlength=n_groups) / counts
+    mean_sq = np.bincount(group, weights=amount * amount, minlength=n_groups) / counts
+    cv = np.sqrt(np.maximum(mean_sq - mean * mean, 0.0)) / np.where(mean > 0, mean, 1.0)
+
+    last = ordinal[starts + counts - 1]
+    found = []
+    for g in np.flatnonzero(has_cadence & (regular_share >= REGULARITY_MIN) & (cv <= AMOUNT_CV_MAX)).tolist():
+        name, days, _ = CADENCES[cadence[g]]
+        last_day = _EPOCH + timedelta(days=int(last[g]))
+        found.append(Subscription(
+            merchant=merchants[merchant[starts[g]]],
+            cadence=name,
+            interval_days=float(median_gap[g]),
+            amount=round(float(mean[g]), 2),
+            monthly_amount=round(float(mean[g]) * DAYS_PER_MONTH / days, 2),
+            occurrences=int(counts[g]),
+            last_date=last_day.isoformat(),
+            next_expected=(last_day + timedelta(days=round(float(median_gap[g])))).isoformat(),
+        ))
+    return found
+
+
+def active_subscriptions(candidates: Iterable[Subscription], reference: date) -> List[Subscription]:
+    """
+    The candidates last charged within ACTIVE_CADENCES cadences of
+    reference, largest monthly amount first
+    """
+    found = [
+        sub for sub in candidates
+        if (reference - date.fromisoformat(sub.last_date)).days <= ACTIVE_CADENCES * _DAYS_OF_CADENCE[sub.cadence]
+    ]
+    found.sort(key=lambda s: (-s.monthly_amount, s.merchant))
+    return found
@@ -0,0 +1,55 @@
+"""
+Single-flight coalescing of concurrent async calls
+While a fetch for a key is in flight, later callers for the same key await
+that fetch instead of starting their own. Pair it with the app cache: check
+the cache, then `await flight.do(key, fetch)` on a miss, with fetch filling
+the cache
+"""
+from typing import Any, Awaitable, Callable, Dict, Hashable
+import asyncio
+
+_registry: Dict[str, "SingleFlight"] = {}
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0  # calls that started an upstream fetch
+        self.coalesced = 0  # calls that joined one already in flight
+        _registry[name] = self
+
+    def start(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """The in-flight task for key, starting fetch() if there is none"""
+        task = self._inflight.get(key)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            self.coalesced += 1
+            return task
+        self.leaders += 1
+        task = asyncio.ensure_future(fetch())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._finished(key, t))
+        return task
+
+    async def do(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Result of fetch(), shared by every concurrent caller with this key
+        The fetch runs as its own task and is shielded, so a caller that is
+        cancelled (client disconnect) doesn't cancel it for the others
+        """
+        return await asyncio.shield(self.start(key, fetch))
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception retrieved even if every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._inflight), "leaders": self.leaders, "coalesced": self.coalesced}
+
+
+def single_flight_stats() -> Dict[str, Dict[str, int]]:
+    """Counters of every SingleFlight, by name (served with /cache/stats)"""
+    return {name: flight.stats() for name, flight in sorted(_registry.items())}
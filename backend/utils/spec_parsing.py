@@ -0,0 +1,138 @@
+"""
+Parse scraped spec strings ("203 hp", "3,310 lbs", "29 city / 41 hwy") into
+typed numeric values with consistent units
+Used at ingest time by the scraper and the backfill job, so the API never
+has to parse spec text per request
+"""
+from typing import Any, Dict, Optional, Tuple
+import json
+import re
+
+_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?")
+_CITY = re.compile(r"(\d+(?:\.\d+)?)\s*(?:mpg\s*)?city")
+_HIGHWAY = re.compile(r"(\d+(?:\.\d+)?)\s*(?:mpg\s*)?(?:hwy|highway)")
+_COMBINED = re.compile(r"(\d+(?:\.\d+)?)\s*(?:mpg\s*)?comb")
+_SLASHED = re.compile(r"(\d+(?:\.\d+)?)\s*/\s*(\d+(?:\.\d+)?)")
+
+# Typed column -> (text column / additional_specs key, unit the value is stored in)
+NUMERIC_SPEC_COLUMNS = {
+    "horsepower_hp": ("horsepower", "hp"),
+    "seating_capacity_num": ("seating_capacity", "seats"),
+    "cargo_space_cu_ft": ("cargo_space", "cu ft"),
+    "towing_capacity_lbs": ("towing_capacity", "lbs"),
+    "fuel_tank_gal": ("fuel_tank_capacity", "gal"),
+    "curb_weight_lbs": ("curb_weight", "lbs"),
+    "ground_clearance_in": ("ground_clearance", "in"),
+}
+MPG_COLUMNS = ("mpg_city", "mpg_highway", "mpg_combined")
+
+# Our unit -> (regex for another unit in the lowercase text, factor to ours)
+_UNIT_CONVERSIONS = {
+    "hp": ((re.compile(r"\bkw\b"), 1.341),),
+    "cu ft": ((re.compile(r"\b(?:l|liters?|litres?)\b"), 1 / 28.317),),
+    "lbs": ((re.compile(r"\bkg\b"), 2.2046),),
+    "gal": ((re.compile(r"\b(?:l|liters?|litres?)\b"), 1 / 3.785),),
+    "in": ((re.compile(r"\bmm\b"), 1 / 25.4), (re.compile(r"\bcm\b"), 1 / 2.54)),
+}
+
+
+def parse_number(value: Any) -> Optional[float]:
+    """First number in a value ("3,310 lbs" -> 3310.0), or None"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(str(value))
+    if not match:
+        return None
+    try:
+        return float(match.group().replace(",", ""))
+    except ValueError:
+        return None
+
+
+def parse_quantity(value: Any, unit: str) -> Optional[float]:
+    """Parse a spec value and convert it to `unit` if it was given in another one"""
+    number = parse_number(value)
+    if number is None or isinstance(value, (int, float)):
+        return number
+    text = str(value).lower()
+    for pattern, factor in _UNIT_CONVERSIONS.get(unit, ()):
+        if pattern.search(text):
+            return round(number * factor, 1)
+    return number
+
+
+def parse_mpg(value: Any) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+    """
+    (city, highway, combined) from an mpg spec
+    Accepts "29 city / 41 hwy", "29/41", "32 combined" or a bare number
+    (taken as combined). Combined is derived from city/highway with the EPA
+    55/45 harmonic weighting when it isn't given
+    """
+    if value is None:
+        return None, None, None
+    if isinstance(value, (int, float)):
+        return None, None, float(value)
+
+    text = str(value).lower()
+    city = _CITY.search(text)
+    highway = _HIGHWAY.search(text)
+    combined = _COMBINED.search(text)
+    city_v = float(city.group(1)) if city else None
+    highway_v = float(highway.group(1)) if highway else None
+    combined_v = float(combined.group(1)) if combined else None
+
+    if city_v is None and highway_v is None and combined_v is None:
+        slashed = _SLASHED.search(text)
+        if slashed:
+            city_v, highway_v = float(slashed.group(1)), float(slashed.group(2))
+        else:
+            combined_v = parse_number(text)
+
+    if combined_v is None and city_v and highway_v:
+        combined_v = float(round(1.0 / (0.55 / city_v + 0.45 / highway_v)))
+    return city_v, highway_v, combined_v
+
+
+def load_specs(value: Any) -> Dict[str, Any]:
+    """additional_specs as a dict, whether stored as JSONB or a JSON string"""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return {}
+    return value if isinstance(value, dict) else {}
+
+
+def normalize_specs(car: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """
+    Typed numeric columns for a scraped_cars row (or scraper output)
+    Text columns win over additional_specs; unknown values are None
+    """
+    specs = load_specs(car.get("additional_specs"))
+    out: Dict[str, Optional[float]] = {}
+
+    for column, (source, unit) in NUMERIC_SPEC_COLUMNS.items():
+        out[column] = parse_quantity(car.get(source) or specs.get(source), unit)
+    if out["horsepower_hp"] is not None:
+        out["horsepower_hp"] = round(out["horsepower_hp"])
+    if out["seating_capacity_num"] is not None:
+        out["seating_capacity_num"] = int(out["seating_capacity_num"])
+
+    city, highway, combined = parse_mpg(car.get("mpg"))
+    if specs.get("combined_mpg"):
+        combined = parse_number(specs["combined_mpg"]) or combined
+    out["mpg_city"], out["mpg_highway"], out["mpg_combined"] = city, highway, combined
+    return out
+
+
+def typed_specs(row: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """
+    Typed columns of a row as stored, falling back to parsing the text
+    columns for rows the backfill hasn't reached yet
+    """
+    columns = (*NUMERIC_SPEC_COLUMNS, *MPG_COLUMNS)
+    if any(row.get(c) is not None for c in columns):
+        return {c: parse_number(row.get(c)) for c in columns}
+    return normalize_specs(row)
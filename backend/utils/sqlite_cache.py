@@ -0,0 +1,220 @@
+"""
+SQLite-backed app cache, shared by every uvicorn worker on a node
+Selected with CACHE_BACKEND=sqlite. All workers open the same WAL-mode
+database file (CACHE_SQLITE_PATH), so an entry one worker fetched is a hit
+for the others. Values are stored as JSON, so only JSON-able values (API
+payloads) belong here; live objects go in get_local_cache()
+
+Recency for LRU eviction is tracked in a last_access column that reads only
+refresh once per ACCESS_RESOLUTION_SEC, to keep hits from turning into writes.
+Total entries and bytes are running counters in the cache_meta row, kept by
+triggers in the same transaction as the write, so checking the bounds on a
+write is one row read rather than a scan of the table
+"""
+from typing import Any, Dict, Hashable, Optional
+import json
+import os
+import time
+
+from utils.cache import (
+    APP_CACHE_MAX_BYTES, APP_CACHE_MAX_ENTRIES, CACHE_DIR, CacheBackend, CacheHit, _MISSING, connect_sqlite,
+)
+from utils.fast_json import dumps
+
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", os.path.join(CACHE_DIR, "app_cache.sqlite"))
+ACCESS_RESOLUTION_SEC = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    stale_at REAL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS cache_entries_last_access ON cache_entries (last_access);
+CREATE INDEX IF NOT EXISTS cache_entries_expires_at ON cache_entries (expires_at);
+CREATE TABLE IF NOT EXISTS cache_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS cache_entries_insert AFTER INSERT ON cache_entries BEGIN
+    UPDATE cache_meta SET entries = entries + 1, bytes = bytes + new.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_resize AFTER UPDATE OF size ON cache_entries BEGIN
+    UPDATE cache_meta SET bytes = bytes + new.size - old.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_delete AFTER DELETE ON cache_entries BEGIN
+    UPDATE cache_meta SET entries = entries - 1, bytes = bytes - old.size WHERE id = 0;
+END;
+-- Files from before the counters existed start from a one-time count
+INSERT OR IGNORE INTO cache_meta
+    SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries;
+"""
+
+# An upsert rather than INSERT OR REPLACE: a replace deletes without firing
+# the delete trigger, which would leave the counters off
+_UPSERT = """
+INSERT INTO cache_entries VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (namespace, key) DO UPDATE SET
+    value = excluded.value, size = excluded.size, expires_at = excluded.expires_at,
+    stale_at = excluded.stale_at, last_access = excluded.last_access
+"""
+
+
+def _encode_key(key: Hashable) -> str:
+    # Tuples and lists encode alike, which is fine for cache keys
+    return dumps(key).decode("utf-8")
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Thread-safe within a process (one connection behind a lock); safe across
+    processes through SQLite's own locking. Times are wall-clock, since
+    monotonic clocks aren't comparable between processes
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH, max_entries: int = APP_CACHE_MAX_ENTRIES,
+                 max_bytes: int = APP_CACHE_MAX_BYTES, default_ttl: Optional[float] = None):
+        super().__init__(max_entries, max_bytes, default_ttl)
+        self.path = path
+        self._db = connect_sqlite(path)
+        self._db.executescript(_SCHEMA)
+
+    def get_entry(self, namespace: str, key: Hashable) -> Optional[CacheHit]:
+        encoded_key = _encode_key(key)
+        now = time.time()
+        with self._lock:
+            stats = self._ns(namespace)
+            row = self._db.execute(
+                "SELECT value, expires_at, stale_at, last_access FROM cache_entries WHERE namespace = ? AND key = ?",
+                (namespace, encoded_key),
+            ).fetchone()
+            if row is not None and row[1] is not None and row[1] <= now:
+                self._db.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                                 (namespace, encoded_key))
+                stats.expirations += 1
+                row = None
+            if row is None:
+                stats.misses += 1
+                return None
+            value, _, stale_at, last_access = row
+            if now - last_access >= ACCESS_RESOLUTION_SEC:
+                self._db.execute("UPDATE cache_entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                                 (now, namespace, encoded_key))
+            stale = stale_at is not None and stale_at <= now
+            if stale:
+                stats.stale_hits += 1
+            else:
+                stats.hits += 1
+        return CacheHit(json.loads(value), stale)
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: Any = _MISSING,
+            size: Optional[int] = None) -> None:
+        ttl = self.ttl_for(namespace) if ttl is _MISSING else ttl
+        encoded = dumps(value)
+        size = len(encoded) if size is None else size
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        soft_ttl = self.soft_ttl_for(namespace)
+        row = (
+            namespace, _encode_key(key), encoded, size,
+            now + ttl if ttl is not None else None,
+            now + soft_ttl if soft_ttl is not None else None,
+            now,
+        )
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(_UPSERT, row)
+                self._enforce_bounds(now)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _totals(self) -> tuple:
+        return self._db.execute("SELECT entries, bytes FROM cache_meta WHERE id = 0").fetchone()
+
+    def _enforce_bounds(self, now: float) -> None:
+        count, total = self._totals()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        expired = self._db.execute(
+            "SELECT namespace FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+        ).fetchall()
+        for (namespace,) in expired:
+            self._ns(namespace).expirations += 1
+        self._db.execute("DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+        count, total = self._totals()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        victims = []
+        for namespace, key, size in self._db.execute(
+            "SELECT namespace, key, size FROM cache_entries ORDER BY last_access"
+        ):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            victims.append((namespace, key))
+            count -= 1
+            total -= size
+        self._db.executemany("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", victims)
+        for namespace, _ in victims:
+            self._ns(namespace).evictions += 1
+
+    def delete(self, namespace: str, key: Hashable) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                             (namespace, _encode_key(key)))
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            if namespace is None:
+                self._db.execute("DELETE FROM cache_entries")
+            else:
+                self._db.execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+
+    def _sizes(self) -> Dict[str, tuple]:
+        return {
+            namespace: (count, total)
+            for namespace, count, total in self._db.execute(
+                "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries GROUP BY namespace"
+            )
+        }
+
+    def namespace_stats(self, namespace: str) -> Dict[str, int]:
+        with self._lock:
+            count, total = self._sizes().get(namespace, (0, 0))
+            return {**self._ns(namespace).as_dict(), "entries": count, "bytes": total}
+
+    def stats(self) -> Dict[str, Any]:
+        """Entries/bytes are node-wide; hit/miss counters are this worker's"""
+        with self._lock:
+            sizes = self._sizes()
+            entries, total = self._totals()
+            names = sorted(set(sizes) | set(self._stats))
+            namespaces = {}
+            for name in names:
+                count, total = sizes.get(name, (0, 0))
+                namespaces[name] = {
+                    **self._ns(name).as_dict(), "entries": count, "bytes": total,
+                    "ttl_sec": self.ttl_for(name), "soft_ttl_sec": self.soft_ttl_for(name),
+                }
+            return {
+                "backend": self.name,
+                "path": self.path,
+                "pid": os.getpid(),
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "bytes": total,
+                "max_bytes": self.max_bytes,
+                "namespaces": namespaces,
+            }
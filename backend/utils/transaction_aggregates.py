@@ -0,0 +1,168 @@
+"""
+Columnar (NumPy) aggregation of Nessie transactions for summary()
+Transactions are read out of their dicts once into parallel arrays, with
+descriptions and dates (ISO days) factorized to integer codes; the distinct
+dates are parsed by NumPy in one call rather than one at a time.
+monthly_rollup() then folds a set of columns into per-calendar-month and
+per-(month, description) sums with a few vectorized passes (np.bincount over
+the codes) for utils/transaction_rollups.py.
+See benchmarks/bench_transaction_aggregation.py
+"""
+from datetime import date
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+import numpy as np
+
+TOP_CATEGORIES = 10
+_FIRST_DAY = np.datetime64("0001-01-01", "D")
+
+
+def factorize(values: List[Any], normalize) -> Tuple[np.ndarray, List[str]]:
+    """
+    Integer codes for values plus the normalized label of each code
+    Only the distinct raw values are normalized; the per-row work is
+    dict.fromkeys / map, which run in C. Codes are in first-seen order
+    """
+    labels: Dict[str, int] = {}
+    code_by_raw = {}
+    for raw in dict.fromkeys(values):
+        code_by_raw[raw] = labels.setdefault(normalize(raw), len(labels))
+    codes = np.fromiter(map(code_by_raw.__getitem__, values), dtype=np.intp, count=len(values))
+    return codes, list(labels)
+
+
+def _day_of(raw: Any) -> str:
+    """ISO day of a Nessie date ("2024-05-01" or a timestamp), "" if missing or unparseable"""
+    try:
+        return date.fromisoformat(str(raw)[:10]).isoformat() if raw else ""
+    except ValueError:
+        return ""
+
+
+def _factorize_days(values: List[Any]) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """
+    factorize(values, _day_of), plus each label as datetime64[D] (NaT for "")
+    The distinct values are parsed by NumPy in one call. NumPy only accepts
+    real dates, so a "YYYY-MM-DD" it reads is already its own ISO label; any
+    other shape (or a batch NumPy rejects) goes through _day_of. Labels are
+    in day order
+    """
+    distinct = list(dict.fromkeys(values))
+    heads = [str(raw)[:10] if raw else "" for raw in distinct]
+    try:
+        parsed = np.array([head or "NaT" for head in heads], dtype="datetime64[D]")
+        suspect = [i for i, head in enumerate(heads) if head and (len(head) != 10 or head[4] != "-" or head[7] != "-")]
+        suspect += np.flatnonzero(parsed < _FIRST_DAY).tolist()  # year 0 and BC parse, but aren't dates
+    except ValueError:
+        parsed = np.full(len(heads), np.datetime64("NaT", "D"))
+        suspect = [i for i, head in enumerate(heads) if head]
+    for i in suspect:
+        heads[i] = _day_of(distinct[i])
+        parsed[i] = heads[i] or "NaT"
+    day_values, first, code_of_distinct = np.unique(parsed, return_index=True, return_inverse=True)
+    position = dict(zip(distinct, range(len(distinct))))
+    codes = code_of_distinct.reshape(-1)[np.fromiter(map(position.__getitem__, values), dtype=np.intp,
+                                                      count=len(values))]
+    return codes, [heads[i] for i in first.tolist()], day_values
+
+
+class TransactionColumns:
+    """Parallel arrays, one slot per transaction"""
+
+    def __init__(self, txs: Iterable[Dict[str, Any]]):
+        txs = txs if isinstance(txs, list) else list(txs)
+        self.amount = np.abs(np.fromiter((t.get("amount") or 0 for t in txs), dtype=float, count=len(txs)))
+        self.desc_code, self.descriptions = factorize(
+            [t.get("description") for t in txs], lambda d: (d or "other").lower()
+        )
+        type_code, types = factorize([t.get("transaction_type") for t in txs], lambda t: (t or "").lower())
+        inflow_types = np.array(["deposit" in typ or "credit" in typ for typ in types], dtype=bool)
+        self.is_inflow = inflow_types[type_code] if len(txs) else np.zeros(0, dtype=bool)
+        # Deposits/withdrawals carry transaction_date, purchases purchase_date.
+        # day_values holds each day label as datetime64[D] (NaT when undated)
+        self.day_code, self.days, self.day_values = _factorize_days(
+            [t.get("transaction_date") or t.get("purchase_date") for t in txs]
+        )
+
+    def __len__(self) -> int:
+        return self.amount.size
+
+    def take(self, index: np.ndarray) -> "TransactionColumns":
+        """The rows at index; labels are shared, so the codes stay valid"""
+        out = object.__new__(TransactionColumns)
+        out.amount, out.is_inflow = self.amount[index], self.is_inflow[index]
+        out.desc_code, out.descriptions = self.desc_code[index], self.descriptions
+        out.day_code, out.days, out.day_values = self.day_code[index], self.days, self.day_values
+        return out
+
+
+class TransactionAggregates(NamedTuple):
+    monthly_inflow: float
+    monthly_outflow: float
+    monthly_outflow_std: float
+    categories: Dict[str, float]  # top outflow categories, monthly, largest first
+    count: int
+
+
+class MonthRollup(NamedTuple):
+    inflow: float
+    outflow: float
+    outflow_sq: float  # sum of squared outflows, for the dispersion
+    outflow_n: int
+    count: int
+
+
+class CategoryRollup(NamedTuple):
+    amount: float  # inflows and outflows, as the recurring-bill total counts them
+    outflow: float
+    outflow_n: int
+    count: int
+
+
+def monthly_rollup(columns: TransactionColumns, undated_month: str, categories_from: str = "") -> Tuple[
+        Dict[str, MonthRollup], Dict[Tuple[str, str], CategoryRollup]]:
+    """
+    Sums per calendar month ("YYYY-MM") and per (month, description)
+    Undated transactions are bucketed into undated_month. Descriptions are
+    only summed for months from categories_from on
+    """
+    if len(columns) == 0:
+        return {}, {}
+    month_of_day = columns.day_values.astype("datetime64[M]")
+    month_of_day[np.isnat(month_of_day)] = np.datetime64(undated_month, "M")
+    month_values, month_of_label = np.unique(month_of_day, return_inverse=True)
+    months = np.datetime_as_string(month_values).tolist()
+    month_code = month_of_label.reshape(-1)[columns.day_code]
+    n_months = len(months)
+    amount, inflow = columns.amount, columns.is_inflow
+    out_amount = np.where(inflow, 0.0, amount)
+    outflow = ~inflow
+
+    def per(codes: np.ndarray, size: int, rows=slice(None)):
+        return (
+            np.bincount(codes, weights=np.where(inflow, amount, 0.0)[rows], minlength=size),
+            np.bincount(codes, weights=out_amount[rows], minlength=size),
+            np.bincount(codes, weights=(out_amount * out_amount)[rows], minlength=size),
+            np.bincount(codes, weights=outflow[rows], minlength=size).astype(int),
+            np.bincount(codes, minlength=size),
+        )
+
+    in_m, out_m, sq_m, out_n_m, count_m = per(month_code, n_months)
+    month_rows = {
+        months[m]: MonthRollup(float(in_m[m]), float(out_m[m]), float(sq_m[m]), int(out_n_m[m]), int(count_m[m]))
+        for m in range(n_months)
+        if count_m[m]  # labels can be shared with a larger set (take()); skip months with no rows here
+    }
+
+    # (month, description) pairs that occur, as codes into a dense pair index
+    in_window = np.array([month >= categories_from for month in months], dtype=bool)[month_code]
+    n_desc = len(columns.descriptions)
+    pairs, pair_code = np.unique(month_code[in_window] * n_desc + columns.desc_code[in_window], return_inverse=True)
+    amount_p = np.bincount(pair_code, weights=amount[in_window], minlength=pairs.size)
+    _, out_p, _, out_n_p, count_p = per(pair_code, pairs.size, in_window)
+    category_rows = {
+        (months[pair // n_desc], columns.descriptions[pair % n_desc]): CategoryRollup(a, o, on, c)
+        for pair, a, o, on, c in zip(pairs.tolist(), amount_p.tolist(), out_p.tolist(),
+                                     out_n_p.tolist(), count_p.tolist())
+    }
+    return month_rows, category_rows
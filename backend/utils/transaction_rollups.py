@@ -0,0 +1,455 @@
+"""
+Persisted per-customer, per-month Nessie transaction rollups
+summary() used to spread each customer's whole transaction history over an
+assumed three months, re-aggregating all of it on every cache miss. This
+store keeps, per customer and calendar month, the sums the summary needs
+(inflow, outflow, squared outflow, counts, and the same per description for
+the last ROLLUP_WINDOW_MONTHS), each merchant's outflow charges of the last
+LOOKBACK_DAYS with the recurring bills detected over them
+(utils/recurring_bills.py), plus a watermark per account. A refresh folds in
+only the transactions past the watermark, and the monthly figures are
+averages over real calendar months (the last ROLLUP_WINDOW_MONTHS with data)
+
+Nessie has no "since" filter, so every refresh still receives the whole
+history and fold() still makes one linear pass over it: comparing each
+transaction's date string with the watermark. Everything past that (parsing
+into columns, id checks, one grouped rollup and one executemany per table)
+only touches the transactions on or after the watermark's overlap window,
+and only the merchants those were charged by are re-detected. See
+benchmarks/bench_rollup_refresh.py
+
+The watermark is the latest transaction day folded plus the ids seen in the
+WATERMARK_OVERLAP_DAYS before it, so transactions that post a few days late,
+or several on the same day across refreshes, are folded exactly once.
+Backdated further than that, edited or deleted transactions are not picked
+up; reset() a customer to rebuild from the next fetch. So is a larger
+ROLLUP_WINDOW_MONTHS: descriptions of older months aren't kept
+
+One WAL-mode SQLite file (NESSIE_ROLLUP_PATH, by default under CACHE_DIR
+next to the sqlite app cache), shared by every worker on the node; folds run
+in a BEGIN IMMEDIATE transaction so two workers refreshing the same customer
+can't fold a transaction twice. It holds customers' spending, so it is
+created owner-only (see connect_sqlite). Nothing in it is authoritative:
+reset() drops one customer, and deleting the file (with its -wal and -shm)
+drops everyone; either way the next refresh rebuilds from Nessie
+"""
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+from utils.cache import CACHE_DIR, connect_sqlite
+from utils.recurring_bills import (
+    LOOKBACK_DAYS, Subscription, active_subscriptions, outflow_charges, recurring_candidates,
+)
+from utils.transaction_aggregates import (
+    TOP_CATEGORIES, TransactionAggregates, TransactionColumns, monthly_rollup,
+)
+
+NESSIE_ROLLUP_PATH = os.getenv("NESSIE_ROLLUP_PATH", os.path.join(CACHE_DIR, "nessie_rollups.sqlite"))
+ROLLUP_WINDOW_MONTHS = int(os.getenv("NESSIE_ROLLUP_WINDOW_MONTHS", "3"))
+WATERMARK_OVERLAP_DAYS = int(os.getenv("NESSIE_WATERMARK_OVERLAP_DAYS", "7"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_months (
+    customer_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    inflow REAL NOT NULL,
+    outflow REAL NOT NULL,
+    outflow_sq REAL NOT NULL,
+    outflow_n INTEGER NOT NULL,
+    tx_count INTEGER NOT NULL,
+    PRIMARY KEY (customer_id, month)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_categories (
+    customer_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    description TEXT NOT NULL,
+    amount REAL NOT NULL,
+    outflow REAL NOT NULL,
+    outflow_n INTEGER NOT NULL,
+    tx_count INTEGER NOT NULL,
+    PRIMARY KEY (customer_id, month, description)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS merchant_charges (
+    customer_id TEXT NOT NULL,
+    merchant TEXT NOT NULL,
+    first_day INTEGER NOT NULL,
+    days BLOB NOT NULL,
+    amounts BLOB NOT NULL,
+    PRIMARY KEY (customer_id, merchant)
+);
+CREATE INDEX IF NOT EXISTS merchant_charges_first_day ON merchant_charges (customer_id, first_day);
+CREATE TABLE IF NOT EXISTS recurring (
+    customer_id TEXT NOT NULL,
+    merchant TEXT NOT NULL,
+    cadence TEXT NOT NULL,
+    interval_days REAL NOT NULL,
+    amount REAL NOT NULL,
+    monthly_amount REAL NOT NULL,
+    occurrences INTEGER NOT NULL,
+    last_date TEXT NOT NULL,
+    next_expected TEXT NOT NULL,
+    PRIMARY KEY (customer_id, merchant)
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+    customer_id TEXT NOT NULL,
+    account_id TEXT NOT NULL,
+    last_day TEXT NOT NULL,
+    recent_ids TEXT NOT NULL,
+    undated_ids TEXT NOT NULL,
+    PRIMARY KEY (customer_id, account_id)
+);
+"""
+
+_UPSERT_MONTH = """
+INSERT INTO rollup_months VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (customer_id, month) DO UPDATE SET
+    inflow = inflow + excluded.inflow, outflow = outflow + excluded.outflow,
+    outflow_sq = outflow_sq + excluded.outflow_sq, outflow_n = outflow_n + excluded.outflow_n,
+    tx_count = tx_count + excluded.tx_count
+"""
+
+_UPSERT_CATEGORY = """
+INSERT INTO rollup_categories VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (customer_id, month, description) DO UPDATE SET
+    amount = amount + excluded.amount, outflow = outflow + excluded.outflow,
+    outflow_n = outflow_n + excluded.outflow_n, tx_count = tx_count + excluded.tx_count
+"""
+
+
+# SQLite's default limit on bound parameters is 999
+_IN_CHUNK = 500
+
+
+def _after(txs: List[Dict[str, Any]], cutoff: str) -> List[Dict[str, Any]]:
+    """
+    The transactions dated after cutoff (an ISO day), plus the undated ones
+    Nessie dates are ISO ("2024-05-01" or a timestamp), so the raw strings
+    compare as days: any later day sorts after cutoff + "\\uffff", and "~"
+    (after every digit) keeps the undated ones
+    """
+    bound = cutoff + "\uffff"
+    return [tx for tx in txs if (tx.get("transaction_date") or tx.get("purchase_date") or "~") > bound]
+
+
+def _chunks(values: List[str]) -> Iterable[List[str]]:
+    for i in range(0, len(values), _IN_CHUNK):
+        yield values[i:i + _IN_CHUNK]
+
+
+def _day_number(day: str) -> int:
+    """Days since 1970-01-01 of an ISO day, as outflow_charges() numbers them"""
+    return int(np.datetime64(day, "D").astype(np.int64))
+
+
+def _tx_id(tx: Dict[str, Any]) -> str:
+    """Nessie's _id, or the fields that identify a transaction without one"""
+    tx_id = tx.get("_id")
+    if tx_id:
+        return str(tx_id)
+    return json.dumps([tx.get("transaction_date") or tx.get("purchase_date"), tx.get("amount"),
+                       tx.get("description"), tx.get("transaction_type")])
+
+
+def _shift_month(month: str, delta: int) -> str:
+    year, mon = divmod(int(month[:4]) * 12 + int(month[5:7]) - 1 + delta, 12)
+    return f"{year:04d}-{mon + 1:02d}"
+
+
+def _months_between(first: str, last: str) -> int:
+    """Calendar months from first to last, both included"""
+    return (int(last[:4]) - int(first[:4])) * 12 + int(last[5:7]) - int(first[5:7]) + 1
+
+
+class RollupStore:
+    """
+    Thread-safe within a process (one connection behind a lock); safe across
+    processes through SQLite's own locking
+    """
+
+    def __init__(self, path: str = NESSIE_ROLLUP_PATH, window_months: int = ROLLUP_WINDOW_MONTHS,
+                 overlap_days: int = WATERMARK_OVERLAP_DAYS):
+        self.path = path
+        self.window_months = window_months
+        self.overlap_days = overlap_days
+        self._db = connect_sqlite(path)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self.folded = 0  # transactions folded in by this process
+        self.skipped = 0  # fetched again but already past the watermark
+
+    def fold(self, customer_id: str, account_id: str, txs: Iterable[Dict[str, Any]],
+             today: Optional[date] = None) -> int:
+        """
+        Fold an account's fetched transactions into the customer's rollups
+        Only transactions past the account's watermark count; returns how many
+        did. Undated ones are bucketed into today's month
+        """
+        txs = txs if isinstance(txs, list) else list(txs)
+        today = today or date.today()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                folded = self._fold(customer_id, account_id, txs, today)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self.folded += folded
+            self.skipped += len(txs) - folded
+        return folded
+
+    def summarize(self, customer_id: str, fetched: Iterable[Tuple[str, Iterable[Dict[str, Any]]]],
+                  today: Optional[date] = None) -> Tuple[int, TransactionAggregates, List[Subscription]]:
+        """
+        What summary() runs on a refresh: fold() each (account id,
+        transactions) pair, then aggregates() and subscriptions(), all in one
+        transaction. Returns how many transactions were folded with them
+        """
+        fetched = [(account_id, txs if isinstance(txs, list) else list(txs)) for account_id, txs in fetched]
+        today = today or date.today()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                folded = sum(self._fold(customer_id, account_id, txs, today) for account_id, txs in fetched)
+                aggregates, subscriptions = self._aggregates(customer_id), self._subscriptions(customer_id)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self.folded += folded
+            self.skipped += sum(len(txs) for _, txs in fetched) - folded
+        return folded, aggregates, subscriptions
+
+    def _fold(self, customer_id: str, account_id: str, txs: List[Dict[str, Any]], today: date) -> int:
+        row = self._db.execute(
+            "SELECT last_day, recent_ids, undated_ids FROM watermarks WHERE customer_id = ? AND account_id = ?",
+            (customer_id, account_id),
+        ).fetchone()
+        if row:
+            # Days at or before the cutoff were folded already; only later (or
+            # undated) transactions are read into columns and id-checked
+            last_day, recent, undated = row[0], json.loads(row[1]), set(json.loads(row[2]))
+            if last_day:
+                txs = _after(txs, self._overlap_start(last_day))
+            if not txs:
+                return 0
+            columns = TransactionColumns(txs)
+            new_rows = []
+            for i, code in enumerate(columns.day_code.tolist()):
+                day = columns.days[code]
+                tx_id = _tx_id(txs[i])
+                seen = undated if not day else recent
+                if tx_id in seen:
+                    continue
+                if day:
+                    recent[tx_id] = day
+                else:
+                    undated.add(tx_id)
+                new_rows.append(i)
+            if not new_rows:
+                return 0
+            new = columns.take(np.array(new_rows, dtype=np.intp))
+            last_day = max(last_day, *columns.days)
+        else:
+            # The account's first fold: everything is new, and ids are only
+            # worked out for the transactions the watermark keeps
+            if not txs:
+                return 0
+            new = columns = TransactionColumns(txs)
+            last_day = max(columns.days)
+            recent, undated = {}, set()
+            overlap_start = self._overlap_start(last_day) if last_day else ""
+            kept = np.array([not day or day > overlap_start for day in columns.days], dtype=bool)
+            for i in np.flatnonzero(kept[columns.day_code]).tolist():
+                day = columns.days[columns.day_code[i]]
+                if day:
+                    recent[_tx_id(txs[i])] = day
+                else:
+                    undated.add(_tx_id(txs[i]))
+
+        if last_day:
+            overlap_start = self._overlap_start(last_day)
+            recent = {tx_id: day for tx_id, day in recent.items() if day > overlap_start}
+        self._db.execute(
+            "INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?, ?)",
+            (customer_id, account_id, last_day, json.dumps(recent), json.dumps(sorted(undated))),
+        )
+
+        # Descriptions are only kept for the months aggregates() can still reach
+        undated_month = today.isoformat()[:7]
+        last_month = self._db.execute(
+            "SELECT MAX(month) FROM rollup_months WHERE customer_id = ?", (customer_id,)
+        ).fetchone()[0]
+        new_months = {new.days[code][:7] or undated_month for code in np.unique(new.day_code).tolist()}
+        last_month = max(last_month or "", *new_months)
+        categories_from = _shift_month(last_month, 1 - self.window_months)
+        month_rows, category_rows = monthly_rollup(new, undated_month, categories_from)
+        self._db.executemany(_UPSERT_MONTH, [(customer_id, month, *r) for month, r in month_rows.items()])
+        self._db.executemany(_UPSERT_CATEGORY, [
+            (customer_id, month, desc, *r) for (month, desc), r in category_rows.items()
+        ])
+        self._db.execute(
+            "DELETE FROM rollup_categories WHERE customer_id = ? AND month < ?", (customer_id, categories_from)
+        )
+        self._fold_charges(customer_id, new)
+        return len(new)
+
+    def _overlap_start(self, last_day: str) -> str:
+        return (date.fromisoformat(last_day) - timedelta(days=self.overlap_days)).isoformat()
+
+    def _fold_charges(self, customer_id: str, new: TransactionColumns) -> None:
+        """
+        Add the new outflows to their merchants' charges and re-detect those
+        merchants, plus any with charges now older than LOOKBACK_DAYS
+        """
+        latest = self._db.execute(
+            "SELECT MAX(last_day) FROM watermarks WHERE customer_id = ?", (customer_id,)
+        ).fetchone()[0]
+        if not latest:
+            return
+        since = _day_number(latest) - LOOKBACK_DAYS
+        merchant, merchants, day, amount = outflow_charges(new)
+        keep = day >= since
+        merchant, day, amount = merchant[keep], day[keep], amount[keep]
+        touched = {merchants[m] for m in np.unique(merchant).tolist()}
+        touched.update(name for name, in self._db.execute(
+            "SELECT merchant FROM merchant_charges WHERE customer_id = ? AND first_day < ?", (customer_id, since)
+        ))
+        if not touched:
+            return
+
+        # Everything the touched merchants were charged, as one set of columns
+        names = sorted(touched)
+        code = {name: i for i, name in enumerate(names)}
+        parts = [(np.array([code.get(name, -1) for name in merchants], dtype=np.intp)[merchant], day, amount)]
+        for chunk in _chunks(names):
+            marks = ",".join("?" * len(chunk))
+            for name, days, amounts in self._db.execute(
+                f"SELECT merchant, days, amounts FROM merchant_charges WHERE customer_id = ? AND merchant IN ({marks})",
+                (customer_id, *chunk),
+            ):
+                days = np.frombuffer(days, dtype=np.int32)
+                parts.append((np.full(days.size, code[name], dtype=np.intp), days,
+                              np.frombuffer(amounts, dtype=np.float64)))
+        merchant, day, amount = (np.concatenate(column) for column in zip(*parts))
+        keep = day >= since
+        order = np.lexsort((day[keep], merchant[keep]))
+        merchant, day, amount = merchant[keep][order], day[keep][order], amount[keep][order]
+
+        for chunk in _chunks(names):
+            marks = ",".join("?" * len(chunk))
+            for table in ("merchant_charges", "recurring"):
+                self._db.execute(f"DELETE FROM {table} WHERE customer_id = ? AND merchant IN ({marks})",
+                                 (customer_id, *chunk))
+        if merchant.size == 0:
+            return
+        starts = np.flatnonzero(np.r_[True, merchant[1:] != merchant[:-1]])
+        ends = np.r_[starts[1:], merchant.size]
+        self._db.executemany("INSERT INTO merchant_charges VALUES (?, ?, ?, ?, ?)", [
+            (customer_id, names[merchant[start]], int(day[start]), day[start:end].tobytes(),
+             amount[start:end].tobytes())
+            for start, end in zip(starts.tolist(), ends.tolist())
+        ])
+        self._db.executemany("INSERT INTO recurring VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+            (customer_id, *sub) for sub in recurring_candidates(merchant, names, day, amount)
+        ])
+
+    def aggregates(self, customer_id: str) -> TransactionAggregates:
+        """summary() figures averaged over the last window_months calendar months with data"""
+        with self._lock:
+            return self._aggregates(customer_id)
+
+    def _aggregates(self, customer_id: str) -> TransactionAggregates:
+        span = self._db.execute(
+            "SELECT MIN(month), MAX(month) FROM rollup_months WHERE customer_id = ?", (customer_id,)
+        ).fetchone()
+        if span[0] is None:
+            return TransactionAggregates(0.0, 0.0, 0.0, {}, 0)
+        first, last = span
+        start = max(first, _shift_month(last, 1 - self.window_months))
+        inflow, outflow, outflow_sq, outflow_n, count = self._db.execute(
+            "SELECT SUM(inflow), SUM(outflow), SUM(outflow_sq), SUM(outflow_n), SUM(tx_count) "
+            "FROM rollup_months WHERE customer_id = ? AND month BETWEEN ? AND ?",
+            (customer_id, start, last),
+        ).fetchone()
+        top = self._db.execute(
+            "SELECT description, SUM(outflow) FROM rollup_categories "
+            "WHERE customer_id = ? AND month BETWEEN ? AND ? GROUP BY description HAVING SUM(outflow_n) > 0 "
+            "ORDER BY SUM(outflow) DESC, description LIMIT ?",
+            (customer_id, start, last, TOP_CATEGORIES),
+        ).fetchall()
+
+        # Months without transactions inside the window still count
+        months = _months_between(start, last)
+        std = 0.0
+        if outflow_n > 1:
+            mean = outflow / outflow_n
+            # Population standard deviation of the individual outflows
+            std = math.sqrt(max(outflow_sq / outflow_n - mean * mean, 0.0))
+        return TransactionAggregates(
+            monthly_inflow=round(inflow / months, 2),
+            monthly_outflow=round(outflow / months, 2),
+            monthly_outflow_std=round(std, 2),
+            categories={desc: round(total / months, 2) for desc, total in top},
+            count=count,
+        )
+
+    def subscriptions(self, customer_id: str, reference: Optional[date] = None) -> List[Subscription]:
+        """
+        The customer's recurring bills that are still active on reference,
+        by default the latest transaction day folded (so old demo data still
+        detects)
+        """
+        with self._lock:
+            return self._subscriptions(customer_id, reference)
+
+    def _subscriptions(self, customer_id: str, reference: Optional[date] = None) -> List[Subscription]:
+        latest = self._db.execute(
+            "SELECT MAX(last_day) FROM watermarks WHERE customer_id = ?", (customer_id,)
+        ).fetchone()[0]
+        rows = self._db.execute(
+            "SELECT merchant, cadence, interval_days, amount, monthly_amount, occurrences, last_date, "
+            "next_expected FROM recurring WHERE customer_id = ?", (customer_id,)
+        ).fetchall()
+        if not rows:
+            return []
+        return active_subscriptions(map(Subscription._make, rows), reference or date.fromisoformat(latest))
+
+    def reset(self, customer_id: str) -> None:
+        """Drop a customer's rollups, charges and watermarks; the next refresh rebuilds them"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for table in ("rollup_months", "rollup_categories", "merchant_charges", "recurring", "watermarks"):
+                    self._db.execute(f"DELETE FROM {table} WHERE customer_id = ?", (customer_id,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            customers, months = self._db.execute(
+                "SELECT COUNT(DISTINCT customer_id), COUNT(*) FROM rollup_months"
+            ).fetchone()
+        return {"path": self.path, "customers": customers, "months": months,
+                "folded": self.folded, "skipped": self.skipped}
+
+
+_store: Optional[RollupStore] = None
+_store_lock = threading.Lock()
+
+
+def get_rollup_store() -> RollupStore:
+    """The process-wide rollup store, opened on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RollupStore()
+        return _store
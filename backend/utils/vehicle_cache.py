@@ -0,0 +1,116 @@
+"""
+Formatted vehicle payloads, cached in the in-process bounded cache
+Entries are keyed by (id, updated_at), so a row is only re-formatted and
+re-encoded after it actually changes in scraped_cars. They don't expire;
+the "vehicles" namespace is bounded by the cache's LRU (utils/cache.py).
+They stay in-process whatever CACHE_BACKEND is: a hit hands back the live
+CachedVehicle with its encoded body and ETag, which a shared store can't
+"""
+from typing import Any, Callable, Dict, Optional, Tuple
+import logging
+import threading
+
+from utils.cache import BoundedCache, get_local_cache
+from utils.fast_json import dumps
+from utils.http_cache import make_etag
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "vehicles"
+
+CacheKey = Tuple[str, str]
+
+
+class CachedVehicle:
+    """
+    Formatted payload plus its JSON encoding, the encoding as a JSON string
+    literal (for agent tools that pass the vehicle on as a string) and its
+    ETag - each computed lazily, once
+    """
+
+    __slots__ = ("formatted", "_json", "_json_literal", "_etag")
+
+    def __init__(self, formatted: Dict[str, Any]):
+        self.formatted = formatted
+        self._json: Optional[bytes] = None
+        self._json_literal: Optional[bytes] = None
+        self._etag: Optional[str] = None
+
+    @property
+    def json(self) -> bytes:
+        if self._json is None:
+            self._json = dumps(self.formatted)
+        return self._json
+
+    @property
+    def json_literal(self) -> bytes:
+        if self._json_literal is None:
+            self._json_literal = dumps(self.json.decode("utf-8"))
+        return self._json_literal
+
+    @property
+    def etag(self) -> str:
+        if self._etag is None:
+            self._etag = make_etag(self.json)
+        return self._etag
+
+
+class VehicleCache:
+    """
+    CachedVehicle entries in the "vehicles" namespace of an in-process BoundedCache
+    Cached payloads are shared between requests and must be treated as read-only
+    """
+
+    def __init__(self, cache: Optional[BoundedCache] = None):
+        self._cache = cache or get_local_cache()
+        self._cache.configure(NAMESPACE, None)
+        # Current key per vehicle id, to drop a row's stale payload when its
+        # updated_at changes; entries leaving the cache (LRU eviction
+        # included) are forgotten, so this never outgrows the cache
+        self._key_by_id: Dict[str, CacheKey] = {}
+        self._lock = threading.Lock()
+        self._cache.on_remove(NAMESPACE, self._forget)
+
+    def _forget(self, key: CacheKey) -> None:
+        with self._lock:
+            if self._key_by_id.get(key[0]) == key:
+                del self._key_by_id[key[0]]
+
+    @staticmethod
+    def key_for(vehicle: Dict[str, Any]) -> CacheKey:
+        return str(vehicle.get("id")), str(vehicle.get("updated_at") or "")
+
+    def get_or_format(self, vehicle: Dict[str, Any], formatter: Callable[[Dict[str, Any]], Dict[str, Any]]) -> CachedVehicle:
+        key = self.key_for(vehicle)
+        entry = self._cache.get(NAMESPACE, key)
+        if entry is not None:
+            return entry
+
+        # Format outside any lock; a concurrent miss on the same key just
+        # formats twice and the last writer wins
+        entry = CachedVehicle(formatter(vehicle))
+        with self._lock:
+            # Drop the payload for the row's previous updated_at right away
+            previous = self._key_by_id.get(key[0])
+            self._key_by_id[key[0]] = key
+        if previous is not None and previous != key:
+            self._cache.delete(NAMESPACE, previous)
+        # The encoded body dominates the entry's memory
+        self._cache.set(NAMESPACE, key, entry, size=2 * len(entry.json))
+        return entry
+
+    def clear(self) -> None:
+        self._cache.clear(NAMESPACE)
+        with self._lock:
+            self._key_by_id.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.namespace_stats(NAMESPACE)
+
+
+_vehicle_cache = VehicleCache()
+
+
+def get_vehicle_cache() -> VehicleCache:
+    """Get the process-wide formatted vehicle cache"""
+    return _vehicle_cache
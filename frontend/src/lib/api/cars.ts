@@ -3,6 +3,8 @@
  * Simplified version - just searches by make/model without recommendation engine
  */
 
+import type { Vehicle } from '../types';
+
 const API_BASE_URL = 'http://localhost:8000';
 
 export interface CarSearchParams {
@@ -45,26 +47,139 @@ export async function searchCarByMakeModel(params: CarSearchParams) {
 
 /**
  * Get a specific vehicle by ID
+ * Calls made in the same tick (e.g. a card per vehicle, or a comparison view
+ * mapping over its ids) are coalesced into one getVehiclesByIds() request;
+ * a lone id goes through the conditional GET /api/cars/{id} instead
  */
-export async function getVehicleById(vehicleId: string) {
+export function getVehicleById(vehicleId: string): Promise<Vehicle> {
+  return new Promise((resolve, reject) => {
+    const waiters = pendingVehicleIds.get(vehicleId) ?? [];
+    waiters.push({ resolve, reject });
+    pendingVehicleIds.set(vehicleId, waiters);
+    if (pendingVehicleIds.size === 1 && waiters.length === 1) {
+      queueMicrotask(flushVehicleLookups);
+    }
+  });
+}
+
+interface VehicleWaiter {
+  resolve: (vehicle: Vehicle) => void;
+  reject: (error: Error) => void;
+}
+
+// Largest batch the backend accepts (MAX_BATCH_IDS in backend/routes/car_routes.py)
+const MAX_BATCH_IDS = 50;
+
+let pendingVehicleIds = new Map<string, VehicleWaiter[]>();
+
+function flushVehicleLookups() {
+  const batch = pendingVehicleIds;
+  pendingVehicleIds = new Map();
+  // Sorted, so the same set of cards sends the same chunks and their ETags revalidate
+  const ids = [...batch.keys()].sort();
+
+  // One request per chunk; a failed chunk only rejects its own waiters
+  for (let start = 0; start < ids.length; start += MAX_BATCH_IDS) {
+    const chunk = ids.slice(start, start + MAX_BATCH_IDS);
+    void settleVehicleLookups(chunk, batch);
+  }
+}
+
+async function settleVehicleLookups(chunk: string[], batch: Map<string, VehicleWaiter[]>) {
   try {
-    const response = await fetch(`${API_BASE_URL}/api/cars/${vehicleId}`, {
-      method: 'GET',
+    const vehicles = chunk.length === 1 ? await fetchVehicle(chunk[0]) : (await getVehiclesByIds(chunk)).vehicles;
+    const byId = new Map(vehicles.map((vehicle) => [String(vehicle.id), vehicle]));
+    for (const vehicleId of chunk) {
+      const vehicle = byId.get(vehicleId);
+      for (const waiter of batch.get(vehicleId) ?? []) {
+        if (vehicle) {
+          waiter.resolve(vehicle);
+        } else {
+          waiter.reject(new Error('Vehicle not found'));
+        }
+      }
+    }
+  } catch (error) {
+    for (const vehicleId of chunk) {
+      for (const waiter of batch.get(vehicleId) ?? []) {
+        waiter.reject(error instanceof Error ? error : new Error('Failed to fetch vehicle'));
+      }
+    }
+  }
+}
+
+/**
+ * GET /api/cars/{id}; the browser revalidates its cached copy with the
+ * vehicle's ETag, so an unchanged vehicle comes back as a bodiless 304
+ */
+async function fetchVehicle(vehicleId: string): Promise<Vehicle[]> {
+  const response = await fetch(`${API_BASE_URL}/api/cars/${encodeURIComponent(vehicleId)}`, {
+    method: 'GET',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+  });
+
+  if (response.status === 404) {
+    return [];
+  }
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.detail || 'Failed to fetch vehicle');
+  }
+
+  return [await response.json()];
+}
+
+export interface VehicleBatchResult {
+  vehicles: Vehicle[];
+  missing: string[];
+}
+
+// Last ETag and result per id list; browsers don't cache POST responses,
+// so batch revalidation is done here. Oldest lists are dropped first
+const MAX_BATCH_VALIDATORS = 32;
+const batchValidators = new Map<string, { etag: string; result: VehicleBatchResult }>();
+
+/**
+ * Get several vehicles by ID in one request (at most MAX_BATCH_IDS ids)
+ * Vehicles are returned in the same order as the ids; unknown ids are listed in `missing`
+ * Repeating an id list sends the ETag of its last result; if nothing changed
+ * the backend answers 304 and that result is reused
+ */
+export async function getVehiclesByIds(vehicleIds: string[]): Promise<VehicleBatchResult> {
+  try {
+    const key = vehicleIds.join('\n');
+    const previous = batchValidators.get(key);
+    const response = await fetch(`${API_BASE_URL}/api/cars/batch`, {
+      method: 'POST',
       headers: {
         'Content-Type': 'application/json',
+        ...(previous && { 'If-None-Match': previous.etag }),
       },
+      body: JSON.stringify({ ids: vehicleIds }),
     });
 
+    if (response.status === 304 && previous) {
+      return previous.result;
+    }
     if (!response.ok) {
       const error = await response.json();
-      throw new Error(error.detail || 'Failed to fetch vehicle');
+      throw new Error(error.detail || 'Failed to fetch vehicles');
     }
 
-    const data = await response.json();
+    const data: VehicleBatchResult = await response.json();
+    const etag = response.headers.get('ETag');
+    batchValidators.delete(key);
+    if (etag) {
+      batchValidators.set(key, { etag, result: data });
+      if (batchValidators.size > MAX_BATCH_VALIDATORS) {
+        batchValidators.delete(batchValidators.keys().next().value as string);
+      }
+    }
     return data;
   } catch (error) {
-    console.error('Error fetching vehicle:', error);
+    console.error('Error fetching vehicles:', error);
     throw error;
   }
 }
-